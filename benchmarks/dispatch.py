@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of EventProxy.invoke.
+
+Compares the old strategy (a fresh ``asyncio.run()`` per request, running the
+handler on that loop's default executor) with the long-lived Dispatcher loop,
+using a no-op handler so that only the dispatch overhead is measured.
+
+usage:
+  PYTHONPATH=. python benchmarks/dispatch.py [-n REQUESTS]
+"""
+
+import argparse
+import asyncio
+import time
+
+from lambda_gateway import lambda_context, logger
+from lambda_gateway.event_proxy import EventProxy
+
+EVENT = {
+    "version": "2.0",
+    "rawPath": "/",
+    "requestContext": {"http": {"method": "GET", "path": "/"}},
+}
+
+
+def handler(event, context):
+    return {"statusCode": 200, "body": ""}
+
+
+async def invoke_original(proxy, event, context):
+    # The replaced invoke_async: every loop starts & shuts down its own
+    # default executor to run the handler on
+    if not proxy.get_path(event).startswith(proxy.base_path):
+        return proxy.jsonify(proxy.get_httpMethod(event), 403)
+    handler = proxy.get_handler()
+    loop = asyncio.get_running_loop()
+    coroutine = loop.run_in_executor(None, handler, event, context)
+    return await asyncio.wait_for(coroutine, proxy.timeout)
+
+
+def invoke_asyncio_run(proxy, event):
+    with lambda_context.start(proxy.timeout) as context:
+        return asyncio.run(invoke_original(proxy, event, context))
+
+
+def invoke_dispatcher(proxy, event):
+    return proxy.invoke(event)
+
+
+def measure(func, proxy, requests):
+    # Make sure the no-op handler runs, not the error path
+    status = func(proxy, EVENT)["statusCode"]
+    assert status == 200, f"{func.__name__} returned {status}"
+    start = time.perf_counter()
+    for _ in range(requests):
+        func(proxy, EVENT)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--requests", default=2000, type=int)
+    opts = parser.parse_args()
+
+    logger.logger.disabled = True
+    with EventProxy("benchmark.handler", "/") as proxy:
+        proxy.get_handler = lambda signature=None: handler
+        for name, func in [
+            ("asyncio.run", invoke_asyncio_run),
+            ("dispatcher", invoke_dispatcher),
+        ]:
+            usec = measure(func, proxy, opts.requests)
+            print(f"{name:<12} {usec:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
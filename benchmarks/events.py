@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Cost of building Lambda events.
+
+Compares eagerly built dict events (how events were built before they
+became lazy) with the lazy events, for both payload versions, when the
+handler reads nothing, reads one field, or serializes the whole event.
+
+usage:
+  PYTHONPATH=. python benchmarks/events.py [-n REQUESTS]
+"""
+
+import argparse
+import http.client
+import io
+import json
+import time
+from urllib import parse
+
+from lambda_gateway import events
+
+TARGET = "/items/1234?fields=id,name&sort=-created&page=2&limit=50"
+HEAD = (
+    b"Host: localhost:8000\r\n"
+    b"User-Agent: Mozilla/5.0\r\n"
+    b"Accept: application/json\r\n"
+    b"Accept-Encoding: gzip, deflate\r\n"
+    b"Accept-Language: en-US,en;q=0.9\r\n"
+    b"Authorization: Bearer abcdef0123456789\r\n"
+    b"Cookie: session=0123456789abcdef; theme=dark\r\n"
+    b"X-Request-Id: 0f5b8e4c-4b0e-4c8e-9d5e-6c0a8e2b1f3a\r\n"
+    b"\r\n"
+)
+HEADERS = http.client.parse_headers(io.BytesIO(HEAD))
+
+
+def get_event_v1(httpMethod, target, headers, body, isBase64Encoded=False):
+    url = parse.urlparse(target)
+    path, *_ = url.path.split("?")
+    return {
+        "version": "1.0",
+        "body": body,
+        "isBase64Encoded": isBase64Encoded,
+        "headers": dict(headers),
+        "httpMethod": httpMethod,
+        "path": path,
+        "queryStringParameters": dict(parse.parse_qsl(url.query)),
+    }
+
+
+def get_event_v2(httpMethod, target, headers, body, isBase64Encoded=False):
+    url = parse.urlparse(target)
+    path, *_ = url.path.split("?")
+    route_key = f"{httpMethod} {path}"
+    return {
+        "version": "2.0",
+        "body": body,
+        "isBase64Encoded": isBase64Encoded,
+        "routeKey": route_key,
+        "rawPath": path,
+        "rawQueryString": url.query,
+        "headers": dict(headers),
+        "queryStringParameters": dict(parse.parse_qsl(url.query)),
+        "requestContext": {
+            "http": {
+                "method": httpMethod,
+                "path": path,
+            },
+        },
+    }
+
+
+def build(get_event):
+    return get_event("GET", TARGET, HEADERS, "")
+
+
+def read_one(get_event):
+    return get_event("GET", TARGET, HEADERS, "")["queryStringParameters"]
+
+
+def serialize(get_event):
+    return json.dumps(get_event("GET", TARGET, HEADERS, ""))
+
+
+def measure(func, get_event, requests, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(requests):
+            func(get_event)
+        best = min(best, time.perf_counter() - start)
+    return best / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--requests", default=10000, type=int)
+    opts = parser.parse_args()
+
+    for version, eager, lazy in [
+        ("1.0", get_event_v1, events.get_event_v1),
+        ("2.0", get_event_v2, events.get_event_v2),
+    ]:
+        for name, func in [
+            ("build", build),
+            ("read one", read_one),
+            ("serialize", serialize),
+        ]:
+            eager_usec = measure(func, eager, opts.requests)
+            lazy_usec = measure(func, lazy, opts.requests)
+            print(
+                f"v{version} {name:<10} "
+                f"eager {eager_usec:6.2f} us  lazy {lazy_usec:6.2f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
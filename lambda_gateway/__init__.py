@@ -2,27 +2,97 @@
 Lambda Gateway
 """
 
+import atexit
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 __version__ = "1.1.0"
 
 
+class LogQueue:
+    """
+    Write the records of a logger on a background thread.
+
+    Records are put on an unbounded queue and written by a listener thread,
+    so threads serving requests never wait on the stream's lock or its I/O.
+    A forked process starts its own queue & listener, and queued records are
+    written when the process exits (or when stop() is called).
+
+    :param Logger logger: Logger
+    :param Handler handler: Handler writing the records
+    """
+
+    instances = []
+
+    def __init__(self, logger, handler):
+        self.handler = handler
+        self.queue_handler = QueueHandler(None)
+        self.listener = None
+        logger.addHandler(self.queue_handler)
+        self.start()
+        self.instances.append(self)
+        if hasattr(os, "register_at_fork"):  # POSIX only
+            os.register_at_fork(after_in_child=self.restart)
+        atexit.register(self.stop)
+
+    def start(self):
+        """
+        Start the listener thread on a new queue.
+        """
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.listener = QueueListener(
+            self.queue_handler.queue,
+            self.handler,
+            respect_handler_level=True,
+        )
+        self.listener.start()
+
+    def restart(self):
+        """
+        Start over in a forked process, whose listener thread is gone; the
+        records queued in the parent are left for the parent to write.
+        """
+        self.listener = None
+        self.start()
+
+    def stop(self):
+        """
+        Write the queued records and stop the listener thread.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
 def set_stream_logger(name, level=logging.DEBUG, format_string=None):
     """
     Adapted from boto3.set_stream_logger()
+
+    Records are written to stderr through a LogQueue. Records about a
+    request carry its client address in the message.
     """
     if format_string is None:
-        format_string = "%(addr)s - - [%(asctime)s] %(levelname)s - %(message)s"
+        format_string = "[%(asctime)s] %(levelname)s - %(message)s"
 
     logger = logging.getLogger(name)
     handler = logging.StreamHandler()
     formatter = logging.Formatter(format_string, "%-d/%b/%Y %H:%M:%S")
-    adapter = logging.LoggerAdapter(logger, dict(addr="::1"))
+    adapter = logging.LoggerAdapter(logger, {})
     logger.setLevel(level)
     handler.setLevel(level)
     handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    adapter.queue = LogQueue(logger, handler)
     return adapter
 
 
+def stop_logging():
+    """
+    Write all queued log records, e.g. before os._exit().
+    """
+    for log_queue in LogQueue.instances:
+        log_queue.stop()
+
+
 logger = set_stream_logger(__name__)
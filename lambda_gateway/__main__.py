@@ -2,15 +2,24 @@
 # usage:
 #   python server.py --help
 import argparse
+import functools
 import os
+import signal
 import socket
 import sys
 from http import server
 
+from lambda_gateway.access_log import FORMATS, AccessLog
+from lambda_gateway.async_server import AsyncHTTPServer
 from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.profiler import Profiler
+from lambda_gateway.recorder import Recorder
+from lambda_gateway.reloader import Reloader
 from lambda_gateway.request_handler import LambdaRequestHandler
+from lambda_gateway.routes import load_routes
+from lambda_gateway.server import PooledHTTPServer, Supervisor
 
-from lambda_gateway import __version__
+from lambda_gateway import __version__, bench, cache, replay, request_body
 
 
 def get_best_family(*address):  # pragma: no cover
@@ -42,6 +51,22 @@ def get_opts():
         prog="lambda-gateway",
         description="Start a simple Lambda Gateway server",
     )
+    parser.add_argument(
+        "--access-log-format",
+        choices=FORMATS,
+        default="text",
+        dest="access_log_format",
+        help="Access log format [default: text]",
+    )
+    parser.add_argument(
+        "--access-log-rate",
+        dest="access_log_rate",
+        default=1.0,
+        help="Fraction of requests to log, 5xx responses are always logged "
+        "[default: 1]",
+        metavar="FRACTION",
+        type=float,
+    )
     parser.add_argument(
         "-B",
         "--base-path",
@@ -56,6 +81,118 @@ def get_opts():
         metavar="ADDR",
         help="Specify alternate bind address [default: all interfaces]",
     )
+    parser.add_argument(
+        "--cache-ttl",
+        dest="cache_ttl",
+        help="Cache responses to GET requests for N seconds, like an API "
+        "Gateway stage cache [default: no cache]",
+        metavar="SECONDS",
+        type=float,
+    )
+    parser.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        default=cache.MAX_ENTRIES,
+        help="Maximum cached responses, least recently used are evicted "
+        f"[default: {cache.MAX_ENTRIES}]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--cache-key-param",
+        action="append",
+        dest="cache_key_params",
+        help="Query string parameter of the cache key, may be repeated "
+        "[default: all parameters]",
+        metavar="NAME",
+    )
+    parser.add_argument(
+        "--cache-key-header",
+        action="append",
+        dest="cache_key_headers",
+        help="Header of the cache key, may be repeated [default: no headers]",
+        metavar="NAME",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=["thread", "asyncio"],
+        default="thread",
+        help="Server engine [default: thread]",
+    )
+    parser.add_argument(
+        "--environments",
+        dest="environments",
+        help="Run the handler in up to N isolated subprocess execution "
+        "environments, one invocation at a time each [default: run in-process]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--handler-threads",
+        dest="handler_threads",
+        help="Run synchronous handlers on at most N threads "
+        "[default: min(32, CPUs + 4), or environments per handler]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        dest="idle_timeout",
+        default=300,
+        help="Shut down execution environments idle for N seconds " "[default: 300]",
+        metavar="SECONDS",
+        type=float,
+    )
+    parser.add_argument(
+        "-k",
+        "--keep-alive",
+        dest="keep_alive",
+        default=5,
+        help="Idle timeout for persistent connections, 0 to disable [default: 5]",
+        metavar="SECONDS",
+        type=float,
+    )
+    parser.add_argument(
+        "--max-requests",
+        dest="max_requests",
+        default=1000,
+        help="Close persistent connections after N requests [default: 1000]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--max-body-size",
+        dest="max_body_size",
+        default=request_body.MAX_BODY_SIZE,
+        help="Reject request bodies larger than N bytes with 413, 0 for no "
+        f"limit [default: {request_body.MAX_BODY_SIZE}]",
+        metavar="BYTES",
+        type=int,
+    )
+    parser.add_argument(
+        "--memory",
+        dest="memory",
+        help="Lambda memory size, reported by the context and enforced in "
+        "execution environments [default: 128]",
+        metavar="MB",
+        type=int,
+    )
+    parser.add_argument(
+        "--metrics-path",
+        dest="metrics_path",
+        help="Serve Prometheus metrics at PATH, e.g. /metrics "
+        "[default: no metrics endpoint]",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--min-compression-size",
+        dest="min_compression_size",
+        help="Compress response bodies of at least N bytes with gzip/deflate "
+        "when the client accepts it [default: no compression]",
+        metavar="BYTES",
+        type=int,
+    )
     parser.add_argument(
         "-p",
         "--port",
@@ -64,6 +201,67 @@ def get_opts():
         help="Specify alternate port [default: 8000]",
         type=int,
     )
+    parser.add_argument(
+        "--pool-size",
+        dest="pool_size",
+        help="Handle connections on a fixed pool of N worker threads "
+        "[default: one thread per connection]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        help="Profile requests with cProfile and write aggregated pstats & "
+        "collapsed stacks per phase to DIR on SIGUSR1 and at shutdown "
+        "[default: no profiling]",
+        metavar="DIR",
+    )
+    parser.add_argument(
+        "--profile-rate",
+        dest="profile_rate",
+        default=1.0,
+        help="Fraction of requests to profile [default: 1]",
+        metavar="FRACTION",
+        type=float,
+    )
+    parser.add_argument(
+        "--queue-depth",
+        dest="queue_depth",
+        default=64,
+        help="Maximum connections waiting for a pooled worker before "
+        "responding 429 [default: 64]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--record",
+        dest="record",
+        help="Append each invocation's event, response & timing to a JSONL "
+        "file, for lambda-gateway replay [default: no recording]",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--reload",
+        action="store_true",
+        dest="reload",
+        help="Reload the handler when its module changes",
+    )
+    parser.add_argument(
+        "--reload-package",
+        action="store_true",
+        dest="reload_package",
+        help="Reload the handler when any module of its top-level package "
+        "changes (implies --reload)",
+    )
+    parser.add_argument(
+        "--routes",
+        dest="routes",
+        help="Route requests to handlers by route key, from a JSON file like "
+        '{"GET /items/{id}": "items.get_item"}; HANDLER, if any, is the '
+        "$default route [default: every request to HANDLER]",
+        metavar="FILE",
+    )
     parser.add_argument(
         "-t",
         "--timeout",
@@ -79,6 +277,15 @@ def get_opts():
         help="Print version and exit",
         version=f"%(prog)s {__version__}",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        default=1,
+        help="Fork N server processes sharing the listening socket [default: 1]",
+        metavar="N",
+        type=int,
+    )
     parser.add_argument(
         "-V",
         "--payload-version",
@@ -89,16 +296,59 @@ def get_opts():
     parser.add_argument(
         "HANDLER",
         help="Lambda handler signature",
+        nargs="?",
     )
-    return parser.parse_args()
+    opts = parser.parse_args()
+    if opts.HANDLER is None and opts.routes is None:
+        parser.error("a HANDLER or --routes is required")
+    return opts
+
 
+def get_server(address_family, addr, opts, proxy, access_log=None):
+    """
+    Get HTTP server for CLI options.
 
-def run(httpd, base_path="/"):
+    :param int address_family: Socket address family
+    :param tuple addr: host/port tuple
+    :param Namespace opts: CLI options
+    :param EventProxy proxy: Lambda event proxy
+    :param AccessLog access_log: Access log of the asyncio engine
+    :returns object: HTTPServer instance
+    """
+    if opts.engine == "asyncio":
+        AsyncHTTPServer.address_family = address_family
+        return AsyncHTTPServer(
+            addr,
+            proxy,
+            opts.payload_version,
+            opts.keep_alive,
+            opts.max_requests,
+            opts.max_body_size,
+            opts.min_compression_size,
+            opts.metrics_path,
+            proxy.profiler,
+            access_log,
+        )
+    if opts.pool_size:
+        PooledHTTPServer.address_family = address_family
+        return PooledHTTPServer(
+            addr,
+            LambdaRequestHandler,
+            opts.pool_size,
+            opts.queue_depth,
+        )
+    server.ThreadingHTTPServer.address_family = address_family
+    return server.ThreadingHTTPServer(addr, LambdaRequestHandler)
+
+
+def run(httpd, base_path="/", proxy=None, reloader=None):
     """
     Run Lambda Gateway server.
 
-    :param object httpd: ThreadingHTTPServer instance
+    :param object httpd: HTTPServer instance
     :param str base_path: REST API base path
+    :param EventProxy proxy: EventProxy to close on exit
+    :param Reloader reloader: Handler reloader to run while serving
     """
     host, port = httpd.socket.getsockname()[:2]
     url_host = f"[{host}]" if ":" in host else host
@@ -106,18 +356,30 @@ def run(httpd, base_path="/"):
         f"Serving HTTP on {host} port {port} "
         f"(http://{url_host}:{port}{base_path}) ...\n"
     )
+    if reloader is not None:
+        reloader.start()
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         sys.stderr.write("\nKeyboard interrupt received, exiting.\n")
     finally:
+        if reloader is not None:
+            reloader.close()
         httpd.shutdown()
+        if proxy is not None:
+            proxy.close()
 
 
 def main():
     """
     Main entrypoint.
     """
+    # Subcommands
+    if sys.argv[1:2] == ["bench"]:
+        return bench.main(sys.argv[2:])
+    if sys.argv[1:2] == ["replay"]:
+        return replay.main(sys.argv[2:])
+
     # Parse opts
     opts = get_opts()
 
@@ -126,13 +388,70 @@ def main():
 
     # Setup handler
     address_family, addr = get_best_family(opts.bind, opts.port)
-    proxy = EventProxy(opts.HANDLER, base_path, opts.timeout)
+    try:
+        recorder = Recorder(opts.record) if opts.record else None
+    except OSError as err:
+        sys.exit(f"lambda-gateway: error: {err}")
+    profiler = None
+    if opts.profile:
+        try:
+            os.makedirs(opts.profile, exist_ok=True)
+        except OSError as err:
+            sys.exit(f"lambda-gateway: error: {err}")
+        profiler = Profiler(opts.profile, opts.profile_rate)
+    try:
+        routes = load_routes(opts.routes) if opts.routes else None
+    except (OSError, ValueError) as err:
+        sys.exit(f"lambda-gateway: error: {err}")
+    response_cache = None
+    if opts.cache_ttl:
+        response_cache = cache.ResponseCache(
+            opts.cache_ttl,
+            opts.cache_size,
+            opts.cache_key_params,
+            opts.cache_key_headers,
+        )
+    proxy = EventProxy(
+        opts.HANDLER,
+        base_path,
+        opts.timeout,
+        opts.handler_threads,
+        opts.environments,
+        opts.idle_timeout,
+        opts.memory,
+        recorder,
+        response_cache,
+        profiler,
+        routes,
+    )
+    try:
+        if proxy.pool is not None:
+            proxy.pool.check()
+        elif proxy.handler:
+            proxy.load_handler()
+    except ValueError as err:
+        sys.exit(f"lambda-gateway: error: {err}")
+    reloader = None
+    if opts.reload or opts.reload_package:
+        reloader = Reloader(proxy, opts.reload_package)
     LambdaRequestHandler.set_proxy(proxy, opts.payload_version)
-    server.ThreadingHTTPServer.address_family = address_family
+    LambdaRequestHandler.set_keep_alive(opts.keep_alive, opts.max_requests)
+    LambdaRequestHandler.set_max_body_size(opts.max_body_size)
+    LambdaRequestHandler.set_compression(opts.min_compression_size)
+    LambdaRequestHandler.set_metrics(opts.metrics_path)
+    LambdaRequestHandler.set_profiler(profiler)
+    access_log = AccessLog(opts.access_log_format, opts.access_log_rate)
+    LambdaRequestHandler.set_access_log(access_log)
+    if profiler is not None:
+        signal.signal(signal.SIGUSR1, profiler.dump_async)
 
     # Start server
-    with server.ThreadingHTTPServer(addr, LambdaRequestHandler) as httpd:
-        run(httpd, base_path)
+    with get_server(address_family, addr, opts, proxy, access_log) as httpd:
+        if opts.workers > 1:
+            target = functools.partial(run, httpd, base_path, proxy, reloader)
+            Supervisor(httpd, target, opts.workers).run()
+        else:
+            run(httpd, base_path, proxy, reloader)
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -0,0 +1,126 @@
+import json
+import logging
+import random
+import time
+
+from lambda_gateway import LogQueue
+
+FORMATS = ("text", "json")
+
+logger = logging.getLogger("lambda_gateway.access")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+class AccessFormatter(logging.Formatter):
+    """
+    Format access log records, in the format of their AccessLog.
+
+    Records carry the request's fields, which are only formatted here, on
+    the LogQueue's listener thread.
+    """
+
+    def format(self, record):
+        if record.log_format == "json":
+            return format_json(record)
+        return format_text(record)
+
+
+class AccessLog:
+    """
+    Access log of the requests served, sampled at high request rates.
+
+    "text" lines are in the format of http.server; "json" lines are objects
+    named after API Gateway's access log variables, with the client address,
+    the latency (ms, from the request being read to its response being sent)
+    and the Lambda request ID. Responses with a 5xx status are always
+    logged, whatever the sampling rate.
+
+    :param str log_format: "text" or "json"
+    :param float rate: Fraction of requests to log [default: all of them]
+    """
+
+    def __init__(self, log_format="text", rate=1.0):
+        if log_format not in FORMATS:
+            raise ValueError(f"Unknown access log format: {log_format}")
+        self.log_format = log_format
+        self.rate = rate
+
+    def sample(self, status):
+        """
+        Decide whether to log a request.
+
+        :param int status: Response status code
+        :returns bool: True to log the request
+        """
+        if self.rate >= 1 or (isinstance(status, int) and status >= 500):
+            return True
+        return random.random() < self.rate
+
+    def log(self, client, requestline, status, latency=None, request_id=None):
+        """
+        Log a request, if it is sampled.
+
+        :param str client: Client address
+        :param str requestline: HTTP request line
+        :param int status: Response status code
+        :param float latency: Seconds from request to response
+        :param str request_id: Lambda request ID
+        """
+        if not self.sample(status):
+            return
+        logger.info(
+            requestline,
+            extra={
+                "log_format": self.log_format,
+                "client": client,
+                "requestline": requestline,
+                "status": status,
+                "latency": latency,
+                "request_id": request_id,
+            },
+        )
+
+
+def format_text(record):
+    """
+    Format an access log record like http.server.
+
+    :param LogRecord record: Access log record
+    :returns str: Log line
+    """
+    timestamp = time.strftime("%d/%b/%Y %H:%M:%S", time.localtime(record.created))
+    return (
+        f'{record.client or "-"} - - [{timestamp}] '
+        f'"{record.requestline}" {record.status} -'
+    )
+
+
+def format_json(record):
+    """
+    Format an access log record as JSON.
+
+    :param LogRecord record: Access log record
+    :returns str: Log line
+    """
+    httpMethod, path, protocol = (record.requestline.split(" ") + [None] * 3)[:3]
+    status, latency = record.status, record.latency
+    return json.dumps(
+        {
+            "requestTime": time.strftime(
+                "%d/%b/%Y:%H:%M:%S +0000", time.gmtime(record.created)
+            ),
+            "requestId": record.request_id,
+            "ip": record.client,
+            "httpMethod": httpMethod,
+            "path": path,
+            "protocol": protocol,
+            "status": int(status) if isinstance(status, int) else None,
+            "responseLatency": None if latency is None else round(latency * 1e3, 3),
+        }
+    )
+
+
+handler = logging.StreamHandler()
+handler.setFormatter(AccessFormatter())
+queue = LogQueue(logger, handler)
@@ -0,0 +1,420 @@
+import asyncio
+import email.utils
+import http.client
+import io
+import socket
+import sys
+import time
+import traceback
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler
+
+from lambda_gateway import (
+    events,
+    lambda_context,
+    logger,
+    metrics,
+    request_body,
+    responses,
+)
+from lambda_gateway.access_log import AccessLog
+from lambda_gateway.event_proxy import EventProxy
+
+METHODS = {"DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT"}
+
+
+class AsyncHTTPServer:
+    """
+    HTTP/1.1 server built on asyncio.start_server.
+
+    Connections are handled as coroutines on a single event loop, so idle or
+    slow clients do not each hold a thread. Lambda handlers still run on an
+    executor through EventProxy.
+
+    Mirrors the parts of the http.server.HTTPServer interface used by the CLI
+    (socket, serve_forever, shutdown, server_close) so it can be run and
+    pre-forked in the same way as the threaded servers.
+
+    :param tuple server_address: host/port tuple
+    :param EventProxy proxy: Lambda event proxy
+    :param str version: API Gateway payload version
+    :param float timeout: Idle timeout for persistent connections
+    :param int max_requests: Requests served per connection before closing
+    :param int max_body_size: Maximum request body size in bytes
+    :param int min_compression_size: Compress bodies of at least N bytes
+    :param str metrics_path: Path serving Prometheus metrics
+    :param Profiler profiler: Profiler of the gateway phases
+    :param AccessLog access_log: Access log [default: text, every request]
+    """
+
+    address_family = socket.AF_INET
+    request_queue_size = 128
+    max_header_size = 65536
+    server_version = (
+        f"{SimpleHTTPRequestHandler.server_version} "
+        f"{SimpleHTTPRequestHandler.sys_version}"
+    )
+
+    def __init__(
+        self,
+        server_address,
+        proxy,
+        version,
+        timeout=5,
+        max_requests=None,
+        max_body_size=request_body.MAX_BODY_SIZE,
+        min_compression_size=None,
+        metrics_path=None,
+        profiler=None,
+        access_log=None,
+    ):
+        self.proxy = proxy
+        self.version = version
+        self.timeout = timeout or None
+        self.max_requests = 1 if not timeout else max_requests
+        self.max_body_size = max_body_size
+        self.min_compression_size = min_compression_size
+        self.metrics_path = metrics_path
+        self.profiler = profiler
+        self.access_log = access_log or AccessLog()
+        self.socket = socket.socket(self.address_family, socket.SOCK_STREAM)
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(server_address)
+            self.socket.listen(self.request_queue_size)
+        except OSError:
+            self.socket.close()
+            raise
+        self.server_address = self.socket.getsockname()
+        self._loop = None
+        self._stop = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.server_close()
+
+    def serve_forever(self):
+        """
+        Serve requests until shutdown() is called.
+        """
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """
+        Serve requests on the running event loop until shutdown() is called.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(
+            self.handle_connection,
+            sock=self.socket,
+            limit=self.max_header_size,
+        )
+        async with server:
+            await self._stop.wait()
+
+    def shutdown(self):
+        """
+        Stop serve_forever() (safe to call from any thread).
+        """
+        try:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        except (AttributeError, RuntimeError):
+            pass  # not serving
+
+    def server_close(self):
+        self.socket.close()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Handle requests on a connection until it is closed.
+
+        :param StreamReader reader: Connection reader
+        :param StreamWriter writer: Connection writer
+        """
+        address = writer.get_extra_info("peername")
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            # Headers & body are written separately: do not let Nagle's
+            # algorithm hold the body back until the client's delayed ACK
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        requests_handled = 0
+        try:
+            while True:
+                requests_handled += 1
+                keep_alive = await self.handle_request(
+                    reader, writer, address, requests_handled
+                )
+                if not keep_alive:
+                    break
+        except ConnectionError:  # pragma: no cover
+            pass
+        except Exception:
+            sys.stderr.write(
+                f"Exception occurred during processing of request from {address}\n"
+            )
+            traceback.print_exc()
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader, writer, address, requests_handled):
+        """
+        Parse one request, invoke the Lambda handler and send its response.
+
+        :returns bool: True if the connection may be reused
+        """
+        try:
+            head = await asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"),
+                self.timeout,
+            )
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return False
+        except asyncio.LimitOverrunError:
+            await self.send_error(writer, 431)
+            return False
+
+        # Parse request line & headers
+        requestline, _, head = head.partition(b"\r\n")
+        requestline = requestline.decode("iso-8859-1")
+        try:
+            httpMethod, target, request_version = requestline.split()
+            headers = http.client.parse_headers(io.BytesIO(head))
+        except (ValueError, http.client.HTTPException):
+            await self.send_error(writer, 400)
+            return False
+        if request_version not in ("HTTP/1.0", "HTTP/1.1"):
+            await self.send_error(writer, 505)
+            return False
+        if httpMethod not in METHODS:
+            await self.send_error(writer, 501, httpMethod)
+            return False
+
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        try:
+            return await self.respond(
+                reader, writer, address, requestline, headers, requests_handled
+            )
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+
+    async def respond(
+        self, reader, writer, address, requestline, headers, requests_handled
+    ):
+        """
+        Read the body of a parsed request, invoke the Lambda handler and send
+        its response.
+
+        :returns bool: True if the connection may be reused
+        """
+        httpMethod, target, request_version = requestline.split()
+
+        # Persistent connection semantics of BaseHTTPRequestHandler
+        connection = headers.get("Connection", "").lower()
+        close = request_version == "HTTP/1.0"
+        if connection == "close":
+            close = True
+        elif connection == "keep-alive":
+            close = False
+
+        # Read body
+        start = started = time.perf_counter()
+        try:
+            if (
+                request_version == "HTTP/1.1"
+                and headers.get("Expect", "").lower() == "100-continue"
+            ):
+                request_body.get_content_length(headers, self.max_body_size)
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            data = await request_body.read_body_async(
+                reader,
+                headers,
+                self.max_body_size,
+                self.timeout,
+            )
+        except request_body.RequestBodyError as err:
+            metrics.REQUESTS.inc(httpMethod, metrics.DEFAULT_ROUTE, err.status)
+            await self.send_error(writer, err.status, str(err))
+            self.log_request(
+                address, requestline, err.status, time.perf_counter() - started
+            )
+            return False
+        except asyncio.TimeoutError:
+            return False
+
+        # Invoke Lambda handler (scrapes build no event)
+        is_metrics = self.is_metrics_request(httpMethod, target)
+        request_id = None
+        route_key = metrics.DEFAULT_ROUTE
+        if is_metrics:
+            result = metrics.get_response(httpMethod)
+        else:
+            content_type = headers.get("Content-Type")
+            body, isBase64Encoded = request_body.encode_body(data, content_type)
+            event = self.profile(
+                "event_build",
+                events.get_event,
+                self.version,
+                httpMethod,
+                target,
+                headers,
+                body,
+                isBase64Encoded,
+            )
+            metrics.PHASE_SECONDS.observe(time.perf_counter() - start, "event_build")
+            request_id = lambda_context.get_request_id()
+            route = self.proxy.route(event)
+            if route is not None:
+                route_key = route.key
+            result, invoked = await self.proxy.arespond(
+                event, request_id=request_id, route=route
+            )
+            if not invoked:
+                # Cached & unrouted responses are not Lambda invocations
+                request_id = None
+        start = time.perf_counter()
+        args = (
+            httpMethod,
+            result,
+            headers.get("Accept-Encoding"),
+            self.min_compression_size,
+        )
+        if is_metrics:
+            status, headers, body = responses.get_response(*args)
+        else:
+            status, headers, body = self.profile(
+                "response_write", responses.get_response, *args
+            )
+        if request_id is not None:
+            headers.append((responses.REQUEST_ID_HEADER, request_id))
+
+        # Send response
+        stream = responses.is_stream(body)
+        chunked = stream and request_version == "HTTP/1.1"
+        if stream and not chunked:
+            close = True
+        if chunked:
+            headers.append(("Transfer-Encoding", "chunked"))
+        if close or (self.max_requests and requests_handled >= self.max_requests):
+            close = True
+            headers.append(("Connection", "close"))
+        elif request_version == "HTTP/1.0":
+            headers.append(("Connection", "keep-alive"))
+        if stream:
+            await self.send_response(writer, status, headers, b"")
+            close = not await self.send_stream(writer, body, chunked) or close
+        else:
+            await self.send_response(writer, status, headers, body)
+        if not is_metrics:
+            metrics.PHASE_SECONDS.observe(time.perf_counter() - start, "response_write")
+            metrics.REQUESTS.inc(httpMethod, route_key, status)
+        self.log_request(
+            address,
+            requestline,
+            status,
+            time.perf_counter() - started,
+            request_id,
+        )
+        return not close
+
+    def profile(self, phase, func, *args):
+        """
+        Call a function, profiled as a gateway phase when profiling is on.
+
+        :param str phase: Phase, e.g. "event_build"
+        :param function func: Function
+        :param tuple args: Function arguments
+        :returns object: Function result
+        """
+        if self.profiler is None:
+            return func(*args)
+        return self.profiler.call(phase, func, *args)
+
+    def is_metrics_request(self, httpMethod, target):
+        """
+        Check whether a request is for the metrics endpoint.
+
+        :param str httpMethod: HTTP request method
+        :param str target: HTTP request target (path & query string)
+        :returns bool: True for GET/HEAD requests of the metrics path
+        """
+        if self.metrics_path is None or httpMethod not in ("GET", "HEAD"):
+            return False
+        path, *_ = target.split("?")
+        return path == self.metrics_path
+
+    async def send_response(self, writer, status, headers, body):
+        """
+        Write response to the connection.
+
+        :param StreamWriter writer: Connection writer
+        :param int status: Response status code
+        :param list headers: Response header tuples
+        :param bytes body: Response body
+        """
+        try:
+            phrase = HTTPStatus(status).phrase
+        except ValueError:
+            phrase = ""
+        lines = [
+            f"HTTP/1.1 {status} {phrase}",
+            f"Server: {self.server_version}",
+            f"Date: {email.utils.formatdate(usegmt=True)}",
+            *[f"{key}: {val}" for key, val in headers],
+            "",
+            "",
+        ]
+        writer.write("\r\n".join(lines).encode("latin-1", "strict"))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+    async def send_stream(self, writer, stream, chunked=True):
+        """
+        Write streamed body to the connection as chunks are produced.
+
+        :param StreamWriter writer: Connection writer
+        :param Iterator|AsyncIterator stream: Response body stream
+        :param bool chunked: Frame chunks for Transfer-Encoding: chunked
+        :returns bool: False if the stream failed part way
+        """
+        try:
+            async for chunk in self.proxy.aiter_stream(stream):
+                writer.write(responses.frame_chunk(chunk) if chunked else chunk)
+                await writer.drain()
+        except Exception as err:
+            logger.error("Response stream failed: %s", err)
+            return False
+        if chunked:
+            writer.write(responses.LAST_CHUNK)
+            await writer.drain()
+        return True
+
+    async def send_error(self, writer, status, message=None):
+        """
+        Write error response to the connection and close it.
+
+        :param StreamWriter writer: Connection writer
+        :param int status: Response status code
+        :param str message: Error message [default: status phrase]
+        """
+        message = message or HTTPStatus(status).phrase
+        res = EventProxy.jsonify("GET", status, message=message)
+        status, headers, body = responses.get_response("GET", res)
+        headers.append(("Connection", "close"))
+        await self.send_response(writer, status, headers, body)
+
+    def log_request(self, address, requestline, status, latency=None, request_id=None):
+        """
+        Write access log line.
+
+        :param tuple address: Client address
+        :param str requestline: HTTP request line
+        :param int status: Response status code
+        :param float latency: Seconds from request to response
+        :param str request_id: Lambda request ID
+        """
+        host = address[0] if address else "-"
+        self.access_log.log(host, requestline, status, latency, request_id)
@@ -0,0 +1,541 @@
+"""
+Load generator for Lambda Gateway.
+
+usage:
+  lambda-gateway bench [options] URL|HANDLER
+"""
+
+import argparse
+import collections
+import http.client
+import itertools
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from urllib import parse
+
+from lambda_gateway import events, logger
+from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.responses import is_stream
+
+
+class Request:
+    """
+    Request sent by the load generator.
+
+    :param str method: HTTP request method
+    :param str target: URL or HTTP request target (path & query string)
+    :param dict headers: HTTP request headers
+    :param str body: HTTP request body
+    """
+
+    def __init__(self, method="GET", target="/", headers=None, body=None):
+        self.method = method
+        self.target = target
+        self.headers = headers or {}
+        self.body = body
+
+    def render(self, n):
+        """
+        Fill in the {n} placeholder of the target with a request number.
+
+        :param int n: Request number
+        :returns str: Request target
+        """
+        return self.target.replace("{n}", str(n))
+
+
+def load_requests(path, default):
+    """
+    Load requests from a JSONL file, one request object per line.
+
+    Each object may set method, path (or url), headers & body; missing
+    fields are taken from the default request.
+
+    :param str path: JSONL file path
+    :param Request default: Default request
+    :returns list: Requests
+    """
+    requests = []
+    with open(path) as jsonl:
+        for line in jsonl:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = item.get("body", default.body)
+            if body is not None and not isinstance(body, str):
+                body = json.dumps(body)
+            requests.append(
+                Request(
+                    item.get("method", default.method),
+                    item.get("url") or item.get("path") or default.target,
+                    {**default.headers, **item.get("headers", {})},
+                    body,
+                )
+            )
+    if not requests:
+        raise ValueError(f"No requests in {path}")
+    return requests
+
+
+class Schedule:
+    """
+    Hands out request numbers to workers until the duration or request
+    count is reached, pacing them to a target rate if there is one.
+
+    :param float duration: Seconds to run for
+    :param int requests: Number of requests to send [default: no limit]
+    :param float rate: Requests per second [default: as fast as possible]
+    """
+
+    def __init__(self, duration, requests=None, rate=None):
+        self.duration = duration
+        self.requests = requests
+        self.rate = rate
+        self.start = None
+        self.stopped = False
+        self._numbers = itertools.count()
+
+    def begin(self):
+        """
+        Start the clock.
+        """
+        self.start = time.perf_counter()
+
+    def stop(self):
+        """
+        Stop handing out requests, e.g. on Ctrl-C.
+        """
+        self.stopped = True
+
+    def next(self):
+        """
+        Get the next request number, waiting for its slot at the target rate.
+
+        :returns int: Request number (None once done)
+        """
+        n = next(self._numbers)
+        if self.stopped or (self.requests is not None and n >= self.requests):
+            return None
+        now = time.perf_counter()
+        if self.rate:
+            due = self.start + n / self.rate
+            if due > now:
+                time.sleep(due - now)
+                now = due
+        if self.duration and now - self.start >= self.duration:
+            return None
+        return n
+
+
+class HTTPClient:
+    """
+    Client of a running gateway, with one persistent connection per worker.
+
+    :param str url: Base URL of the gateway
+    :param float timeout: Socket timeout in seconds
+    """
+
+    def __init__(self, url, timeout=30):
+        self.url = parse.urlsplit(url)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connect(self):
+        """
+        Get the calling worker's connection.
+
+        :returns HTTPConnection: Connection
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.url.scheme == "https":
+                conn = http.client.HTTPSConnection(
+                    self.url.netloc, timeout=self.timeout
+                )
+            else:
+                conn = http.client.HTTPConnection(self.url.netloc, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def send(self, request, n):
+        """
+        Send a request and read the whole response.
+
+        :param Request request: Request
+        :param int n: Request number
+        :returns int: Response status code
+        """
+        url = parse.urlsplit(parse.urljoin(self.url.geturl(), request.render(n)))
+        target = parse.urlunsplit(("", "", url.path or "/", url.query, ""))
+        conn = self.connect()
+        try:
+            conn.request(request.method, target, request.body, request.headers)
+            res = conn.getresponse()
+            res.read()
+        except Exception:
+            conn.close()
+            self._local.conn = None
+            raise
+        if res.will_close:
+            conn.close()
+            self._local.conn = None
+        return res.status
+
+    def close(self):
+        """
+        Nothing to clean up: worker connections close with their threads.
+        """
+
+
+class ProxyClient:
+    """
+    Client invoking the handler in-process through an EventProxy, to measure
+    the gateway without any networking.
+
+    :param str handler: Lambda handler signature
+    :param str version: API Gateway payload version
+    :param float timeout: Lambda timeout in seconds
+    :param int max_workers: Handler executor threads
+    """
+
+    def __init__(self, handler, version="2.0", timeout=None, max_workers=None):
+        self.version = version
+        self.proxy = EventProxy(handler, "/", timeout, max_workers)
+        self.proxy.load_handler()
+
+    def send(self, request, n):
+        """
+        Invoke the handler with the event of a request.
+
+        :param Request request: Request
+        :param int n: Request number
+        :returns int: Response status code
+        """
+        event = events.get_event(
+            self.version,
+            request.method,
+            request.render(n),
+            request.headers,
+            request.body or "",
+        )
+        result = self.proxy.invoke(event)
+        if is_stream(result):
+            result = {"statusCode": 200, "body": result}
+        body = result.get("body")
+        if is_stream(body):
+            collections.deque(self.proxy.iter_stream(body), 0)
+        return result.get("statusCode") or 500
+
+    def close(self):
+        """
+        Shut down the proxy.
+        """
+        self.proxy.close()
+
+
+class Results:
+    """
+    Latencies & outcomes of a benchmark run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.errors = collections.Counter()
+        self.elapsed = 0.0
+
+    def record(self, latency, status=None, error=None):
+        """
+        Record one request.
+
+        :param float latency: Latency in seconds
+        :param int status: Response status code
+        :param str error: Error type, if the request failed
+        """
+        with self._lock:
+            self.latencies.append(latency)
+            if error is None:
+                self.statuses[status] += 1
+            else:
+                self.errors[error] += 1
+
+    def summary(self):
+        """
+        Summarize the run.
+
+        :returns dict: Throughput, latency percentiles (ms) & outcome counts
+        """
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        ok = sum(n for status, n in self.statuses.items() if status < 400)
+        return {
+            "requests": count,
+            "duration": self.elapsed,
+            "throughput": count / self.elapsed if self.elapsed else 0,
+            "latency": {
+                "mean": sum(latencies) / count * 1000 if count else 0,
+                "p50": percentile(latencies, 50) * 1000,
+                "p90": percentile(latencies, 90) * 1000,
+                "p99": percentile(latencies, 99) * 1000,
+                "max": latencies[-1] * 1000 if count else 0,
+            },
+            "ok": ok,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "errors": dict(sorted(self.errors.items())),
+        }
+
+
+def percentile(latencies, p):
+    """
+    Nearest-rank percentile.
+
+    :param list latencies: Sorted latencies
+    :param float p: Percentile (0-100)
+    :returns float: Latency at the percentile (0 if there are none)
+    """
+    if not latencies:
+        return 0
+    rank = max(math.ceil(p / 100 * len(latencies)), 1)
+    return latencies[rank - 1]
+
+
+def work(client, requests, schedule, results):
+    """
+    Worker loop: send requests until the schedule is done.
+
+    :param object client: HTTPClient or ProxyClient
+    :param list requests: Requests to cycle through
+    :param Schedule schedule: Request schedule
+    :param Results results: Results to record into
+    """
+    while True:
+        n = schedule.next()
+        if n is None:
+            return
+        request = requests[n % len(requests)]
+        start = time.perf_counter()
+        try:
+            status = client.send(request, n)
+        except Exception as err:
+            results.record(time.perf_counter() - start, error=type(err).__name__)
+        else:
+            results.record(time.perf_counter() - start, status)
+
+
+def run(client, requests, schedule, concurrency=1):
+    """
+    Run a benchmark.
+
+    Ctrl-C stops the run early; the requests made so far are still reported.
+
+    :param object client: HTTPClient or ProxyClient
+    :param list requests: Requests to cycle through
+    :param Schedule schedule: Request schedule
+    :param int concurrency: Number of concurrent workers
+    :returns Results: Benchmark results
+    """
+    results = Results()
+    schedule.begin()
+    workers = [
+        threading.Thread(
+            target=work,
+            args=(client, requests, schedule, results),
+            name=f"lambda-gateway-bench-{i}",
+            daemon=True,
+        )
+        for i in range(concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        schedule.stop()
+        for worker in workers:
+            worker.join()
+    results.elapsed = time.perf_counter() - schedule.start
+    return results
+
+
+def format_summary(summary):
+    """
+    Format a run summary for humans.
+
+    :param dict summary: Run summary
+    :returns str: Report
+    """
+    latency = summary["latency"]
+    lines = [
+        f"Requests:    {summary['requests']} in {summary['duration']:.2f} s",
+        f"Throughput:  {summary['throughput']:.1f} req/s",
+        f"Latency:     mean {latency['mean']:.2f} ms, "
+        f"p50 {latency['p50']:.2f} ms, p90 {latency['p90']:.2f} ms, "
+        f"p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms",
+        "Statuses:    "
+        + (", ".join(f"{k}: {v}" for k, v in summary["statuses"].items()) or "-"),
+        "Errors:      "
+        + (", ".join(f"{k}: {v}" for k, v in summary["errors"].items()) or "-"),
+    ]
+    return "\n".join(lines)
+
+
+def get_opts(argv=None):
+    """
+    Get bench CLI options.
+
+    :param list argv: Arguments [default: sys.argv]
+    """
+    parser = argparse.ArgumentParser(
+        prog="lambda-gateway bench",
+        description="Drive a running gateway (URL) or a handler in-process "
+        "(HANDLER) and report throughput & latency.",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        default=10,
+        help="Concurrent workers [default: 10]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        default=10,
+        help="Seconds to run for, 0 for no limit [default: 10]",
+        metavar="SECONDS",
+        type=float,
+    )
+    parser.add_argument(
+        "-n",
+        "--requests",
+        help="Stop after N requests [default: no limit]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "-r",
+        "--rate",
+        help="Requests per second across all workers [default: no limit]",
+        metavar="RPS",
+        type=float,
+    )
+    parser.add_argument(
+        "-X",
+        "--method",
+        default="GET",
+        help="HTTP request method [default: GET]",
+    )
+    parser.add_argument(
+        "-H",
+        "--header",
+        action="append",
+        default=[],
+        dest="headers",
+        help="HTTP request header, may be repeated",
+        metavar="'NAME: VALUE'",
+    )
+    parser.add_argument(
+        "--data",
+        help="HTTP request body",
+    )
+    parser.add_argument(
+        "-f",
+        "--requests-file",
+        dest="requests_file",
+        help="JSONL file of requests to cycle through, one object with "
+        "method, path, headers & body per line",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--path",
+        default="/",
+        help="Request target for HANDLER; {n} is replaced by the request "
+        "number [default: /]",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        help="Socket timeout for URL, Lambda timeout for HANDLER",
+        metavar="SECONDS",
+        type=float,
+    )
+    parser.add_argument(
+        "-V",
+        "--payload-version",
+        choices=["1.0", "2.0"],
+        default="2.0",
+        help="API Gateway payload version for HANDLER [default: 2.0]",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the summary as JSON",
+    )
+    parser.add_argument(
+        "TARGET",
+        help="Gateway URL (may contain {n}, replaced by the request number) "
+        "or Lambda handler signature to invoke in-process",
+    )
+    opts = parser.parse_args(argv)
+    if not opts.duration and opts.requests is None:
+        parser.error("one of --duration or --requests must be set")
+    return opts
+
+
+def get_client(opts):
+    """
+    Get the client & default request for CLI options.
+
+    :param Namespace opts: bench CLI options
+    :returns tuple: Client & default Request
+    """
+    headers = dict(
+        (key.strip(), val.strip())
+        for key, _, val in (header.partition(":") for header in opts.headers)
+    )
+    if "://" in opts.TARGET:
+        client = HTTPClient(opts.TARGET, opts.timeout or 30)
+        target = opts.TARGET
+    else:
+        logger.logger.setLevel(logging.WARNING)
+        client = ProxyClient(
+            opts.TARGET,
+            opts.payload_version,
+            opts.timeout,
+            opts.concurrency,
+        )
+        target = opts.path
+    return client, Request(opts.method, target, headers, opts.data)
+
+
+def main(argv=None):
+    """
+    Run the bench CLI.
+
+    :param list argv: Arguments [default: sys.argv]
+    """
+    opts = get_opts(argv)
+    try:
+        client, default = get_client(opts)
+        requests = [default]
+        if opts.requests_file:
+            requests = load_requests(opts.requests_file, default)
+    except (OSError, ValueError) as err:
+        sys.exit(f"lambda-gateway bench: error: {err}")
+    schedule = Schedule(opts.duration, opts.requests, opts.rate)
+    try:
+        results = run(client, requests, schedule, opts.concurrency)
+    finally:
+        client.close()
+    summary = results.summary()
+    if opts.json:
+        print(json.dumps(summary))
+    else:
+        print(format_summary(summary))
@@ -0,0 +1,178 @@
+import collections
+import threading
+import time
+
+from lambda_gateway import logger, metrics
+from lambda_gateway.responses import is_stream
+
+MAX_ENTRIES = 1000
+
+
+class ResponseCache:
+    """
+    Cache of handler responses to GET requests, like API Gateway's stage
+    cache.
+
+    Responses are cached for ttl seconds under a key of the request path,
+    its query string parameters (or only the chosen ones) and the chosen
+    headers. Once max_entries responses are cached, the least recently used
+    one is evicted. Only complete (not streamed) 2xx responses are cached.
+    A request with "Cache-Control: max-age=0" skips the cache and its
+    response replaces the cached one.
+
+    :param float ttl: Seconds a response is cached for
+    :param int max_entries: Maximum number of cached responses
+    :param list params: Query string parameters of the cache key
+        [default: all of them]
+    :param list headers: Headers of the cache key [default: none]
+    """
+
+    def __init__(self, ttl, max_entries=MAX_ENTRIES, params=None, headers=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.params = None if params is None else tuple(params)
+        self.headers = tuple(header.lower() for header in headers or ())
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_key(self, httpMethod, path, event):
+        """
+        Get the cache key of a request.
+
+        :param str httpMethod: HTTP request method
+        :param str path: Request path
+        :param dict event: Lambda event object
+        :returns tuple: Cache key
+        """
+        query = event.get("queryStringParameters") or {}
+        if self.params is None:
+            params = tuple(sorted(query.items()))
+        else:
+            params = tuple((name, query.get(name)) for name in self.params)
+        headers = get_headers(event)
+        return (
+            httpMethod,
+            path,
+            params,
+            tuple(headers.get(name) for name in self.headers),
+        )
+
+    def get(self, key, event):
+        """
+        Get the cached response of a request.
+
+        :param tuple key: Cache key
+        :param dict event: Lambda event object
+        :returns dict: Lambda invocation result (None on a miss)
+        """
+        if is_invalidation(event):
+            metrics.CACHE_REQUESTS.inc("invalidate")
+            with self._lock:
+                self.entries.pop(key, None)
+                self.misses += 1
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        metrics.CACHE_REQUESTS.inc("miss" if entry is None else "hit")
+        return None if entry is None else copy_result(entry[1])
+
+    def put(self, key, result):
+        """
+        Cache the response of a request, if it is cacheable.
+
+        :param tuple key: Cache key
+        :param dict result: Lambda invocation result
+        """
+        if not is_cacheable(result):
+            return
+        entry = (time.monotonic() + self.ttl, copy_result(result))
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop all cached responses.
+        """
+        with self._lock:
+            self.entries.clear()
+
+    def close(self):
+        """
+        Log the hit ratio and drop all cached responses.
+        """
+        total = self.hits + self.misses
+        logger.info(
+            "Response cache: %d hits, %d misses (%.1f%% hit ratio)",
+            self.hits,
+            self.misses,
+            self.hits / total * 100 if total else 0,
+        )
+        self.clear()
+
+
+def get_headers(event):
+    """
+    Get the request headers of an event, with lowercase names.
+
+    :param dict event: Lambda event object
+    :returns dict: Request headers
+    """
+    headers = event.get("headers") or {}
+    return {key.lower(): val for key, val in headers.items()}
+
+
+def is_invalidation(event):
+    """
+    Check whether a request asks for a fresh response.
+
+    :param dict event: Lambda event object
+    :returns bool: True if the request has Cache-Control: max-age=0
+    """
+    cache_control = get_headers(event).get("cache-control") or ""
+    return any(
+        directive.strip().lower() == "max-age=0"
+        for directive in cache_control.split(",")
+    )
+
+
+def is_cacheable(result):
+    """
+    Check whether a Lambda result can be cached.
+
+    :param dict result: Lambda invocation result
+    :returns bool: True for complete 2xx responses
+    """
+    if not isinstance(result, dict) or is_stream(result.get("body")):
+        return False
+    return 200 <= (result.get("statusCode") or 500) < 300
+
+
+def copy_result(result):
+    """
+    Copy a Lambda result, so that cached responses are never shared.
+
+    :param dict result: Lambda invocation result
+    :returns dict: Copy of the result
+    """
+    result = dict(result)
+    for key in ("headers", "multiValueHeaders"):
+        if isinstance(result.get(key), dict):
+            result[key] = dict(result[key])
+    return result
@@ -0,0 +1,171 @@
+import zlib
+
+BLOCK_SIZE = 64 * 1024
+WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+COMPRESSED_TYPES = {
+    "application/gzip",
+    "application/pdf",
+    "application/x-7z-compressed",
+    "application/x-bzip2",
+    "application/x-gzip",
+    "application/x-rar-compressed",
+    "application/x-xz",
+    "application/zip",
+    "application/zstd",
+    "font/woff",
+    "font/woff2",
+}
+
+
+def is_compressible(content_type):
+    """
+    Check whether a Content-Type is worth compressing.
+
+    :param str content_type: Content-Type header value
+    :returns bool: False for images, audio, video & archive formats
+    """
+    mime = content_type.split(";", 1)[0].strip().lower()
+    if mime in COMPRESSED_TYPES:
+        return False
+    if mime.startswith(("image/", "audio/", "video/")):
+        return mime == "image/svg+xml"
+    return True
+
+
+def get_encoding(accept_encoding):
+    """
+    Choose a content coding from an Accept-Encoding header.
+
+    :param str accept_encoding: Accept-Encoding header value
+    :returns str: "gzip", "deflate" or None
+    """
+    prefs = {}
+    for item in (accept_encoding or "").split(","):
+        coding, *params = item.split(";")
+        qvalue = 1.0
+        for param in params:
+            key, _, val = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    qvalue = float(val)
+                except ValueError:
+                    qvalue = 0.0
+        prefs[coding.strip().lower()] = qvalue
+    encoding, best = None, 0.0
+    for coding in WBITS:
+        qvalue = prefs.get(coding, prefs.get("*", 0.0))
+        if qvalue > best:
+            encoding, best = coding, qvalue
+    return encoding
+
+
+def iter_blocks(body):
+    """
+    Iterate over a body in encoded blocks without copying it whole.
+
+    :param str|bytes body: Response body
+    :returns iterator: bytes-like blocks
+    """
+    if isinstance(body, str):
+        for i in range(0, len(body), BLOCK_SIZE):
+            yield body[i : i + BLOCK_SIZE].encode()
+    else:
+        view = memoryview(body)
+        for i in range(0, len(view), BLOCK_SIZE):
+            yield view[i : i + BLOCK_SIZE]
+
+
+def compress(chunks, encoding, sync=False):
+    """
+    Compress chunks incrementally.
+
+    :param iterable chunks: bytes-like chunks
+    :param str encoding: "gzip" or "deflate"
+    :param bool sync: Flush compressed output after every chunk (streaming)
+    :returns iterator: Compressed chunks
+    """
+    compressor = zlib.compressobj(wbits=WBITS[encoding])
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if sync:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress(chunks, encoding, sync=False):
+    """
+    Compress chunks of an async iterator incrementally.
+
+    :param AsyncIterable chunks: bytes-like chunks
+    :param str encoding: "gzip" or "deflate"
+    :param bool sync: Flush compressed output after every chunk (streaming)
+    :returns AsyncIterator: Compressed chunks
+    """
+    compressor = zlib.compressobj(wbits=WBITS[encoding])
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if sync:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def add_vary(headers):
+    """
+    Add Accept-Encoding to the Vary header.
+
+    :param list headers: Response header tuples
+    :returns list: Response header tuples
+    """
+    for i, (key, val) in enumerate(headers):
+        if key.lower() == "vary":
+            values = {x.strip().lower() for x in str(val).split(",")}
+            if not values & {"*", "accept-encoding"}:
+                headers[i] = (key, f"{val}, Accept-Encoding")
+            return headers
+    headers.append(("Vary", "Accept-Encoding"))
+    return headers
+
+
+def get_content_encoding(headers, accept_encoding):
+    """
+    Choose a content coding for a response.
+
+    :param list headers: Response header tuples
+    :param str accept_encoding: Request Accept-Encoding header value
+    :returns tuple: Content coding (or None) & response header tuples
+    """
+    names = {key.lower(): val for key, val in headers}
+    if "content-encoding" in names or not is_compressible(
+        str(names.get("content-type", ""))
+    ):
+        return None, headers
+    headers = add_vary(headers)
+    encoding = get_encoding(accept_encoding)
+    if encoding is not None:
+        headers.append(("Content-Encoding", encoding))
+    return encoding, headers
+
+
+def compress_body(body, headers, accept_encoding, min_size):
+    """
+    Compress response body if the client accepts it and it is worthwhile.
+
+    Bodies are encoded and compressed block by block, so a large string body
+    is never held as both str and uncompressed bytes.
+
+    :param str|bytes body: Response body
+    :param list headers: Response header tuples
+    :param str accept_encoding: Request Accept-Encoding header value
+    :param int min_size: Minimum body size in bytes to compress
+    :returns tuple: Body & response header tuples
+    """
+    if len(body) < min_size:
+        return body, headers
+    encoding, headers = get_content_encoding(headers, accept_encoding)
+    if encoding is not None:
+        body = b"".join(compress(iter_blocks(body), encoding))
+    return body, headers
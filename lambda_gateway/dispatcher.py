@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+
+class Dispatcher:
+    """
+    Run coroutines on a single long-lived event loop.
+
+    The loop is started lazily on a dedicated daemon thread the first time a
+    coroutine is submitted, so creating a Dispatcher is free and forking a
+    process before the first request is safe.
+
+    :param str name: Name of the event loop thread
+    """
+
+    def __init__(self, name="lambda-gateway-dispatcher"):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """
+        Start the event loop thread (if not already running).
+
+        :returns AbstractEventLoop: Running event loop
+        """
+        with self._lock:
+            if not self.running:
+                ready = threading.Event()
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(
+                    target=self._run_forever,
+                    args=(self.loop, ready),
+                    name=self.name,
+                    daemon=True,
+                )
+                self.thread.start()
+                ready.wait()
+            return self.loop
+
+    def run(self, coroutine):
+        """
+        Submit a coroutine to the event loop and wait for its result.
+
+        :param coroutine coroutine: Coroutine to run
+        :returns object: Coroutine result
+        """
+        loop = self.start()
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        return future.result()
+
+    def close(self):
+        """
+        Stop the event loop and wait for its thread to exit.
+        """
+        with self._lock:
+            if not self.running:
+                return
+            loop, thread = self.loop, self.thread
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+            future.result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            self.loop = self.thread = None
+
+    @staticmethod
+    async def _shutdown():
+        loop = asyncio.get_running_loop()
+        await loop.shutdown_asyncgens()
+        # Python 3.9+
+        if hasattr(loop, "shutdown_default_executor"):
+            await loop.shutdown_default_executor()
+
+    @staticmethod
+    def _run_forever(loop, ready):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
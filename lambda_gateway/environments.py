@@ -0,0 +1,588 @@
+import itertools
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from lambda_gateway import logger
+from lambda_gateway.report import MB
+
+POLL_INTERVAL = 0.01
+
+
+class InitError(ValueError):
+    """
+    Lambda handler could not be loaded in an execution environment.
+    """
+
+
+class HandlerError(RuntimeError):
+    """
+    Lambda handler raised an exception in an execution environment.
+
+    :param str message: Exception type & message
+    :param float duration: Invoke duration in seconds
+    :param int memory: Peak memory of the invocation in bytes
+    """
+
+    def __init__(self, message, duration=0.0, memory=0):
+        super().__init__(message)
+        self.duration = duration
+        self.memory = memory
+
+
+class EnvironmentDied(RuntimeError):
+    """
+    Execution environment process exited during an invocation.
+
+    :param str message: Error message
+    :param int memory: Last sampled memory of the environment in bytes (None
+        if unknown)
+    """
+
+    def __init__(self, message, memory=None):
+        super().__init__(message)
+        self.memory = memory
+
+
+class InvocationTimeout(TimeoutError):
+    """
+    Invocation ran past its deadline and its environment was killed.
+
+    :param str message: Error message
+    :param int memory: Last sampled memory of the environment in bytes (None
+        if unknown)
+    """
+
+    def __init__(self, message, memory=None):
+        super().__init__(message)
+        self.memory = memory
+
+
+class MemoryLimitExceeded(EnvironmentDied):
+    """
+    Environment used more memory than its limit and was killed.
+    """
+
+
+def get_rss(pid):
+    """
+    Get the current resident set size of a process.
+
+    :param int pid: Process ID
+    :returns int: Resident memory in bytes (None if it cannot be read)
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class EnvironmentStats:
+    """
+    Counters for execution environment starts & invocations.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cold_starts = 0
+        self.invocations = 0
+        self.reaped = 0
+        self.init_total = 0.0
+        self.invoke_total = 0.0
+        self.max_memory = 0
+
+    def record_init(self, seconds):
+        """
+        Record a cold start.
+
+        :param float seconds: Init duration in seconds
+        """
+        with self._lock:
+            self.cold_starts += 1
+            self.init_total += seconds
+
+    def record_invoke(self, seconds, memory=0):
+        """
+        Record an invocation.
+
+        :param float seconds: Invoke duration in seconds
+        :param int memory: Peak memory of the invocation in bytes
+        """
+        with self._lock:
+            self.invocations += 1
+            self.invoke_total += seconds
+            self.max_memory = max(self.max_memory, memory)
+
+    def record_reaped(self):
+        """
+        Record an idle environment shut down by the reaper.
+        """
+        with self._lock:
+            self.reaped += 1
+
+    def snapshot(self):
+        """
+        Get a consistent copy of the counters.
+
+        :returns dict: Environment counters
+        """
+        with self._lock:
+            return {
+                "cold_starts": self.cold_starts,
+                "invocations": self.invocations,
+                "reaped": self.reaped,
+                "init_avg": (
+                    self.init_total / self.cold_starts if self.cold_starts else 0
+                ),
+                "invoke_avg": (
+                    self.invoke_total / self.invocations if self.invocations else 0
+                ),
+                "max_memory": self.max_memory,
+            }
+
+
+class Environment:
+    """
+    Lambda execution environment: a subprocess that imports the handler
+    once and serves one invocation at a time over a pipe.
+
+    The subprocess is a fresh interpreter (not a fork of the gateway) so
+    that nothing the gateway has imported or started leaks into it.
+
+    With a memory limit, the resident memory of the subprocess is sampled
+    while it runs an invocation, and it is killed (like a Lambda OOM) as soon
+    as it is over the limit or reports a peak over the limit.
+
+    :param str signature: Lambda handler signature
+    :param int number: Environment number (for logging)
+    :param int memory: Memory limit in MB [default: no limit]
+    """
+
+    def __init__(self, signature, number=0, memory=None):
+        self.signature = signature
+        self.number = number
+        self.memory_limit = memory * MB if memory else None
+        self.init_duration = None
+        self.peak_memory = None
+        self.generation = 0
+        self.last_used = time.monotonic()
+        self.started = time.perf_counter()
+        self.conn, child = multiprocessing.Pipe()
+        try:
+            self.process = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "lambda_gateway.runtime",
+                    str(child.fileno()),
+                    signature,
+                ],
+                pass_fds=[child.fileno()],
+            )
+        except BaseException:
+            self.conn.close()
+            raise
+        finally:
+            child.close()
+
+    def recv(self):
+        """
+        Receive reply from the environment.
+
+        :returns tuple: Status, value, duration in seconds & peak memory in
+            bytes
+        :raises EnvironmentDied: if the environment exited
+        """
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.wait()
+            raise EnvironmentDied(
+                f"Environment {self.number} exited with {self.process.returncode}",
+                self.peak_memory,
+            )
+
+    def init(self):
+        """
+        Wait for the environment to import the handler.
+
+        :returns float: Init duration (interpreter start-up & handler import)
+            in seconds
+        :raises InitError: if the handler could not be loaded
+        """
+        status, value, _, memory = self.recv()
+        if status == "error":
+            self.close()
+            raise InitError(value)
+        if self.over_limit(memory):
+            self.kill()
+            raise InitError(
+                f"Handler used {memory // MB} MB during init, "
+                f"over the {self.memory_limit // MB} MB memory limit"
+            )
+        self.init_duration = time.perf_counter() - self.started
+        return self.init_duration
+
+    def invoke(self, event, context=None, timeout=None):
+        """
+        Invoke the Lambda handler in the environment.
+
+        :param dict event: Lambda event object
+        :param Context context: Mock Lambda context
+        :param float timeout: Seconds to wait before killing the environment
+        :returns tuple: Lambda invocation result, invoke duration in seconds
+            & peak memory in bytes
+        :raises HandlerError: if the handler raised an exception
+        :raises EnvironmentDied: if the environment exited
+        :raises InvocationTimeout: if the invocation timed out
+        :raises MemoryLimitExceeded: if the environment ran out of memory
+        """
+        self.peak_memory = None
+        try:
+            self.conn.send((event, context))
+        except (BrokenPipeError, ConnectionResetError):
+            raise EnvironmentDied(f"Environment {self.number} is not running")
+        self.wait(timeout)
+        status, value, duration, memory = self.recv()
+        self.last_used = time.monotonic()
+        if self.over_limit(memory):
+            self.kill_over_limit(memory)
+        if status == "error":
+            raise HandlerError(value, duration, memory)
+        return value, duration, memory
+
+    def wait(self, timeout=None):
+        """
+        Wait for the reply to an invocation, enforcing timeout & memory limit.
+
+        :param float timeout: Seconds to wait before killing the environment
+        :raises InvocationTimeout: if the invocation timed out
+        :raises MemoryLimitExceeded: if the environment ran out of memory
+        """
+        if self.memory_limit is None:
+            if timeout is not None and not self.conn.poll(max(timeout, 0)):
+                self.kill_timeout(timeout)
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            if self.conn.poll(wait):
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                self.kill_timeout(timeout)
+            self.sample_memory()
+            if self.over_limit(self.peak_memory):
+                self.kill_over_limit(self.peak_memory)
+
+    def sample_memory(self):
+        """
+        Sample the resident memory of the environment into its invocation
+        peak.
+        """
+        memory = get_rss(self.process.pid)
+        if memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, memory)
+
+    def over_limit(self, memory):
+        """
+        Check memory usage against the memory limit.
+
+        :param int memory: Memory in bytes (None if unknown)
+        :returns bool: True if there is a limit and memory is over it
+        """
+        return None not in (self.memory_limit, memory) and memory > self.memory_limit
+
+    def kill_timeout(self, timeout):
+        """
+        Kill the environment for running past its timeout.
+
+        :param float timeout: Timeout in seconds
+        :raises InvocationTimeout: always
+        """
+        self.sample_memory()
+        self.kill()
+        raise InvocationTimeout(
+            f"Environment {self.number} killed after {timeout:.2f} s timeout",
+            self.peak_memory,
+        )
+
+    def kill_over_limit(self, memory):
+        """
+        Kill the environment for using more memory than its limit.
+
+        :param int memory: Memory used in bytes
+        :raises MemoryLimitExceeded: always
+        """
+        self.kill()
+        raise MemoryLimitExceeded(
+            f"Environment {self.number} killed after using {memory // MB} MB "
+            f"of {self.memory_limit // MB} MB memory limit",
+            memory,
+        )
+
+    def kill(self):
+        """
+        Kill the environment immediately.
+        """
+        self.process.kill()
+        self.process.wait()
+        self.conn.close()
+
+    def close(self, timeout=1):
+        """
+        Shut down the environment, killing it if it does not exit in time.
+
+        :param float timeout: Seconds to wait for a clean exit
+        """
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
+
+
+class EnvironmentPool:
+    """
+    Pool of Lambda execution environments.
+
+    Environments are started on demand (a cold start) up to size, reused
+    most-recently-used first while warm, and shut down by a reaper thread
+    once they have been idle for idle_timeout seconds.
+
+    :param str signature: Lambda handler signature
+    :param int size: Maximum number of environments
+    :param float idle_timeout: Seconds before an idle environment is reaped
+    :param int memory: Memory limit of each environment in MB
+    """
+
+    def __init__(self, signature, size=1, idle_timeout=300, memory=None):
+        self.signature = signature
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.memory = memory
+        self.idle = []
+        self.count = 0
+        self.closed = False
+        self.generation = 0
+        self.stats = EnvironmentStats()
+        self.reaper = None
+        self._numbers = itertools.count()
+        self._cond = threading.Condition()
+
+    def check(self):
+        """
+        Start & stop one environment, to check that the handler can be loaded.
+
+        The environment is not kept, so the pool holds no processes or
+        threads yet (it may be forked) and the first request is a cold start.
+
+        :raises InitError: if the handler could not be loaded
+        """
+        env = Environment(self.signature, memory=self.memory)
+        try:
+            env.init()
+        finally:
+            env.close()
+
+    def acquire(self):
+        """
+        Get an idle environment, starting one if there is none and the pool
+        is not full, or waiting for one otherwise.
+
+        :returns tuple: Environment & whether it was a cold start
+        :raises InitError: if the handler could not be loaded
+        """
+        with self._cond:
+            while not self.idle and self.count >= self.size:
+                self._cond.wait()
+            if self.idle:
+                return self.idle.pop(), False
+            self.count += 1
+            generation = self.generation
+        self.start_reaper()
+        try:
+            env = Environment(self.signature, next(self._numbers), self.memory)
+            env.generation = generation
+            self.stats.record_init(env.init())
+        except BaseException:
+            with self._cond:
+                self.count -= 1
+                self._cond.notify()
+            raise
+        logger.info(
+            "Environment %d started, Init Duration: %.2f ms",
+            env.number,
+            env.init_duration * 1000,
+        )
+        return env, True
+
+    def release(self, env, healthy=True):
+        """
+        Return an environment to the pool, or shut it down.
+
+        :param Environment env: Execution environment
+        :param bool healthy: False to discard the environment
+        """
+        with self._cond:
+            keep = healthy and not self.closed
+            keep = keep and env.generation == self.generation
+            if keep:
+                self.idle.append(env)
+            else:
+                self.count -= 1
+            self._cond.notify()
+        if not keep:
+            env.close()
+
+    def invoke(self, event, context=None, hard_timeout=False, report=None):
+        """
+        Invoke the Lambda handler in a pooled environment (blocking).
+
+        :param dict event: Lambda event object
+        :param Context context: Mock Lambda context
+        :param bool hard_timeout: Kill the environment once the context has
+            no remaining time
+        :param Report report: Invocation report to fill in
+        :returns dict: Lambda invocation result
+        :raises InvocationTimeout: if the invocation timed out
+        :raises EnvironmentDied: if the environment exited or was killed
+        """
+        env, cold = self.acquire()
+        if report is not None and cold:
+            report.init_duration_ns = int(env.init_duration * 1e9)
+        healthy = False
+        timeout = None
+        if hard_timeout:
+            context.start_timer()
+            timeout = context.get_remaining_time_in_millis() / 1000
+        try:
+            result, duration, memory = env.invoke(event, context, timeout)
+            healthy = True
+        except HandlerError as err:
+            healthy = True
+            self.record(env, cold, err.duration, err.memory, report)
+            raise
+        except (EnvironmentDied, InvocationTimeout) as err:
+            if report is not None:
+                report.max_memory = err.memory
+            raise
+        finally:
+            self.release(env, healthy)
+        self.record(env, cold, duration, memory, report)
+        return result
+
+    def record(self, env, cold, duration, memory, report=None):
+        """
+        Record & log a completed invocation.
+
+        :param Environment env: Execution environment
+        :param bool cold: Whether the invocation was a cold start
+        :param float duration: Invoke duration in seconds
+        :param int memory: Peak memory of the invocation in bytes (None if
+            unknown)
+        :param Report report: Invocation report to fill in
+        """
+        self.stats.record_invoke(duration, memory or 0)
+        if report is not None:
+            report.duration_ns = int(duration * 1e9)
+            report.max_memory = memory
+        logger.info(
+            "Environment %d %s, Duration: %.2f ms, Max Memory Used: %d MB",
+            env.number,
+            "cold" if cold else "warm",
+            duration * 1000,
+            (memory or 0) // MB,
+        )
+
+    def start_reaper(self):
+        """
+        Start the idle reaper thread (if not already running).
+        """
+        with self._cond:
+            if self.reaper is not None or not self.idle_timeout:
+                return
+            self.reaper = threading.Thread(
+                target=self.reap_forever,
+                name="lambda-gateway-reaper",
+                daemon=True,
+            )
+        self.reaper.start()
+
+    def reap_forever(self):
+        """
+        Reaper loop: shut down idle environments until the pool is closed.
+        """
+        interval = min(self.idle_timeout, 1)
+        with self._cond:
+            while not self.closed:
+                self._cond.wait(interval)
+                self.reap()
+
+    def reap(self):
+        """
+        Shut down environments idle for longer than idle_timeout.
+
+        Must be called with the pool lock held.
+        """
+        cutoff = time.monotonic() - self.idle_timeout
+        for env in [env for env in self.idle if env.last_used < cutoff]:
+            self.idle.remove(env)
+            self.count -= 1
+            self.stats.record_reaped()
+            logger.info("Environment %d reaped after idle timeout", env.number)
+            threading.Thread(target=env.close, daemon=True).start()
+
+    def recycle(self):
+        """
+        Shut down all environments, e.g. after the handler code changed, so
+        that the next invocations start fresh ones.
+
+        Busy environments finish their invocation first and are shut down
+        when they are released.
+        """
+        with self._cond:
+            self.generation += 1
+            idle, self.idle = self.idle, []
+            self.count -= len(idle)
+            self._cond.notify_all()
+        for env in idle:
+            env.close()
+
+    def close(self):
+        """
+        Shut down all idle environments and the reaper.
+
+        Busy environments are shut down when they are released.
+        """
+        with self._cond:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.count -= len(idle)
+            self._cond.notify_all()
+        for env in idle:
+            env.close()
+        if self.reaper is not None:
+            self.reaper.join()
+        stats = self.stats.snapshot()
+        logger.info(
+            "Environments: %d cold starts, %d invocations, %d reaped, "
+            "init avg %.1f ms, invoke avg %.1f ms, max memory %d MB",
+            stats["cold_starts"],
+            stats["invocations"],
+            stats["reaped"],
+            stats["init_avg"] * 1000,
+            stats["invoke_avg"] * 1000,
+            stats["max_memory"] // MB,
+        )
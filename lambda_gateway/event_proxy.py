@@ -1,37 +1,242 @@
 import asyncio
+import functools
 import importlib
+import inspect
 import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from lambda_gateway import lambda_context, logger
+from lambda_gateway import lambda_context, logger, metrics
+from lambda_gateway.dispatcher import Dispatcher
+from lambda_gateway.environments import (
+    EnvironmentDied,
+    EnvironmentPool,
+    InvocationTimeout,
+    MemoryLimitExceeded,
+)
+from lambda_gateway.report import Report, get_peak_rss
+from lambda_gateway.routes import DEFAULT_ROUTE, Route
 
 
 class EventProxy:
-    def __init__(self, handler, base_path, timeout=None):
+    def __init__(
+        self,
+        handler,
+        base_path,
+        timeout=None,
+        max_workers=None,
+        environments=None,
+        idle_timeout=300,
+        memory=None,
+        recorder=None,
+        cache=None,
+        profiler=None,
+        routes=None,
+    ):
         self.base_path = base_path
         self.handler = handler
         self.timeout = timeout
+        self.memory = memory
+        self.max_workers = max_workers
+        self.dispatcher = Dispatcher()
+        self.executor = None
+        self.environments = environments
+        self.idle_timeout = idle_timeout
+        self.pools = {}
+        self.pool = None
+        if environments and handler:
+            self.pool = self.get_pool()
+        self.recorder = recorder
+        self.cache = cache
+        self.profiler = profiler
+        self.routes = routes
+        self._handlers = {}
+        self._init_durations = {}
+        self._lock = threading.Lock()
 
-    def get_handler(self):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the event loop, executor & environments used to invoke
+        Lambda handlers, flush the recorder, drop the response cache and
+        dump the profiles.
+        """
+        self.dispatcher.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for pool in self.pools.values():
+            pool.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        if self.profiler is not None:
+            self.profiler.close()
+
+    def get_executor(self):
+        """
+        Get executor for synchronous Lambda handlers.
+
+        Created on first use so that forked worker processes each get their
+        own threads. With execution environments every handler's pool may
+        block one thread per environment, so by default there are enough
+        threads for all of them at once.
+
+        :returns ThreadPoolExecutor: Handler executor
+        """
+        if self.executor is None:
+            with self._lock:
+                if self.executor is None:
+                    max_workers = self.max_workers
+                    if max_workers is None and self.environments:
+                        signatures = len(self.get_signatures()) or 1
+                        max_workers = self.environments * signatures
+                    self.executor = ThreadPoolExecutor(
+                        max_workers,
+                        thread_name_prefix="lambda-gateway-handler",
+                    )
+                    metrics.EXECUTOR_THREADS.set(self.executor._max_workers)
+        return self.executor
+
+    @property
+    def default_route(self):
+        """
+        Route of the requests that match no other route, to the default
+        handler (None if there is no default handler).
+        """
+        if self.handler:
+            return Route(DEFAULT_ROUTE, None, None, self.handler, ())
+
+    def get_pool(self, signature=None):
+        """
+        Get the execution environments of a Lambda handler, creating them on
+        first use.
+
+        :param str signature: Handler signature [default: self.handler]
+        :returns EnvironmentPool: Execution environments
         """
-        Load handler function.
+        signature = signature or self.handler
+        try:
+            return self.pools[signature]
+        except KeyError:
+            return self.pools.setdefault(
+                signature,
+                EnvironmentPool(
+                    signature,
+                    self.environments,
+                    self.idle_timeout,
+                    self.memory,
+                ),
+            )
+
+    def get_signatures(self, loaded=False):
+        """
+        Get the signatures of the default handler & the route handlers.
+
+        :param bool loaded: Only the route handlers loaded so far
+        :returns list: Handler signatures
+        """
+        signatures = [self.handler] if self.handler else []
+        if self.routes is not None:
+            signatures.extend(
+                signature
+                for signature in self.routes.get_signatures()
+                if signature not in signatures
+                and (not loaded or signature in self._handlers)
+            )
+        return signatures
+
+    def get_handler(self, signature=None):
+        """
+        Get Lambda handler function, resolving it on first use.
 
+        :param str signature: Handler signature [default: self.handler]
         :returns function: Lambda handler function
         """
-        *path, func = self.handler.split(".")
+        try:
+            return self._handlers[signature or self.handler]
+        except KeyError:
+            return self.load_handler(signature)
+
+    def load_handler(self, signature=None):
+        """
+        Resolve Lambda handler function and cache it.
+
+        The time it took is reported as the Init Duration of the next
+        invocation.
+
+        :param str signature: Handler signature [default: self.handler]
+        :returns function: Lambda handler function
+        """
+        signature = signature or self.handler
+        handler, init_duration_ns = self.import_handler(signature)
+        self._init_durations[signature] = init_duration_ns
+        self._handlers[signature] = handler
+        return handler
+
+    def load_handlers(self, signatures):
+        """
+        Resolve several Lambda handler functions, then cache them all at
+        once: if any of them fails to resolve, none is swapped in.
+
+        :param list signatures: Handler signatures
+        :raises ValueError: if a handler cannot be resolved
+        """
+        loaded = {signature: self.import_handler(signature) for signature in signatures}
+        self._init_durations.update(
+            (signature, init_duration_ns)
+            for signature, (_, init_duration_ns) in loaded.items()
+        )
+        self._handlers.update(
+            (signature, handler) for signature, (handler, _) in loaded.items()
+        )
+
+    def import_handler(self, signature):
+        """
+        Resolve Lambda handler function, without caching it.
+
+        :param str signature: Handler signature
+        :returns tuple: Lambda handler function & import time (ns)
+        """
+        *path, func = signature.split(".")
         name = ".".join(path)
         if not name:
-            raise ValueError(f"Bad handler signature '{self.handler}'")
-        try:
+            raise ValueError(f"Bad handler signature '{signature}'")
+        if os.path.curdir not in sys.path:
             sys.path.append(os.path.curdir)
+        start = time.perf_counter_ns()
+        try:
             module = importlib.import_module(name)
             handler = getattr(module, func)
-            return handler
         except ModuleNotFoundError:
             raise ValueError(f"Unable to import module '{name}'")
         except AttributeError:
             raise ValueError(f"Handler '{func}' missing on module '{name}'")
+        return handler, time.perf_counter_ns() - start
+
+    def invalidate_handler(self, signature=None):
+        """
+        Drop cached Lambda handler function(s).
+
+        The next invocation resolves the handler again.
+
+        :param str signature: Handler signature [default: all handlers]
+        """
+        if signature is None:
+            self._handlers.clear()
+        else:
+            self._handlers.pop(signature, None)
 
     def get_httpMethod(self, event):
         """
@@ -57,54 +262,333 @@ class EventProxy:
             f"Unknown API Gateway payload version: {event.get('version')}"
         )
 
-    def invoke(self, event):
-        with lambda_context.start(self.timeout) as context:
-            logger.info('Invoking "%s"', self.handler)
-            return asyncio.run(self.invoke_async_with_timeout(event, context))
+    def route(self, event):
+        """
+        Match a request to a route, setting the route fields of its event.
+
+        Without routes every request goes to the default handler.
+
+        :param dict event: Lambda event object
+        :returns Route: Matched route (None if no route matches)
+        """
+        if self.routes is None:
+            return self.default_route
+        match = self.routes.match(self.get_httpMethod(event), self.get_path(event))
+        route, pathParameters = match or (self.default_route, None)
+        if route is None:
+            return None
+        if event.get("version") == "2.0":
+            event["routeKey"] = route.key
+        elif route.path is not None:
+            event["resource"] = route.path
+        if pathParameters:
+            event["pathParameters"] = pathParameters
+        return route
+
+    def invoke(self, event, request_id=None, route=None):
+        """
+        Invoke the Lambda handler on the long-lived event loop.
+
+        Safe to call from any thread.
+
+        :param dict event: Lambda event object
+        :param str request_id: Lambda request ID [default: a new one]
+        :param Route route: Route of the request [default: matched here]
+        :returns dict: Lambda invocation result
+        """
+        result, _ = self.respond(event, request_id, route)
+        return result
+
+    async def ainvoke(self, event, request_id=None, route=None):
+        """
+        Invoke the Lambda handler of a request's route on the running event
+        loop.
+
+        :param dict event: Lambda event object
+        :param str request_id: Lambda request ID [default: a new one]
+        :param Route route: Route of the request [default: matched here]
+        :returns dict: Lambda invocation result
+        """
+        result, _ = await self.arespond(event, request_id, route)
+        return result
+
+    def respond(self, event, request_id=None, route=None):
+        """
+        Answer a request on the long-lived event loop.
+
+        Safe to call from any thread.
+
+        :param dict event: Lambda event object
+        :param str request_id: Lambda request ID [default: a new one]
+        :param Route route: Route of the request [default: matched here]
+        :returns tuple: Lambda invocation result & whether the handler ran
+        """
+        return self.dispatcher.run(self.arespond(event, request_id, route))
+
+    async def arespond(self, event, request_id=None, route=None):
+        """
+        Answer a request on the running event loop.
+
+        Each invocation is logged with Lambda's START, END & REPORT lines, and
+        recorded with its result when recording is on. GET requests answered
+        from the response cache do not invoke the handler at all, and neither
+        do requests that match no route.
+
+        :param dict event: Lambda event object
+        :param str request_id: Lambda request ID [default: a new one]
+        :param Route route: Route of the request [default: matched here]
+        :returns tuple: Lambda invocation result & whether the handler ran
+        """
+        if route is None:
+            route = self.route(event)
+        if route is None:
+            httpMethod = self.get_httpMethod(event)
+            return self.jsonify(httpMethod, 404, message="Not Found"), False
+        signature = route.signature
+        if self.cache is None or self.get_httpMethod(event) != "GET":
+            return await self.ainvoke_handler(event, request_id, signature), True
+        key = self.cache.get_key("GET", self.get_path(event), event)
+        result = self.cache.get(key, event)
+        if result is not None:
+            return result, False
+        result = await self.ainvoke_handler(event, request_id, signature)
+        self.cache.put(key, result)
+        return result, True
+
+    async def ainvoke_handler(self, event, request_id=None, signature=None):
+        """
+        Invoke a Lambda handler, bypassing the response cache.
+
+        :param dict event: Lambda event object
+        :param str request_id: Lambda request ID [default: a new one]
+        :param str signature: Handler signature [default: self.handler]
+        :returns dict: Lambda invocation result
+        """
+        # Serialize the event before the handler sees it, for replays
+        recorded = None
+        if self.recorder is not None:
+            recorded = json.dumps(event, default=str)
+        with lambda_context.start(self.timeout, self.memory, request_id) as context:
+            report = Report(
+                context.aws_request_id,
+                context.memory_limit_in_mb,
+                context.function_version,
+            )
+            report.start()
+            metrics.INVOCATIONS_IN_FLIGHT.inc()
+            started = time.time()
+            start = time.perf_counter_ns()
+            result = None
+            try:
+                result = await self.invoke_async_with_timeout(
+                    event, context, report, signature
+                )
+                return result
+            finally:
+                if report.duration_ns is None:
+                    report.duration_ns = time.perf_counter_ns() - start
+                metrics.INVOCATIONS_IN_FLIGHT.dec()
+                metrics.PHASE_SECONDS.observe(report.duration_ns / 1e9, "handler")
+                report.end()
+                if recorded is not None:
+                    self.recorder.record(recorded, result, started, report.duration_ns)
 
-    async def invoke_async(self, event, context=None):
+    async def invoke_async(self, event, context=None, report=None, signature=None):
         """
         Wrapper to invoke the Lambda handler asynchronously.
 
         :param dict event: Lambda event object
         :param Context context: Mock Lambda context
+        :param Report report: Invocation report to fill in
+        :param str signature: Handler signature [default: self.handler]
         :returns dict: Lamnda invocation result
         """
+        signature = signature or self.handler
         httpMethod = self.get_httpMethod(event)
         path = self.get_path(event)
 
         # Reject request if not starting at base path
         if not path.startswith(self.base_path):
             err = f"Rejected {path} :: Base path is {self.base_path}"
-            logger.error(err)
+            logger.error(self.format_error(err, context))
             return self.jsonify(httpMethod, 403, message="Forbidden")
 
         # Get & invoke Lambda handler
         try:
-            handler = self.get_handler()
-            loop = asyncio.get_running_loop()
-            return await loop.run_in_executor(None, handler, event, context)
+            if self.environments:
+                return await self.call_environment(event, context, report, signature)
+            start = time.perf_counter_ns()
+            try:
+                handler = self.get_handler(signature)
+                if report is not None:
+                    report.init_duration_ns = self._init_durations.pop(signature, None)
+                return await self.call_handler(handler, event, context)
+            finally:
+                if report is not None:
+                    report.duration_ns = time.perf_counter_ns() - start
+                    report.max_memory = get_peak_rss()
+        except InvocationTimeout:
+            raise
         except Exception as err:
-            logger.error(err)
+            metrics.INVOCATION_ERRORS.inc("error")
+            if report is not None and isinstance(err, MemoryLimitExceeded):
+                report.fail("error", "Runtime.OutOfMemory")
+            elif report is not None and isinstance(err, EnvironmentDied):
+                report.fail("error", "Runtime.ExitError")
+            logger.error(self.format_error(err, context))
             message = "Internal server error"
             return self.jsonify(httpMethod, 502, message=message)
 
-    async def invoke_async_with_timeout(self, event, context=None):
+    @staticmethod
+    def format_error(err, context=None):
+        """
+        Format an invocation error for the logs, with its request ID.
+
+        :param Exception|str err: Error
+        :param Context context: Mock Lambda context
+        :returns str: Log message
+        """
+        if context is None:
+            return str(err)
+        return f"RequestId: {context.aws_request_id} Error: {err}"
+
+    async def call_handler(self, handler, event, context=None):
+        """
+        Call Lambda handler function.
+
+        Coroutine functions are awaited directly on the running loop; regular
+        functions run on the handler executor. Either is profiled as the
+        handler phase when profiling is on.
+
+        :param function handler: Lambda handler function
+        :param dict event: Lambda event object
+        :param Context context: Mock Lambda context
+        :returns dict: Lambda invocation result
+        """
+        if inspect.iscoroutinefunction(handler):
+            if self.profiler is not None:
+                coroutine = handler(event, context)
+                return await self.profiler.coroutine("handler", coroutine)
+            return await handler(event, context)
+        if self.profiler is not None:
+            handler = functools.partial(self.profiler.call, "handler", handler)
+        result = await self.run_in_executor(handler, event, context)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def call_environment(self, event, context=None, report=None, signature=None):
+        """
+        Call Lambda handler in a pooled execution environment.
+
+        With a timeout set, the environment is killed once the context's
+        remaining time runs out, so a runaway handler does not hold on to it.
+
+        :param dict event: Lambda event object
+        :param Context context: Mock Lambda context
+        :param Report report: Invocation report to fill in
+        :param str signature: Handler signature [default: self.handler]
+        :returns dict: Lambda invocation result
+        :raises InvocationTimeout: if the invocation timed out
+        """
+        return await self.run_in_executor(
+            self.get_pool(signature).invoke,
+            event,
+            context,
+            context is not None and self.timeout is not None,
+            report,
+        )
+
+    async def run_in_executor(self, func, *args):
+        """
+        Call a blocking function on the handler executor.
+
+        The call is counted as an executor task until it has returned, even
+        if the invocation timed out first.
+
+        :param function func: Blocking function
+        :param tuple args: Function arguments
+        :returns object: Function result
+        """
+        metrics.EXECUTOR_TASKS.inc()
+        try:
+            future = self.get_executor().submit(func, *args)
+        except BaseException:
+            metrics.EXECUTOR_TASKS.dec()
+            raise
+        future.add_done_callback(lambda _: metrics.EXECUTOR_TASKS.dec())
+        return await asyncio.wrap_future(future)
+
+    async def invoke_async_with_timeout(
+        self, event, context=None, report=None, signature=None
+    ):
         """
         Wrapper to invoke the Lambda handler with a timeout.
 
         :param dict event: Lambda event object
         :param Context context: Mock Lambda context
+        :param Report report: Invocation report to fill in
+        :param str signature: Handler signature [default: self.handler]
         :returns dict: Lamnda invocation result or 408 TIMEOUT
         """
         try:
-            coroutine = self.invoke_async(event, context)
-            return await asyncio.wait_for(coroutine, self.timeout)
-        except asyncio.TimeoutError:
+            # Execution environments enforce the timeout themselves
+            timeout = None if self.environments else self.timeout
+            coroutine = self.invoke_async(event, context, report, signature)
+            return await asyncio.wait_for(coroutine, timeout)
+        except (asyncio.TimeoutError, InvocationTimeout):
+            metrics.INVOCATION_ERRORS.inc("timeout")
+            if report is not None:
+                report.fail("timeout")
             httpMethod = self.get_httpMethod(event)
             message = "Endpoint request timed out"
             return self.jsonify(httpMethod, 504, message=message)
 
+    def iter_stream(self, stream):
+        """
+        Iterate over a streamed response body from a server thread.
+
+        Async iterators are advanced on the long-lived event loop, one chunk
+        at a time.
+
+        :param Iterator|AsyncIterator stream: Response body stream
+        :returns Iterator: Body chunks
+        """
+        if not hasattr(stream, "__anext__"):
+            yield from stream
+            return
+
+        async def next_chunk():
+            return await stream.__anext__()
+
+        while True:
+            try:
+                yield self.dispatcher.run(next_chunk())
+            except StopAsyncIteration:
+                return
+
+    async def aiter_stream(self, stream):
+        """
+        Iterate over a streamed response body on the running event loop.
+
+        Sync iterators are advanced on the handler executor so slow
+        generators do not block the loop.
+
+        :param Iterator|AsyncIterator stream: Response body stream
+        :returns AsyncIterator: Body chunks
+        """
+        if hasattr(stream, "__anext__"):
+            async for chunk in stream:
+                yield chunk
+            return
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor()
+        while True:
+            chunk = await loop.run_in_executor(executor, next, stream, None)
+            if chunk is None:
+                return
+            yield chunk
+
     @staticmethod
     def jsonify(httpMethod, statusCode, **kwargs):
         """
@@ -0,0 +1,276 @@
+from urllib import parse
+
+
+def get_event(version, httpMethod, target, headers, body, isBase64Encoded=False):
+    """
+    Get Lambda input event object.
+
+    :param str version: API Gateway payload version
+    :param str httpMethod: HTTP request method
+    :param str target: HTTP request target (path & query string)
+    :param Message headers: HTTP request headers
+    :param str body: HTTP request body
+    :param bool isBase64Encoded: Whether body is base64-encoded
+    :return dict: Lambda event object
+    """
+    if version == "1.0":
+        return get_event_v1(httpMethod, target, headers, body, isBase64Encoded)
+    elif version == "2.0":
+        return get_event_v2(httpMethod, target, headers, body, isBase64Encoded)
+    raise ValueError(f"Unknown API Gateway payload version: {version}")
+
+
+def get_event_v1(httpMethod, target, headers, body, isBase64Encoded=False):
+    """
+    Get Lambda input event object (v1).
+
+    :param str httpMethod: HTTP request method
+    :param str target: HTTP request target (path & query string)
+    :param Message headers: HTTP request headers
+    :param str body: HTTP request body
+    :param bool isBase64Encoded: Whether body is base64-encoded
+    :return dict: Lambda event object
+    """
+    return EventV1(httpMethod, target, headers, body, isBase64Encoded)
+
+
+def get_event_v2(httpMethod, target, headers, body, isBase64Encoded=False):
+    """
+    Get Lambda input event object (v2).
+
+    :param str httpMethod: HTTP request method
+    :param str target: HTTP request target (path & query string)
+    :param Message headers: HTTP request headers
+    :param str body: HTTP request body
+    :param bool isBase64Encoded: Whether body is base64-encoded
+    :return dict: Lambda event object
+    """
+    return EventV2(httpMethod, target, headers, body, isBase64Encoded)
+
+
+class LazyEvent(dict):
+    """
+    Lambda event that computes its fields on first access.
+
+    Cheap fields are set up front; the rest (headers, parsed URL, query
+    string parameters, ...) are computed by the get_<field>() methods the
+    first time they are read and then stored in the dict. Anything that
+    looks at the event as a whole (iteration, len(), ==, json.dumps(), ...)
+    computes all remaining fields first, in the same order as a plain dict
+    event, so it serializes identically.
+
+    :param str httpMethod: HTTP request method
+    :param str target: HTTP request target (path & query string)
+    :param Message headers: HTTP request headers
+    :param str body: HTTP request body
+    :param bool isBase64Encoded: Whether body is base64-encoded
+    """
+
+    version = None
+    fields = ()
+    getters = {}
+
+    def __init__(self, httpMethod, target, headers, body, isBase64Encoded=False):
+        super().__init__(
+            version=self.version,
+            body=body,
+            isBase64Encoded=isBase64Encoded,
+        )
+        self._httpMethod = httpMethod
+        self._target = target
+        self._headers = headers
+        self._url = None
+        self._lazy = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.getters = {
+            key: getattr(cls, f"get_{key}")
+            for key in cls.fields
+            if hasattr(cls, f"get_{key}")
+        }
+
+    def __missing__(self, key):
+        getter = self.getters.get(key)
+        if getter is None or not self._lazy:
+            raise KeyError(key)
+        value = getter(self)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def materialize(self):
+        """
+        Compute all remaining fields, in the order of a plain dict event.
+        """
+        if not self._lazy:
+            return
+        self._lazy = False
+        items = dict(dict.items(self))
+        dict.clear(self)
+        for key in self.fields:
+            if key in items:
+                dict.__setitem__(self, key, items.pop(key))
+            else:
+                dict.__setitem__(self, key, self.getters[key](self))
+        dict.update(self, items)
+
+    def get_url(self):
+        """
+        Parse request target once for all the fields derived from it.
+
+        :returns tuple: Path & query string
+        """
+        if self._url is None:
+            url = parse.urlparse(self._target)
+            path, *_ = url.path.split("?")
+            self._url = (path, url.query)
+        return self._url
+
+    def get_headers(self):
+        return dict(self._headers)
+
+    def get_queryStringParameters(self):
+        _, query = self.get_url()
+        return dict(parse.parse_qsl(query))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (self._lazy and key in self.getters)
+
+    def __iter__(self):
+        self.materialize()
+        return dict.__iter__(self)
+
+    def __reversed__(self):
+        self.materialize()
+        return dict.__reversed__(self)
+
+    def __len__(self):
+        self.materialize()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        self.materialize()
+        if isinstance(other, LazyEvent):
+            other.materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self.materialize()
+        if isinstance(other, LazyEvent):
+            other.materialize()
+        return dict.__ne__(self, other)
+
+    def __or__(self, other):
+        self.materialize()
+        return dict.__or__(dict(self), other)
+
+    def __repr__(self):
+        self.materialize()
+        return dict.__repr__(self)
+
+    def __delitem__(self, key):
+        self.materialize()
+        dict.__delitem__(self, key)
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+    def keys(self):
+        self.materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self.materialize()
+        return dict.values(self)
+
+    def items(self):
+        self.materialize()
+        return dict.items(self)
+
+    def copy(self):
+        return dict(self.items())
+
+    def pop(self, key, *default):
+        self.materialize()
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self.materialize()
+        return dict.popitem(self)
+
+
+class EventV1(LazyEvent):
+    """
+    Lambda input event object (v1).
+    """
+
+    version = "1.0"
+    fields = (
+        "version",
+        "body",
+        "isBase64Encoded",
+        "headers",
+        "httpMethod",
+        "path",
+        "queryStringParameters",
+    )
+
+    def get_httpMethod(self):
+        return self._httpMethod
+
+    def get_path(self):
+        path, _ = self.get_url()
+        return path
+
+
+class EventV2(LazyEvent):
+    """
+    Lambda input event object (v2).
+    """
+
+    version = "2.0"
+    fields = (
+        "version",
+        "body",
+        "isBase64Encoded",
+        "routeKey",
+        "rawPath",
+        "rawQueryString",
+        "headers",
+        "queryStringParameters",
+        "requestContext",
+    )
+
+    def get_routeKey(self):
+        path, _ = self.get_url()
+        return f"{self._httpMethod} {path}"
+
+    def get_rawPath(self):
+        path, _ = self.get_url()
+        return path
+
+    def get_rawQueryString(self):
+        _, query = self.get_url()
+        return query
+
+    def get_requestContext(self):
+        path, _ = self.get_url()
+        return {
+            "http": {
+                "method": self._httpMethod,
+                "path": path,
+            },
+        }
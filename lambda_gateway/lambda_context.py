@@ -1,64 +1,107 @@
+import os
+import time
 import uuid
 from contextlib import contextmanager
-from datetime import datetime
+
+ACCOUNT_ID = "123456789012"
+REGION = "us-east-1"
+FUNCTION_NAME = "lambda-gateway"
+FUNCTION_VERSION = "$LATEST"
+INVOKED_FUNCTION_ARN = f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:{FUNCTION_NAME}"
+LOG_GROUP_NAME = f"/aws/lambda/{FUNCTION_NAME}"
+
+
+def get_request_id():
+    """
+    Generate a Lambda request ID.
+
+    :returns str: Request ID
+    """
+    return str(uuid.uuid1())
+
+
+def get_log_stream_name():
+    """
+    Generate a log stream name, like Lambda's one per execution environment.
+
+    :returns str: Log stream name
+    """
+    date = time.strftime("%Y/%m/%d", time.gmtime())
+    return f"{date}/[{FUNCTION_VERSION}]{uuid.uuid4().hex}"
+
+
+def reset_log_stream_name():
+    """
+    Start a new log stream, e.g. in a forked worker process.
+    """
+    global LOG_STREAM_NAME
+    LOG_STREAM_NAME = get_log_stream_name()
+
+
+LOG_STREAM_NAME = get_log_stream_name()
+if hasattr(os, "register_at_fork"):  # POSIX only
+    os.register_at_fork(after_in_child=reset_log_stream_name)
 
 
 @contextmanager
-def start(timeout=None):
+def start(timeout=None, memory_limit_in_mb=None, request_id=None):
     """
     Yield mock Lambda context object.
     """
-    yield Context(timeout)
+    yield Context(timeout, memory_limit_in_mb, request_id)
 
 
 class Context:
     """
     Mock Lambda context object.
 
-    :param int timeout: Lambda timeout in seconds
-    """
+    The request ID is generated once per invocation (unless one is given,
+    e.g. by the server to echo it in the response headers) and the log
+    stream name once per process; the function's name, version, ARN & log
+    group are the same for every invocation.
 
-    def __init__(self, timeout=None):
-        self._start = datetime.utcnow()
-        self._timeout = timeout or 30
+    The deadline is on the monotonic clock, which is shared by every process
+    on the host, so it stays valid in execution environment subprocesses.
 
-    @property
-    def function_name(self):
-        return "lambda-gateway"
-
-    @property
-    def function_version(self):
-        return "$LATEST"
+    :param int timeout: Lambda timeout in seconds
+    :param int memory_limit_in_mb: Lambda memory size in MB
+    :param str request_id: Lambda request ID [default: a new one]
+    """
 
-    @property
-    def invoked_function_arn(self):
-        account_id = "123456789012"
-        region = "us-east-1"
-        function_name = self.function_name
-        return f"arn:aws:lambda:{region}:{account_id}:function:{function_name}"
+    __slots__ = (
+        "aws_request_id",
+        "log_stream_name",
+        "memory_limit_in_mb",
+        "_timeout",
+        "_deadline",
+    )
 
-    @property
-    def memory_limit_in_mb(self):
-        return 128
+    function_name = FUNCTION_NAME
+    function_version = FUNCTION_VERSION
+    invoked_function_arn = INVOKED_FUNCTION_ARN
+    log_group_name = LOG_GROUP_NAME
 
-    @property
-    def aws_request_id(self):
-        return str(uuid.uuid1())
+    def __init__(self, timeout=None, memory_limit_in_mb=None, request_id=None):
+        self.aws_request_id = request_id or get_request_id()
+        self.log_stream_name = LOG_STREAM_NAME
+        self.memory_limit_in_mb = memory_limit_in_mb or 128
+        self._timeout = timeout or 30
+        self.start_timer()
 
-    @property
-    def log_group_name(self):
-        return "/aws/lambda/lambda-gateway"
+    def start_timer(self):
+        """
+        (Re)start the timeout countdown.
 
-    @property
-    def log_stream_name(self):
-        return str(uuid.uuid1())
+        Execution environments restart it once they are ready, so that (as in
+        Lambda) the timeout does not include waiting for or starting one.
+        """
+        self._deadline = time.monotonic() + self._timeout
 
     def get_remaining_time_in_millis(self):
         """
         Get remaining TTL for Lambda context.
         """
-        delta = datetime.utcnow() - self._start
-        remaining_time_in_s = self._timeout - delta.total_seconds()
+        remaining_time_in_s = self._deadline - time.monotonic()
         if remaining_time_in_s < 0:
             return 0
         return remaining_time_in_s * 1000
@@ -0,0 +1,335 @@
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_ROUTE = "$default"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Metric:
+    """
+    Prometheus metric whose samples are sharded per thread.
+
+    Each thread records into its own dict without taking a lock, so recording
+    never contends with other threads; only a thread's first sample and
+    collection (which sums the shards) take the metric's lock. Shards of
+    threads that have exited are folded into a single retired shard when the
+    metric is collected, so short-lived connection threads do not pile up.
+
+    :param str name: Metric name
+    :param str documentation: Metric help text
+    :param tuple labelnames: Label names
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = {}
+
+    def shard(self):
+        """
+        Get the calling thread's shard.
+
+        :returns dict: Samples by label values
+        """
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def collect(self):
+        """
+        Sum the samples of all shards.
+
+        :returns dict: Samples by label values
+        """
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self.merge(self._retired, shard)
+            self._shards = live
+            total = {}
+            self.merge(total, self._retired)
+            for _, shard in live:
+                self.merge(total, shard.copy())
+        return total
+
+    def merge(self, total, shard):
+        """
+        Add the samples of a shard to a running total.
+
+        :param dict total: Samples by label values (updated in place)
+        :param dict shard: Samples by label values
+        """
+        for key, value in shard.items():
+            total[key] = total.get(key, 0) + value
+
+    def expose(self):
+        """
+        Render the metric in the Prometheus text format.
+
+        :returns list: Exposition lines
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{self.format_labels(key)} {value}")
+        return lines
+
+    def format_labels(self, values, **extra):
+        """
+        Format label values as a Prometheus label set.
+
+        :param tuple values: Label values, in the order of labelnames
+        :param dict extra: Additional labels
+        :returns str: Label set (empty if there are no labels)
+        """
+        labels = [*zip(self.labelnames, values), *extra.items()]
+        if not labels:
+            return ""
+        pairs = ",".join(f'{key}="{escape(val)}"' for key, val in labels)
+        return f"{{{pairs}}}"
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing Prometheus counter.
+    """
+
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        """
+        Increment the counter.
+
+        :param tuple labels: Label values
+        :param int amount: Increment
+        """
+        shard = self.shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    """
+    Prometheus gauge, e.g. of things in flight.
+
+    Increments & decrements may happen on different threads: the gauge is
+    the sum of every thread's changes. A gauge is either incremented or set,
+    not both.
+    """
+
+    type = "gauge"
+
+    def dec(self, *labels, amount=1):
+        """
+        Decrement the gauge.
+
+        :param tuple labels: Label values
+        :param int amount: Decrement
+        """
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        """
+        Set the gauge, from any thread.
+
+        :param float value: Gauge value
+        :param tuple labels: Label values
+        """
+        with self._lock:
+            self._retired[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Prometheus histogram with fixed buckets.
+
+    :param str name: Metric name
+    :param str documentation: Metric help text
+    :param tuple labelnames: Label names
+    :param tuple buckets: Upper bounds of the buckets, in seconds
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        """
+        Record an observation.
+
+        :param float value: Observed value
+        :param tuple labels: Label values
+        """
+        shard = self.shard()
+        try:
+            counts = shard[labels]
+        except KeyError:
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def merge(self, total, shard):
+        for key, counts in shard.items():
+            try:
+                running = total[key]
+            except KeyError:
+                total[key] = list(counts)
+            else:
+                for i, count in enumerate(counts):
+                    running[i] += count
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for key, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = self.format_labels(key, le=format_bound(bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            count = cumulative + counts[-2]
+            labels = self.format_labels(key, le="+Inf")
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{self.format_labels(key)} {counts[-1]}")
+            lines.append(f"{self.name}_count{self.format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Collection of metrics exposed together.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric to the registry.
+
+        :param Metric metric: Metric
+        :returns Metric: The same metric
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        """
+        Render all metrics in the Prometheus text format.
+
+        :returns str: Exposition text
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    """
+    Escape a label value.
+
+    :param object value: Label value
+    :returns str: Escaped label value
+    """
+    value = str(value)
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def format_bound(bound):
+    """
+    Format a histogram bucket bound like the Prometheus client libraries.
+
+    :param float bound: Bucket upper bound
+    :returns str: Formatted bound
+    """
+    return repr(float(bound))
+
+
+def get_response(httpMethod):
+    """
+    Get the metrics endpoint response, as a Lambda result.
+
+    :param str httpMethod: HTTP request method
+    :returns dict: Lambda result
+    """
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": CONTENT_TYPE},
+        "body": REGISTRY.expose() if httpMethod != "HEAD" else "",
+    }
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.register(
+    Counter(
+        "lambda_gateway_requests_total",
+        "HTTP requests by method, route & status.",
+        ("method", "route", "status"),
+    )
+)
+REQUESTS_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "lambda_gateway_requests_in_flight",
+        "HTTP requests being handled.",
+    )
+)
+PHASE_SECONDS = REGISTRY.register(
+    Histogram(
+        "lambda_gateway_phase_duration_seconds",
+        "Request latency by phase: queue_wait, event_build, handler & "
+        "response_write.",
+        ("phase",),
+    )
+)
+INVOCATIONS_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "lambda_gateway_invocations_in_flight",
+        "Lambda invocations in progress.",
+    )
+)
+INVOCATION_ERRORS = REGISTRY.register(
+    Counter(
+        "lambda_gateway_invocation_errors_total",
+        "Invocations answered with 504 (timeout) or 502 (error).",
+        ("type",),
+    )
+)
+EXECUTOR_TASKS = REGISTRY.register(
+    Gauge(
+        "lambda_gateway_executor_tasks",
+        "Calls submitted to the handler executor, running or queued.",
+    )
+)
+EXECUTOR_THREADS = REGISTRY.register(
+    Gauge(
+        "lambda_gateway_executor_threads",
+        "Maximum threads of the handler executor.",
+    )
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter(
+        "lambda_gateway_cache_requests_total",
+        "Response cache lookups by result: hit, miss & invalidate.",
+        ("result",),
+    )
+)
@@ -0,0 +1,260 @@
+import cProfile
+import os
+import pstats
+import random
+import threading
+import types
+
+from lambda_gateway import logger
+
+PHASES = ("event_build", "handler", "response_write")
+DISABLE = ("~", 0, "<method 'disable' of '_lsprof.Profiler' objects>")
+MIN_STACK_US = 1
+
+
+class Profiler:
+    """
+    Profile a sample of requests with cProfile, aggregated per phase.
+
+    The gateway's own work (event_build, response_write) and the Lambda
+    handler are profiled separately, so their costs are not mixed up. Each
+    sampled call is profiled on its own and merged into the phase's
+    aggregated stats, which are dumped as pstats files and as collapsed
+    stacks (one "frame;frame;frame microseconds" line per stack) for
+    flamegraph tools.
+
+    Coroutines are profiled only while they run, not while they await, so
+    other requests served by the same event loop do not end up in their
+    profile.
+
+    :param str directory: Directory to dump profiles into
+    :param float rate: Fraction of calls to profile [default: all of them]
+    """
+
+    def __init__(self, directory, rate=1.0):
+        self.directory = directory
+        self.rate = rate
+        self.stats = {}
+        self.samples = dict.fromkeys(PHASES, 0)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """
+        Decide whether to profile a call.
+
+        :returns bool: True to profile the call
+        """
+        return self.rate >= 1 or random.random() < self.rate
+
+    def call(self, phase, func, *args):
+        """
+        Call a function, profiling it if it is sampled.
+
+        :param str phase: Phase the call is attributed to
+        :param function func: Function
+        :param tuple args: Function arguments
+        :returns object: Function result
+        """
+        if not self.sample():
+            return func(*args)
+        profile = cProfile.Profile()
+        if not enable(profile):
+            return func(*args)
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            self.add(phase, profile)
+
+    async def coroutine(self, phase, coroutine):
+        """
+        Await a coroutine, profiling it if it is sampled.
+
+        :param str phase: Phase the coroutine is attributed to
+        :param coroutine coroutine: Coroutine
+        :returns object: Coroutine result
+        """
+        if not self.sample():
+            return await coroutine
+        profile = cProfile.Profile()
+        try:
+            return await drive(profile, coroutine)
+        finally:
+            self.add(phase, profile)
+
+    def add(self, phase, profile):
+        """
+        Merge a profile into the aggregated stats of its phase.
+
+        :param str phase: Phase
+        :param Profile profile: Profile of one call
+        """
+        try:
+            stats = pstats.Stats(profile)
+        except TypeError:
+            # Nothing was recorded (the profiler could not be enabled)
+            return
+        stats.stats.pop(DISABLE, None)
+        with self._lock:
+            if phase in self.stats:
+                self.stats[phase].add(stats)
+            else:
+                self.stats[phase] = stats
+            self.samples[phase] = self.samples.get(phase, 0) + 1
+
+    def get_paths(self):
+        """
+        Get the paths of this process's dump files.
+
+        :returns dict: pstats file paths by phase & collapsed stacks path
+        """
+        pid = os.getpid()
+        stats = {
+            phase: os.path.join(self.directory, f"{phase}.{pid}.pstats")
+            for phase in PHASES
+        }
+        collapsed = os.path.join(self.directory, f"collapsed.{pid}.txt")
+        return stats, collapsed
+
+    def dump(self):
+        """
+        Write the aggregated stats of each phase & the collapsed stacks.
+
+        :returns list: Paths written
+        """
+        paths, collapsed = self.get_paths()
+        written = []
+        lines = []
+        with self._lock:
+            for phase, stats in sorted(self.stats.items()):
+                stats.dump_stats(paths[phase])
+                written.append(paths[phase])
+                lines.extend(collapse(stats, phase))
+        if lines:
+            with open(collapsed, "w") as stacks:
+                stacks.write("\n".join(lines) + "\n")
+            written.append(collapsed)
+        logger.info(
+            "Profiles of %s sampled calls written to %s",
+            ", ".join(f"{n} {phase}" for phase, n in self.samples.items()),
+            self.directory,
+        )
+        return written
+
+    def dump_async(self, *_):
+        """
+        Dump the profiles on a separate thread, e.g. from a signal handler.
+        """
+        threading.Thread(target=self.dump, name="lambda-gateway-profiler").start()
+
+    def close(self):
+        """
+        Dump the profiles, if anything was profiled.
+        """
+        if self.stats:
+            self.dump()
+
+
+def enable(profile):
+    """
+    Enable a profiler.
+
+    :param Profile profile: Profiler
+    :returns bool: False if another profiler is active (Python 3.12+)
+    """
+    try:
+        profile.enable()
+    except ValueError:
+        return False
+    return True
+
+
+@types.coroutine
+def drive(profile, coroutine):
+    """
+    Run a coroutine with a profiler enabled only while it runs.
+
+    Each step of the coroutine is run with the profiler enabled; whatever it
+    awaits is passed up to the event loop with the profiler disabled.
+
+    :param Profile profile: Profiler
+    :param coroutine coroutine: Coroutine
+    :returns object: Coroutine result
+    """
+    value = error = None
+    while True:
+        enabled = enable(profile)
+        try:
+            if error is None:
+                awaited = coroutine.send(value)
+            else:
+                awaited = coroutine.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            if enabled:
+                profile.disable()
+        try:
+            value, error = (yield awaited), None
+        except GeneratorExit:
+            coroutine.close()
+            raise
+        except BaseException as err:
+            value, error = None, err
+
+
+def collapse(stats, root):
+    """
+    Convert aggregated stats into collapsed stacks.
+
+    cProfile records caller/callee pairs, not whole stacks, so stacks are
+    rebuilt from the call graph: the time of a function is split between
+    its callers in proportion to the time each of them spent in it.
+
+    :param Stats stats: Aggregated stats
+    :param str root: Name of the root frame, e.g. the phase
+    :returns list: "frame;frame;frame microseconds" lines
+    """
+    callees = {func: {} for func in stats.stats}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            if caller in callees:
+                callees[caller][func] = edge[3]
+    roots = [
+        func
+        for func, (_, _, _, _, callers) in stats.stats.items()
+        if not any(caller in callees for caller in callers)
+    ]
+    totals = {}
+
+    def walk(func, stack, scale):
+        _, _, tt, ct, _ = stats.stats[func]
+        stack = stack + (format_frame(func),)
+        self_us = tt * scale * 1e6
+        if self_us >= MIN_STACK_US:
+            key = ";".join(stack)
+            totals[key] = totals.get(key, 0) + self_us
+        for callee, edge_ct in callees[func].items():
+            callee_ct = stats.stats[callee][3]
+            if callee_ct <= 0 or format_frame(callee) in stack:
+                continue
+            callee_scale = edge_ct * scale / callee_ct
+            if callee_ct * callee_scale * 1e6 >= MIN_STACK_US:
+                walk(callee, stack, callee_scale)
+
+    for func in roots:
+        walk(func, (root,), 1)
+    return [f"{stack} {round(us)}" for stack, us in sorted(totals.items())]
+
+
+def format_frame(func):
+    """
+    Format a pstats function key as a flamegraph frame.
+
+    :param tuple func: Filename, line number & function name
+    :returns str: Frame name
+    """
+    filename, line, name = func
+    if filename != "~":
+        name = f"{name} ({os.path.basename(filename)}:{line})"
+    return name.replace(";", ":")
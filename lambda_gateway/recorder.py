@@ -0,0 +1,160 @@
+import json
+import os
+import queue
+import threading
+
+from lambda_gateway import logger
+from lambda_gateway.responses import is_stream
+
+MAX_QUEUE = 10000
+MAX_BATCH = 512
+
+
+class Recorder:
+    """
+    Append invocations (event, response & timing) to a JSONL file.
+
+    Records are queued and written by a background thread, so invocations
+    never wait on the disk. The writer thread is started lazily, like the
+    dispatcher's event loop, so forked worker processes each get their own;
+    every batch is appended with a single write to a file opened with
+    O_APPEND, so workers sharing the file do not interleave lines. When the
+    writer falls behind by more than max_queue records, new records are
+    dropped (and counted) rather than blocking.
+
+    :param str path: JSONL file path
+    :param int max_queue: Maximum records waiting to be written
+    """
+
+    def __init__(self, path, max_queue=MAX_QUEUE):
+        self.path = path
+        self.max_queue = max_queue
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.queue = None
+        self.thread = None
+        self.recorded = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """
+        Start the writer thread (if not already running).
+
+        :returns Queue: Queue of records to write
+        """
+        with self._lock:
+            if not self.running:
+                self.queue = queue.Queue(self.max_queue)
+                self.thread = threading.Thread(
+                    target=self._write_forever,
+                    args=(self.queue,),
+                    name="lambda-gateway-recorder",
+                    daemon=True,
+                )
+                self.thread.start()
+            return self.queue
+
+    def record(self, event, response, time, duration_ns):
+        """
+        Queue an invocation to be written.
+
+        :param str event: Lambda event object as passed to the handler,
+            serialized to JSON before the handler could change it
+        :param dict response: Lambda invocation result
+        :param float time: Start of the invocation (seconds since the epoch)
+        :param int duration_ns: Duration of the invocation in nanoseconds
+        """
+        records = self.queue if self.running else self.start()
+        record = {
+            "time": time,
+            "duration": duration_ns / 1e6,
+            "event": event,
+            "response": get_response_record(response),
+        }
+        try:
+            records.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def close(self):
+        """
+        Write the queued records and close the file.
+        """
+        with self._lock:
+            thread = self.thread if self.running else None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+        os.close(self.fd)
+        logger.info(
+            "Recorded %d invocations to %s (%d dropped)",
+            self.recorded,
+            self.path,
+            self.dropped,
+        )
+
+    def _write_forever(self, records):
+        """
+        Write queued records in batches until the stop sentinel.
+
+        :param Queue records: Queue of records to write
+        """
+        done = False
+        while not done:
+            batch = []
+            record = records.get()
+            while record is not None:
+                batch.append(record)
+                if len(batch) >= MAX_BATCH:
+                    break
+                try:
+                    record = records.get_nowait()
+                except queue.Empty:
+                    break
+            done = record is None
+            if not batch:
+                continue
+            try:
+                lines = "".join(format_record(rec) for rec in batch)
+                os.write(self.fd, lines.encode())
+            except Exception as err:
+                logger.error("Unable to record invocations: %s", err)
+            else:
+                self.recorded += len(batch)
+
+
+def format_record(record):
+    """
+    Format a queued record as a JSONL line.
+
+    :param dict record: Queued record, with its event already serialized
+    :returns str: JSON line
+    """
+    fields = []
+    for key, value in record.items():
+        if key != "event":
+            value = json.dumps(value, default=str)
+        fields.append(f'"{key}": {value}')
+    return "{" + ", ".join(fields) + "}\n"
+
+
+def get_response_record(response):
+    """
+    Get a JSON-serializable copy of a Lambda result.
+
+    Streamed bodies are consumed by the client, not recorded, so they are
+    recorded as null.
+
+    :param dict response: Lambda invocation result
+    :returns dict: Lambda invocation result to record
+    """
+    if is_stream(response):
+        return {"statusCode": 200, "body": None}
+    if isinstance(response, dict) and is_stream(response.get("body")):
+        return {**response, "body": None}
+    return response
@@ -0,0 +1,211 @@
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+
+from lambda_gateway import logger
+
+POLL_INTERVAL = 1
+
+
+class Reloader:
+    """
+    Reload the Lambda handler when its source files change.
+
+    A background thread polls the modification times of the handler's
+    module (or of every module in its top-level package), so invocations
+    never pay for a stat or an import. On a change the handler's modules are
+    imported afresh and the new handler is swapped in with a single dict
+    assignment: invocations in flight finish on the function they started
+    with, and if the new code fails to import the previous handler (and
+    modules) are kept. Execution environments are recycled instead, so the
+    next invocations cold start on the new code. With routes, the modules of
+    every route's handler are watched and reloaded together.
+
+    :param EventProxy proxy: Lambda event proxy
+    :param bool package: Watch the handler's whole top-level package
+    :param float interval: Seconds between polls
+    """
+
+    def __init__(self, proxy, package=False, interval=POLL_INTERVAL):
+        self.proxy = proxy
+        self.package = package
+        self.interval = interval
+        self.mtimes = {}
+        self.thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def handlers(self):
+        """
+        Signatures of the handlers, for log messages.
+        """
+        return ", ".join(self.proxy.get_signatures())
+
+    @property
+    def modules(self):
+        """
+        Names of the handlers' modules (or top-level packages).
+        """
+        modules = []
+        for signature in self.proxy.get_signatures():
+            module, _, _ = signature.rpartition(".")
+            if self.package:
+                module, *_ = module.split(".")
+            if module not in modules:
+                modules.append(module)
+        return modules
+
+    def owns(self, name):
+        """
+        Check whether a module is reloaded with the handlers.
+
+        :param str name: Module name
+        :returns bool: True for the handlers' modules (or package modules)
+        """
+        if not self.package:
+            return name in self.modules
+        return any(name == top or name.startswith(f"{top}.") for top in self.modules)
+
+    def get_paths(self):
+        """
+        Get the source files to watch.
+
+        :returns list: File paths
+        """
+        if os.path.curdir not in sys.path:
+            sys.path.append(os.path.curdir)
+        paths = set()
+        for name in self.modules:
+            try:
+                spec = importlib.util.find_spec(name)
+            except (ImportError, ValueError):
+                spec = None
+            if spec is None or spec.origin is None:
+                continue
+            if not self.package or not spec.submodule_search_locations:
+                paths.add(spec.origin)
+                continue
+            for location in spec.submodule_search_locations:
+                for root, _, files in os.walk(location):
+                    paths.update(
+                        os.path.join(root, file)
+                        for file in files
+                        if file.endswith(".py")
+                    )
+        return sorted(paths)
+
+    def scan(self):
+        """
+        Get the modification times of the watched files.
+
+        :returns dict: Modification times (ns) by path
+        """
+        mtimes = {}
+        for path in self.get_paths():
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+        return mtimes
+
+    def start(self):
+        """
+        Start polling for changes.
+        """
+        self.mtimes = self.scan()
+        if not self.mtimes:
+            logger.warning("No source files found to reload %s", self.handlers)
+        self._stopped.clear()
+        self.thread = threading.Thread(
+            target=self.poll_forever,
+            name="lambda-gateway-reloader",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def poll_forever(self):
+        """
+        Reloader loop: check for changes until stopped.
+        """
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """
+        Reload the handler if any watched file changed since the last check.
+
+        :returns bool: True if the handler was reloaded
+        """
+        mtimes = self.scan()
+        if mtimes == self.mtimes:
+            return False
+        for path, mtime in mtimes.items():
+            if self.mtimes.get(path) != mtime:
+                discard_bytecode(path)
+        self.mtimes = mtimes
+        return self.reload()
+
+    def reload(self):
+        """
+        Reload the handlers.
+
+        Route handlers that were never invoked are left to load on first use.
+
+        :returns bool: True if the new handlers were swapped in
+        """
+        if self.proxy.cache is not None:
+            self.proxy.cache.clear()
+        if self.proxy.pools:
+            for pool in list(self.proxy.pools.values()):
+                pool.recycle()
+            logger.info("Recycled environments to reload %s", self.handlers)
+            return True
+        previous = {
+            name: module
+            for name, module in list(sys.modules.items())
+            if self.owns(name)
+        }
+        for name in previous:
+            del sys.modules[name]
+        importlib.invalidate_caches()
+        try:
+            self.proxy.load_handlers(self.proxy.get_signatures(loaded=True))
+        except Exception as err:
+            for name in [name for name in list(sys.modules) if self.owns(name)]:
+                del sys.modules[name]
+            sys.modules.update(previous)
+            logger.error(
+                "Unable to reload %s, keeping the previous handler: %s",
+                self.handlers,
+                err,
+            )
+            return False
+        logger.info("Reloaded %s", self.handlers)
+        return True
+
+    def close(self):
+        """
+        Stop polling for changes.
+        """
+        self._stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def discard_bytecode(path):
+    """
+    Remove the cached bytecode of a changed source file.
+
+    Bytecode is validated against the source's size & mtime in whole
+    seconds, so a quick edit that keeps the size would otherwise reload the
+    stale bytecode.
+
+    :param str path: Source file path
+    """
+    try:
+        os.remove(importlib.util.cache_from_source(path))
+    except (OSError, NotImplementedError, ValueError):
+        pass
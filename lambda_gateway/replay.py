@@ -0,0 +1,262 @@
+"""
+Replay invocations recorded with --record.
+
+usage:
+  lambda-gateway replay [options] FILE [HANDLER]
+"""
+
+import argparse
+import collections
+import json
+import logging
+import sys
+import threading
+import time
+
+from lambda_gateway import bench, logger
+from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.responses import is_stream
+from lambda_gateway.routes import load_routes
+
+
+def load_records(path):
+    """
+    Load recorded invocations, in the order they started.
+
+    :param str path: JSONL file written by --record
+    :returns list: Records
+    """
+    records = []
+    with open(path) as jsonl:
+        for line in jsonl:
+            if line.strip():
+                records.append(json.loads(line))
+    if not records:
+        raise ValueError(f"No records in {path}")
+    records.sort(key=lambda record: record.get("time") or 0)
+    return records
+
+
+class Schedule(bench.Schedule):
+    """
+    Hands out the recorded invocations once each, at their recorded offsets
+    compressed by a speed factor.
+
+    :param list records: Records, in the order they started
+    :param float speed: Replay speed, e.g. 10 for ten times faster than
+        recorded [default: as fast as possible]
+    """
+
+    def __init__(self, records, speed=None):
+        super().__init__(0, len(records))
+        self.speed = speed
+        first = records[0].get("time") or 0
+        self.offsets = [(record.get("time") or first) - first for record in records]
+
+    def next(self):
+        n = super().next()
+        if n is not None and self.speed:
+            due = self.start + self.offsets[n] / self.speed
+            now = time.perf_counter()
+            if due > now:
+                time.sleep(due - now)
+        return n
+
+
+class ReplayClient:
+    """
+    Client pushing recorded events straight into an EventProxy.
+
+    Events are routed like the gateway routes requests, so a recording of a
+    gateway with routes replays each event against its route's handler.
+    Replayed responses whose status differs from the recorded one are
+    counted as mismatches, to spot regressions.
+
+    :param str handler: Lambda handler signature ($default route with routes)
+    :param float timeout: Lambda timeout in seconds
+    :param int max_workers: Handler executor threads
+    :param int environments: Number of execution environments
+    :param int memory: Lambda memory size in MB
+    :param RouteTable routes: Routes to Lambda handlers
+    """
+
+    def __init__(
+        self,
+        handler,
+        timeout=None,
+        max_workers=None,
+        environments=None,
+        memory=None,
+        routes=None,
+    ):
+        self.proxy = EventProxy(
+            handler,
+            "/",
+            timeout,
+            max_workers,
+            environments,
+            memory=memory,
+            routes=routes,
+        )
+        if self.proxy.pool is not None:
+            self.proxy.pool.check()
+        elif self.proxy.handler:
+            self.proxy.load_handler()
+        self.mismatches = collections.Counter()
+        self._lock = threading.Lock()
+
+    def send(self, record, n):
+        """
+        Invoke the handler of a recorded event's route.
+
+        :param dict record: Recorded invocation
+        :param int n: Request number
+        :returns int: Response status code
+        """
+        event = dict(record["event"])
+        route = self.proxy.route(event)
+        result, _ = self.proxy.respond(event, route=route)
+        if is_stream(result):
+            result = {"statusCode": 200, "body": result}
+        body = result.get("body")
+        if is_stream(body):
+            collections.deque(self.proxy.iter_stream(body), 0)
+        status = result.get("statusCode") or 500
+        recorded = (record.get("response") or {}).get("statusCode") or 500
+        if status != recorded:
+            with self._lock:
+                self.mismatches[f"{recorded} -> {status}"] += 1
+        return status
+
+    def close(self):
+        """
+        Shut down the proxy.
+        """
+        self.proxy.close()
+
+
+def get_opts(argv=None):
+    """
+    Get replay CLI options.
+
+    :param list argv: Arguments [default: sys.argv]
+    """
+    parser = argparse.ArgumentParser(
+        prog="lambda-gateway replay",
+        description="Replay invocations recorded with --record against a "
+        "handler (or the handlers of routes) in-process and report "
+        "throughput, latency & status mismatches.",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        default=1,
+        help="Concurrent workers [default: 1]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "-s",
+        "--speed",
+        help="Replay at the recorded pace sped up N times, e.g. 1 for real "
+        "time [default: as fast as possible]",
+        metavar="N",
+        type=float,
+    )
+    parser.add_argument(
+        "--environments",
+        help="Run the handler in up to N execution environments "
+        "[default: run in-process]",
+        metavar="N",
+        type=int,
+    )
+    parser.add_argument(
+        "--memory",
+        help="Lambda memory size [default: 128]",
+        metavar="MB",
+        type=int,
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        help="Lambda timeout",
+        metavar="SECONDS",
+        type=float,
+    )
+    parser.add_argument(
+        "--routes",
+        dest="routes",
+        help="Route events to handlers by route key, from a JSON file like "
+        '{"GET /items/{id}": "items.get_item"}; HANDLER, if any, is the '
+        "$default route [default: every event to HANDLER]",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the summary as JSON",
+    )
+    parser.add_argument(
+        "FILE",
+        help="JSONL file written by --record",
+    )
+    parser.add_argument(
+        "HANDLER",
+        help="Lambda handler signature",
+        nargs="?",
+    )
+    opts = parser.parse_args(argv)
+    if opts.HANDLER is None and opts.routes is None:
+        parser.error("a HANDLER or --routes is required")
+    return opts
+
+
+def format_summary(summary):
+    """
+    Format a replay summary for humans.
+
+    :param dict summary: Replay summary
+    :returns str: Report
+    """
+    mismatches = summary["mismatches"]
+    return "\n".join(
+        [
+            bench.format_summary(summary),
+            "Mismatches:  "
+            + (", ".join(f"{k}: {v}" for k, v in mismatches.items()) or "-"),
+        ]
+    )
+
+
+def main(argv=None):
+    """
+    Run the replay CLI.
+
+    :param list argv: Arguments [default: sys.argv]
+    """
+    opts = get_opts(argv)
+    try:
+        records = load_records(opts.FILE)
+        routes = load_routes(opts.routes) if opts.routes else None
+        logger.logger.setLevel(logging.WARNING)
+        client = ReplayClient(
+            opts.HANDLER,
+            opts.timeout,
+            opts.concurrency,
+            opts.environments,
+            opts.memory,
+            routes,
+        )
+    except (OSError, ValueError) as err:
+        sys.exit(f"lambda-gateway replay: error: {err}")
+    schedule = Schedule(records, opts.speed)
+    try:
+        results = bench.run(client, records, schedule, opts.concurrency)
+    finally:
+        client.close()
+    summary = results.summary()
+    summary["mismatches"] = dict(sorted(client.mismatches.items()))
+    if opts.json:
+        print(json.dumps(summary))
+    else:
+        print(format_summary(summary))
@@ -0,0 +1,118 @@
+import math
+import sys
+
+from lambda_gateway import logger
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # Unix only
+
+MB = 1024 * 1024
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident set size of this process, so that it can be
+    measured per invocation.
+
+    Only possible on Linux; elsewhere the peak is the lifetime peak of the
+    process (which is also what Lambda reports for warm invocations).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def get_peak_rss():
+    """
+    Get the peak resident set size of this process since the last reset.
+
+    :returns int: Peak memory in bytes (None if it cannot be read)
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class Report:
+    """
+    Timings & memory of one invocation, logged in the START, END & REPORT
+    line format of Lambda so that CloudWatch log tooling can parse them.
+
+    :param str request_id: Lambda request ID
+    :param int memory_size: Lambda memory size in MB
+    :param str version: Lambda function version
+    """
+
+    def __init__(self, request_id, memory_size, version="$LATEST"):
+        self.request_id = request_id
+        self.memory_size = memory_size
+        self.version = version
+        self.duration_ns = None
+        self.init_duration_ns = None
+        self.max_memory = None
+        self.status = None
+        self.error_type = None
+
+    def fail(self, status, error_type=None):
+        """
+        Mark the invocation as failed.
+
+        :param str status: Lambda status, e.g. "timeout" or "error"
+        :param str error_type: Lambda error type, e.g. "Runtime.OutOfMemory"
+        """
+        self.status = status
+        self.error_type = error_type
+
+    @property
+    def billed_duration_ms(self):
+        """
+        Duration rounded up to the next millisecond, like Lambda bills it.
+        """
+        return max(math.ceil((self.duration_ns or 0) / 1e6), 1)
+
+    def start(self):
+        """
+        Log the START line.
+        """
+        logger.info("START RequestId: %s Version: %s", self.request_id, self.version)
+
+    def end(self):
+        """
+        Log the END & REPORT lines.
+        """
+        logger.info("END RequestId: %s", self.request_id)
+        logger.info(self.format())
+
+    def format(self):
+        """
+        Format the REPORT line.
+
+        :returns str: REPORT line
+        """
+        fields = [
+            f"REPORT RequestId: {self.request_id}",
+            f"Duration: {(self.duration_ns or 0) / 1e6:.2f} ms",
+            f"Billed Duration: {self.billed_duration_ms} ms",
+            f"Memory Size: {self.memory_size} MB",
+        ]
+        if self.max_memory is not None:
+            fields.append(f"Max Memory Used: {self.max_memory // MB} MB")
+        if self.init_duration_ns is not None:
+            fields.append(f"Init Duration: {self.init_duration_ns / 1e6:.2f} ms")
+        if self.status is not None:
+            fields.append(f"Status: {self.status}")
+        if self.error_type is not None:
+            fields.append(f"Error Type: {self.error_type}")
+        return "\t".join(fields)
@@ -0,0 +1,219 @@
+import asyncio
+import base64
+import io
+
+MAX_BODY_SIZE = 6 * 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+MAX_LINE = 1024
+TEXT_TYPES = {
+    "application/graphql",
+    "application/javascript",
+    "application/json",
+    "application/x-www-form-urlencoded",
+    "application/xml",
+}
+
+
+class RequestBodyError(ValueError):
+    """
+    Request body is malformed.
+    """
+
+    status = 400
+
+
+class PayloadTooLarge(RequestBodyError):
+    """
+    Request body exceeds the configured size limit.
+    """
+
+    status = 413
+
+
+class UnsupportedTransferEncoding(RequestBodyError):
+    """
+    Request body uses a transfer coding other than chunked.
+    """
+
+    status = 501
+
+
+def is_text(content_type):
+    """
+    Check whether a Content-Type denotes text.
+
+    :param str content_type: Content-Type header value
+    :returns bool: True for text/*, JSON, XML, JavaScript & form data
+    """
+    mime = content_type.split(";", 1)[0].strip().lower()
+    return (
+        mime.startswith("text/")
+        or mime in TEXT_TYPES
+        or mime.endswith(("+json", "+xml"))
+    )
+
+
+def encode_body(data, content_type=None):
+    """
+    Encode request body for a Lambda event.
+
+    Text bodies are passed through as strings; binary bodies (by
+    Content-Type, or because they are not valid UTF-8) are base64-encoded.
+
+    :param bytes data: Request body
+    :param str content_type: Content-Type header value
+    :returns tuple: Event body & isBase64Encoded flag
+    """
+    if not content_type or is_text(content_type):
+        try:
+            return data.decode(), False
+        except UnicodeDecodeError:
+            pass
+    return base64.b64encode(data).decode(), True
+
+
+def get_content_length(headers, limit=MAX_BODY_SIZE):
+    """
+    Get declared length of a request body, before reading it.
+
+    :param Message headers: HTTP request headers
+    :param int limit: Maximum body size in bytes
+    :returns int: Content length, or None if the body is chunked
+    :raises RequestBodyError: if the body cannot or may not be read
+    """
+    encoding = headers.get("Transfer-Encoding")
+    if encoding:
+        if encoding.split(",")[-1].strip().lower() != "chunked":
+            raise UnsupportedTransferEncoding(
+                f"Unsupported Transfer-Encoding: {encoding}"
+            )
+        return None
+    try:
+        content_length = int(headers.get("Content-Length") or 0)
+    except ValueError:
+        raise RequestBodyError("Invalid Content-Length")
+    if content_length < 0:
+        raise RequestBodyError("Invalid Content-Length")
+    if limit and content_length > limit:
+        raise PayloadTooLarge("Request Entity Too Large")
+    return content_length
+
+
+def parse_chunk_size(line):
+    """
+    Parse chunk-size line of a chunked body.
+
+    :param bytes line: Chunk size line (chunk extensions are ignored)
+    :returns int: Chunk size in bytes
+    """
+    if len(line) > MAX_LINE or not line.endswith(b"\n"):
+        raise RequestBodyError("Invalid chunk size")
+    try:
+        size = int(line.split(b";", 1)[0].strip(), 16)
+    except ValueError:
+        raise RequestBodyError("Invalid chunk size")
+    if size < 0:
+        raise RequestBodyError("Invalid chunk size")
+    return size
+
+
+def check_size(total, limit):
+    """
+    Check running total of a chunked body against the size limit.
+    """
+    if limit and total > limit:
+        raise PayloadTooLarge("Request Entity Too Large")
+
+
+def read_body(rfile, headers, limit=MAX_BODY_SIZE):
+    """
+    Read request body from a blocking file object.
+
+    Bodies are read in blocks as they arrive, so a declared Content-Length
+    is not allocated up front. The whole body ends up in memory (it is
+    forwarded inside the Lambda event), bounded by limit.
+
+    :param file rfile: Request stream
+    :param Message headers: HTTP request headers
+    :param int limit: Maximum body size in bytes
+    :returns bytes: Request body
+    :raises RequestBodyError: if the body is malformed or too large
+    """
+    content_length = get_content_length(headers, limit)
+    body = io.BytesIO()
+    if content_length is None:
+        total = 0
+        while True:
+            size = parse_chunk_size(rfile.readline(MAX_LINE + 1))
+            if size == 0:
+                break
+            total += size
+            check_size(total, limit)
+            copy_body(rfile, body, size)
+            if rfile.read(2) != b"\r\n":
+                raise RequestBodyError("Invalid chunk terminator")
+        while rfile.readline(MAX_LINE + 1) not in (b"\r\n", b"\n", b""):
+            pass  # discard trailers
+    else:
+        copy_body(rfile, body, content_length)
+    return body.getvalue()
+
+
+def copy_body(rfile, body, size):
+    """
+    Copy exactly size bytes from rfile to body in blocks.
+    """
+    while size > 0:
+        block = rfile.read(min(size, BLOCK_SIZE))
+        if not block:
+            raise RequestBodyError("Incomplete request body")
+        body.write(block)
+        size -= len(block)
+
+
+async def read_body_async(reader, headers, limit=MAX_BODY_SIZE, timeout=None):
+    """
+    Read request body from an asyncio StreamReader.
+
+    Same as read_body(), with each read bounded by timeout.
+
+    :param StreamReader reader: Request stream
+    :param Message headers: HTTP request headers
+    :param int limit: Maximum body size in bytes
+    :param float timeout: Timeout in seconds for each read
+    :returns bytes: Request body
+    :raises RequestBodyError: if the body is malformed or too large
+    """
+
+    async def read(coroutine):
+        try:
+            return await asyncio.wait_for(coroutine, timeout)
+        except asyncio.IncompleteReadError:
+            raise RequestBodyError("Incomplete request body")
+        except ValueError:
+            raise RequestBodyError("Invalid chunk size")
+
+    async def copy_async(size):
+        while size > 0:
+            block = await read(reader.readexactly(min(size, BLOCK_SIZE)))
+            body.write(block)
+            size -= len(block)
+
+    content_length = get_content_length(headers, limit)
+    body = io.BytesIO()
+    if content_length is None:
+        total = 0
+        while True:
+            size = parse_chunk_size(await read(reader.readline()))
+            if size == 0:
+                break
+            total += size
+            check_size(total, limit)
+            await copy_async(size)
+            if await read(reader.readexactly(2)) != b"\r\n":
+                raise RequestBodyError("Invalid chunk terminator")
+        while await read(reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # discard trailers
+    else:
+        await copy_async(content_length)
+    return body.getvalue()
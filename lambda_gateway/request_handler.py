@@ -1,8 +1,78 @@
-from urllib import parse
+import select
+import time
 from http.server import SimpleHTTPRequestHandler
 
+from lambda_gateway import (
+    access_log,
+    events,
+    lambda_context,
+    logger,
+    metrics,
+    request_body,
+    responses,
+)
+from lambda_gateway.event_proxy import EventProxy
+
 
 class LambdaRequestHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    timeout = 5
+    max_requests = 1000
+    max_body_size = request_body.MAX_BODY_SIZE
+    min_compression_size = None
+    metrics_path = None
+    profiler = None
+    access_log = access_log.AccessLog()
+    started = None
+
+    def handle(self):
+        self.requests_handled = 0
+        super().handle()
+
+    def handle_one_request(self):
+        if self.requests_handled and not self.wait_for_request():
+            self.close_connection = True
+            return
+        super().handle_one_request()
+
+    def wait_for_request(self):
+        """
+        Wait for the next request on an idle persistent connection.
+
+        On a worker pool the connection is given up as soon as other
+        connections are waiting for a worker, so idle clients never hold on
+        to the workers that busy ones need. Elsewhere reading the request
+        line waits, until the keep-alive timeout.
+
+        :returns bool: True when the next request can be read
+        """
+        is_busy = getattr(self.server, "is_busy", None)
+        if is_busy is None or self.has_buffered_data():
+            return True
+        interval = self.server.idle_poll_interval
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            if deadline is not None:
+                interval = min(interval, deadline - time.monotonic())
+            if select.select([self.connection], [], [], max(interval, 0))[0]:
+                return True
+            if is_busy() or (deadline is not None and time.monotonic() >= deadline):
+                return False
+
+    def has_buffered_data(self):
+        """
+        Check, without blocking, whether request data is waiting to be read
+        (e.g. a pipelined request already buffered by rfile).
+
+        :returns bool: True if data can be read right away
+        """
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        finally:
+            self.connection.settimeout(self.timeout)
+
     def do_DELETE(self):
         self.invoke("DELETE")
 
@@ -27,12 +97,13 @@ class LambdaRequestHandler(SimpleHTTPRequestHandler):
     def get_body(self):
         """
         Get request body to forward to Lambda handler.
+
+        :returns tuple: Event body & isBase64Encoded flag
+        :raises RequestBodyError: if the body is malformed or too large
         """
-        try:
-            content_length = int(self.headers.get("Content-Length"))
-            return self.rfile.read(content_length).decode()
-        except TypeError:
-            return ""
+        body = request_body.read_body(self.rfile, self.headers, self.max_body_size)
+        content_type = self.headers.get("Content-Type")
+        return request_body.encode_body(body, content_type)
 
     def get_event(self, httpMethod):
         """
@@ -56,16 +127,14 @@ class LambdaRequestHandler(SimpleHTTPRequestHandler):
         :param str httpMethod: HTTP request method
         :return dict: Lambda event object
         """
-        url = parse.urlparse(self.path)
-        path, *_ = url.path.split("?")
-        return {
-            "version": "1.0",
-            "body": self.get_body(),
-            "headers": dict(self.headers),
-            "httpMethod": httpMethod,
-            "path": path,
-            "queryStringParameters": dict(parse.parse_qsl(url.query)),
-        }
+        body, isBase64Encoded = self.get_body()
+        return events.get_event_v1(
+            httpMethod,
+            self.path,
+            self.headers,
+            body,
+            isBase64Encoded,
+        )
 
     def get_event_v2(self, httpMethod):
         """
@@ -74,24 +143,14 @@ class LambdaRequestHandler(SimpleHTTPRequestHandler):
         :param str httpMethod: HTTP request method
         :return dict: Lambda event object
         """
-        url = parse.urlparse(self.path)
-        path, *_ = url.path.split("?")
-        route_key = self.headers.get("x-route-key") or f"{httpMethod} {path}"
-        return {
-            "version": "2.0",
-            "body": self.get_body(),
-            "routeKey": route_key,
-            "rawPath": path,
-            "rawQueryString": url.query,
-            "headers": dict(self.headers),
-            "queryStringParameters": dict(parse.parse_qsl(url.query)),
-            "requestContext": {
-                "http": {
-                    "method": httpMethod,
-                    "path": path,
-                },
-            },
-        }
+        body, isBase64Encoded = self.get_body()
+        return events.get_event_v2(
+            httpMethod,
+            self.path,
+            self.headers,
+            body,
+            isBase64Encoded,
+        )
 
     def invoke(self, httpMethod):
         """
@@ -101,23 +160,185 @@ class LambdaRequestHandler(SimpleHTTPRequestHandler):
         :param Context context: Mock Lambda context
         :returns dict: Lamnda invocation result
         """
-        # Get Lambda event
-        event = self.get_event(httpMethod)
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        request_id = status = None
+        route_key = metrics.DEFAULT_ROUTE
+        self.started = time.perf_counter()
+        try:
+            # Get Lambda event & result
+            start = self.started
+            is_metrics = self.is_metrics_request(httpMethod)
+            try:
+                if is_metrics:
+                    # Scrapes build no event; their body is only drained
+                    request_body.read_body(self.rfile, self.headers, self.max_body_size)
+                else:
+                    event = self.profile("event_build", self.get_event, httpMethod)
+            except request_body.RequestBodyError as err:
+                self.close_connection = True
+                res = EventProxy.jsonify(httpMethod, err.status, message=str(err))
+            else:
+                if is_metrics:
+                    res = metrics.get_response(httpMethod)
+                    status = self.send_result(httpMethod, res)
+                    return
+                metrics.PHASE_SECONDS.observe(
+                    time.perf_counter() - start, "event_build"
+                )
+                request_id = lambda_context.get_request_id()
+                route = self.proxy.route(event)
+                if route is not None:
+                    route_key = route.key
+                res, invoked = self.proxy.respond(
+                    event, request_id=request_id, route=route
+                )
+                if not invoked:
+                    # Cached & unrouted responses are not Lambda invocations
+                    request_id = None
+
+            # Send response
+            start = time.perf_counter()
+            status = self.profile(
+                "response_write",
+                self.send_result,
+                httpMethod,
+                res,
+                request_id,
+            )
+            metrics.PHASE_SECONDS.observe(time.perf_counter() - start, "response_write")
+            metrics.REQUESTS.inc(httpMethod, route_key, status)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            started, self.started = self.started, None
+            if status is not None:
+                self.access_log.log(
+                    self.address_string(),
+                    self.requestline,
+                    status,
+                    time.perf_counter() - started,
+                    request_id,
+                )
+
+    def profile(self, phase, func, *args):
+        """
+        Call a function, profiled as a gateway phase when profiling is on.
+
+        :param str phase: Phase, e.g. "event_build"
+        :param function func: Function
+        :param tuple args: Function arguments
+        :returns object: Function result
+        """
+        if self.profiler is None:
+            return func(*args)
+        return self.profiler.call(phase, func, *args)
+
+    def is_metrics_request(self, httpMethod):
+        """
+        Check whether the request is for the metrics endpoint.
+
+        :param str httpMethod: HTTP request method
+        :returns bool: True for GET/HEAD requests of the metrics path
+        """
+        if self.metrics_path is None or httpMethod not in ("GET", "HEAD"):
+            return False
+        path, *_ = self.path.split("?")
+        return path == self.metrics_path
+
+    def handle_expect_100(self):
+        """
+        Reject oversized bodies before the client sends them.
+        """
+        try:
+            request_body.get_content_length(self.headers, self.max_body_size)
+        except request_body.RequestBodyError as err:
+            self.close_connection = True
+            res = EventProxy.jsonify(self.command, err.status, message=str(err))
+            self.send_result(self.command, res)
+            return False
+        return super().handle_expect_100()
 
-        # Get Lambda result
-        res = self.proxy.invoke(event)
+    def send_result(self, httpMethod, res, request_id=None):
+        """
+        Send Lambda result as HTTP response.
 
-        # Parse response
-        status = res.get("statusCode") or 500
-        headers = res.get("headers") or {}
-        body = res.get("body") or ""
+        Streamed bodies are sent with chunked transfer encoding, or delimited
+        by closing the connection for HTTP/1.0 clients.
 
-        # Send response
+        :param str httpMethod: HTTP request method
+        :param dict res: Lambda invocation result
+        :param str request_id: Lambda request ID, sent as x-amzn-RequestId
+        :returns int: Response status code
+        """
+        status, headers, body = responses.get_response(
+            httpMethod,
+            res,
+            self.headers.get("Accept-Encoding"),
+            self.min_compression_size,
+        )
+        if request_id is not None:
+            headers.append((responses.REQUEST_ID_HEADER, request_id))
+        stream = responses.is_stream(body)
+        chunked = stream and self.request_version == "HTTP/1.1"
+        if stream and not chunked:
+            self.close_connection = True
         self.send_response(status)
-        for key, val in headers.items():
+        for key, val in headers:
             self.send_header(key, val)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.send_connection_header()
         self.end_headers()
-        self.wfile.write(body.encode())
+        if stream:
+            self.send_stream(body, chunked)
+        elif body:
+            self.wfile.write(body)
+        return status
+
+    def send_stream(self, stream, chunked=True):
+        """
+        Write streamed body to the client as chunks are produced.
+
+        If the stream fails part way the connection is closed without the
+        terminating chunk, so the client sees an incomplete response.
+
+        :param Iterator|AsyncIterator stream: Response body stream
+        :param bool chunked: Frame chunks for Transfer-Encoding: chunked
+        """
+        try:
+            for chunk in self.proxy.iter_stream(stream):
+                self.wfile.write(responses.frame_chunk(chunk) if chunked else chunk)
+        except Exception as err:
+            logger.error("Response stream failed: %s", err)
+            self.close_connection = True
+            return
+        if chunked:
+            self.wfile.write(responses.LAST_CHUNK)
+
+    def log_request(self, code="-", size="-"):
+        # Invocations are logged once their response has been sent
+        if self.started is None:
+            self.access_log.log(self.address_string(), self.requestline, code)
+
+    def log_message(self, format, *args):
+        logger.error("%s - " + format, self.address_string(), *args)
+
+    def log_error(self, format, *args):
+        # Idle keep-alive connections timing out between requests is expected
+        if self.requests_handled and format.startswith("Request timed out"):
+            return
+        super().log_error(format, *args)
+
+    def send_connection_header(self):
+        """
+        Decide whether to keep the connection open after this response.
+        """
+        self.requests_handled += 1
+        if self.close_connection or (
+            self.max_requests and self.requests_handled >= self.max_requests
+        ):
+            self.send_header("Connection", "close")
+        elif not self.close_connection and self.request_version == "HTTP/1.0":
+            self.send_header("Connection", "keep-alive")
 
     @classmethod
     def set_proxy(cls, proxy, version):
@@ -126,3 +347,61 @@ class LambdaRequestHandler(SimpleHTTPRequestHandler):
         """
         cls.proxy = proxy
         cls.version = version
+
+    @classmethod
+    def set_keep_alive(cls, timeout, max_requests=None):
+        """
+        Configure HTTP/1.1 persistent connections.
+
+        :param float timeout: Idle timeout in seconds (0 to disable keep-alive)
+        :param int max_requests: Requests served per connection before closing
+        """
+        cls.timeout = timeout or None
+        cls.max_requests = 1 if not timeout else max_requests
+
+    @classmethod
+    def set_max_body_size(cls, max_body_size):
+        """
+        Configure request body size limit.
+
+        :param int max_body_size: Maximum body size in bytes (0 for no limit)
+        """
+        cls.max_body_size = max_body_size
+
+    @classmethod
+    def set_compression(cls, min_compression_size):
+        """
+        Configure response compression.
+
+        :param int min_compression_size: Compress bodies of at least N bytes
+            (None to disable compression)
+        """
+        cls.min_compression_size = min_compression_size
+
+    @classmethod
+    def set_metrics(cls, metrics_path):
+        """
+        Configure the metrics endpoint.
+
+        :param str metrics_path: Path serving Prometheus metrics (None to
+            disable the endpoint)
+        """
+        cls.metrics_path = metrics_path
+
+    @classmethod
+    def set_profiler(cls, profiler):
+        """
+        Configure profiling of the gateway phases.
+
+        :param Profiler profiler: Profiler (None to disable profiling)
+        """
+        cls.profiler = profiler
+
+    @classmethod
+    def set_access_log(cls, access_log):
+        """
+        Configure the access log.
+
+        :param AccessLog access_log: Access log
+        """
+        cls.access_log = access_log
@@ -0,0 +1,198 @@
+import binascii
+
+from lambda_gateway import compression, logger
+from lambda_gateway.event_proxy import EventProxy
+
+HOP_BY_HOP = {"connection", "content-length", "keep-alive", "transfer-encoding"}
+LAST_CHUNK = b"0\r\n\r\n"
+REQUEST_ID_HEADER = "x-amzn-RequestId"
+
+
+def has_body(httpMethod, status):
+    """
+    Check whether a response may carry a message body.
+
+    :param str httpMethod: HTTP request method
+    :param int status: Response status code
+    :returns bool: True unless HEAD, 1xx, 204 or 304
+    """
+    if httpMethod == "HEAD" or status in (204, 304):
+        return False
+    return not 100 <= status < 200
+
+
+def is_stream(body):
+    """
+    Check whether a response body is streamed.
+
+    :param object body: Response body
+    :returns bool: True for iterators & async iterators (e.g. generators)
+    """
+    return hasattr(body, "__next__") or hasattr(body, "__anext__")
+
+
+def encode_chunks(chunks):
+    """
+    Encode str chunks of a streamed body, dropping empty chunks.
+
+    :param Iterator chunks: str or bytes-like chunks
+    :returns Iterator: bytes-like chunks
+    """
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if chunk:
+            yield chunk
+
+
+async def aencode_chunks(chunks):
+    """
+    Encode str chunks of an async streamed body, dropping empty chunks.
+
+    :param AsyncIterator chunks: str or bytes-like chunks
+    :returns AsyncIterator: bytes-like chunks
+    """
+    async for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if chunk:
+            yield chunk
+
+
+def encode_stream(stream, encoding=None):
+    """
+    Encode (and optionally compress) a streamed body chunk by chunk.
+
+    Sync iterators stay sync and async iterators stay async, so each is
+    consumed where it can run without blocking.
+
+    :param Iterator|AsyncIterator stream: Response body stream
+    :param str encoding: Content coding [default: no compression]
+    :returns Iterator|AsyncIterator: bytes-like chunks
+    """
+    if hasattr(stream, "__anext__"):
+        chunks = aencode_chunks(stream)
+        if encoding is not None:
+            chunks = compression.acompress(chunks, encoding, sync=True)
+    else:
+        chunks = encode_chunks(stream)
+        if encoding is not None:
+            chunks = compression.compress(chunks, encoding, sync=True)
+    return chunks
+
+
+def frame_chunk(chunk):
+    """
+    Frame chunk for Transfer-Encoding: chunked.
+
+    :param bytes chunk: Non-empty body chunk
+    :returns bytes: Framed chunk
+    """
+    return b"%x\r\n%s\r\n" % (len(chunk), chunk)
+
+
+def get_response(
+    httpMethod,
+    result,
+    accept_encoding=None,
+    min_compression_size=None,
+):
+    """
+    Convert Lambda result into HTTP response parts.
+
+    The gateway always frames the body itself, so hop-by-hop headers set by
+    the Lambda handler are dropped and Content-Length is computed here.
+    Bodies flagged with isBase64Encoded are decoded straight to bytes.
+
+    A handler may also stream its response by returning an iterator (or
+    async iterator) of chunks, either as the result itself or as its body.
+    Streamed bodies are returned as an iterator of encoded chunks without a
+    Content-Length, for the server to send with chunked transfer encoding.
+
+    :param str httpMethod: HTTP request method
+    :param dict result: Lambda invocation result
+    :param str accept_encoding: Request Accept-Encoding header value
+    :param int min_compression_size: Compress bodies of at least N bytes
+    :returns tuple: Status code, list of header tuples, body bytes or stream
+    """
+    if is_stream(result):
+        result = {"statusCode": 200, "body": result}
+    status = result.get("statusCode") or 500
+    body = result.get("body") or b""
+    if is_stream(body):
+        return get_stream_response(
+            httpMethod,
+            status,
+            result.get("headers"),
+            body,
+            accept_encoding,
+            min_compression_size,
+        )
+    if result.get("isBase64Encoded"):
+        try:
+            body = binascii.a2b_base64(body)
+        except (binascii.Error, ValueError) as err:
+            logger.error("Invalid base64 response body: %s", err)
+            res = EventProxy.jsonify(httpMethod, 502, message="Internal server error")
+            return get_response(httpMethod, res)
+    headers = get_headers(result.get("headers"))
+    if min_compression_size is not None and body:
+        body, headers = compression.compress_body(
+            body,
+            headers,
+            accept_encoding,
+            min_compression_size,
+        )
+    if isinstance(body, str):
+        body = body.encode()
+    # 1xx & 204 responses must not carry a Content-Length (RFC 7230, 3.3.2)
+    if status != 204 and not 100 <= status < 200:
+        headers.insert(0, ("Content-Length", len(body)))
+    if not has_body(httpMethod, status):
+        body = b""
+    return status, headers, body
+
+
+def get_stream_response(
+    httpMethod,
+    status,
+    headers,
+    stream,
+    accept_encoding=None,
+    min_compression_size=None,
+):
+    """
+    Convert streamed Lambda result into HTTP response parts.
+
+    :param str httpMethod: HTTP request method
+    :param int status: Response status code
+    :param dict headers: Lambda result headers
+    :param Iterator|AsyncIterator stream: Response body stream
+    :param str accept_encoding: Request Accept-Encoding header value
+    :param int min_compression_size: Compress streams unless None
+    :returns tuple: Status code, list of header tuples, body stream
+    """
+    headers = get_headers(headers)
+    encoding = None
+    if min_compression_size is not None:
+        encoding, headers = compression.get_content_encoding(
+            headers,
+            accept_encoding,
+        )
+    if not has_body(httpMethod, status):
+        return status, headers, b""
+    return status, headers, encode_stream(stream, encoding)
+
+
+def get_headers(headers):
+    """
+    Get Lambda result headers without hop-by-hop headers.
+
+    :param dict headers: Lambda result headers
+    :returns list: Response header tuples
+    """
+    return [
+        (key, val)
+        for key, val in (headers or {}).items()
+        if key.lower() not in HOP_BY_HOP
+    ]
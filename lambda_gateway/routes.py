@@ -0,0 +1,198 @@
+import collections
+import json
+from urllib import parse
+
+DEFAULT_ROUTE = "$default"
+METHODS = {"ANY", "DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT"}
+
+Route = collections.namedtuple(
+    "Route", ["key", "method", "path", "signature", "params"]
+)
+Route.__doc__ = """
+Route of requests to a Lambda handler.
+
+:param str key: Route key, e.g. "GET /items/{id}" or "$default"
+:param str method: HTTP method or "ANY" (None for $default)
+:param str path: Path template (None for $default)
+:param str signature: Lambda handler signature
+:param tuple params: Names of the path parameters, in order
+"""
+
+
+def load_routes(path):
+    """
+    Load a routes file.
+
+    :param str path: JSON file of route keys & handler signatures, e.g.
+        {"GET /items/{id}": "items.get_item", "ANY /{proxy+}": "app.handler"}
+    :returns RouteTable: Compiled routes
+    """
+    with open(path) as routes:
+        try:
+            config = json.load(routes)
+        except json.JSONDecodeError as err:
+            raise ValueError(f"Invalid routes file {path}: {err}")
+    if not isinstance(config, dict) or not config:
+        raise ValueError(f"Routes file {path} must map route keys to handlers")
+    return RouteTable(config)
+
+
+class Node:
+    """
+    Node of the route trie, for one path segment.
+    """
+
+    __slots__ = ("children", "param", "greedy", "routes")
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.greedy = {}
+        self.routes = {}
+
+
+class RouteTable:
+    """
+    Routes of requests to Lambda handlers, like an API Gateway HTTP API.
+
+    Route keys are "METHOD /path" (METHOD may be ANY) or "$default". Path
+    segments may be parameters ("{id}") and the last one a greedy parameter
+    ("{proxy+}") matching the rest of the path. Routes are compiled into a
+    trie of path segments, so matching a request walks its path once
+    whatever the number of routes. As in API Gateway the most specific route
+    wins: literal segments before parameters before greedy parameters, and
+    exact methods before ANY. Requests that match no route go to the
+    $default route, if any.
+
+    :param dict routes: Handler signatures by route key
+    """
+
+    def __init__(self, routes):
+        self.root = Node()
+        self.default = None
+        self.routes = []
+        for key, signature in routes.items():
+            self.add(key, signature)
+
+    def __len__(self):
+        return len(self.routes)
+
+    def add(self, key, signature):
+        """
+        Add a route.
+
+        :param str key: Route key
+        :param str signature: Lambda handler signature
+        :raises ValueError: if the route key or signature is invalid
+        """
+        if not isinstance(signature, str) or "." not in signature:
+            raise ValueError(f"Bad handler signature for route '{key}': {signature}")
+        if key == DEFAULT_ROUTE:
+            self.default = Route(key, None, None, signature, ())
+            self.routes.append(self.default)
+            return
+        method, _, path = key.partition(" ")
+        if method not in METHODS or not path.startswith("/"):
+            raise ValueError(f"Bad route key '{key}'")
+        node = self.root
+        params = []
+        segments = split_path(path)
+        for i, segment in enumerate(segments):
+            if segment.startswith("{") and segment.endswith("+}"):
+                if i < len(segments) - 1:
+                    raise ValueError(f"Greedy parameter is not last in '{key}'")
+                params.append(segment[1:-2])
+                routes = node.greedy
+                break
+            if segment.startswith("{") and segment.endswith("}"):
+                params.append(segment[1:-1])
+                if node.param is None:
+                    node.param = Node()
+                node = node.param
+            elif "{" in segment or "}" in segment:
+                raise ValueError(f"Bad path segment '{segment}' in '{key}'")
+            else:
+                node = node.children.setdefault(segment, Node())
+        else:
+            routes = node.routes
+        if method in routes:
+            raise ValueError(f"Duplicate route '{key}'")
+        routes[method] = Route(key, method, path, signature, tuple(params))
+        self.routes.append(routes[method])
+
+    def match(self, httpMethod, path):
+        """
+        Match a request to a route.
+
+        :param str httpMethod: HTTP request method
+        :param str path: Request path
+        :returns tuple: Route & path parameters (None if no route matches)
+        """
+        values = []
+        route = find(self.root, split_path(path), 0, httpMethod, values)
+        if route is None:
+            if self.default is None:
+                return None
+            return self.default, {}
+        return route, dict(zip(route.params, values))
+
+    def get_signatures(self):
+        """
+        Get the handler signatures of the routes.
+
+        :returns list: Distinct handler signatures
+        """
+        return list(dict.fromkeys(route.signature for route in self.routes))
+
+
+def split_path(path):
+    """
+    Split a path into segments, ignoring leading & trailing slashes.
+
+    :param str path: Path
+    :returns list: Path segments
+    """
+    path = path.strip("/")
+    return path.split("/") if path else []
+
+
+def get_route(routes, httpMethod):
+    """
+    Get the route of a method, falling back on ANY.
+
+    :param dict routes: Routes by method
+    :param str httpMethod: HTTP request method
+    :returns Route: Route (None if there is none)
+    """
+    return routes.get(httpMethod) or routes.get("ANY")
+
+
+def find(node, segments, i, httpMethod, values):
+    """
+    Find the most specific route of the path segments from i onwards.
+
+    :param Node node: Trie node of segment i
+    :param list segments: Path segments
+    :param int i: Index of the next segment
+    :param str httpMethod: HTTP request method
+    :param list values: Path parameter values matched so far (updated)
+    :returns Route: Route (None if no route matches)
+    """
+    if i == len(segments):
+        return get_route(node.routes, httpMethod)
+    segment = segments[i]
+    child = node.children.get(segment)
+    if child is not None:
+        route = find(child, segments, i + 1, httpMethod, values)
+        if route is not None:
+            return route
+    if node.param is not None and segment:
+        values.append(parse.unquote(segment))
+        route = find(node.param, segments, i + 1, httpMethod, values)
+        if route is not None:
+            return route
+        values.pop()
+    route = get_route(node.greedy, httpMethod)
+    if route is not None:
+        values.append(parse.unquote("/".join(segments[i:])))
+    return route
@@ -0,0 +1,93 @@
+import asyncio
+import inspect
+import multiprocessing.connection
+import sys
+import time
+
+from lambda_gateway import responses
+from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.report import get_peak_rss, reset_peak_rss
+
+
+def serve(conn, signature):
+    """
+    Execution environment main loop (runs in the environment subprocess).
+
+    Imports the handler once, then answers invocations sent over conn one at
+    a time until it receives None or the pipe is closed. Every reply carries
+    a status, a value, the duration and the peak memory of the environment.
+
+    :param Connection conn: Pipe to the gateway process
+    :param str signature: Lambda handler signature
+    """
+    start = time.perf_counter()
+    try:
+        handler = EventProxy(signature, "/").load_handler()
+    except Exception as err:
+        conn.send(("error", str(err), time.perf_counter() - start, get_peak_rss()))
+        return
+    conn.send(("ready", None, time.perf_counter() - start, get_peak_rss()))
+    loop = asyncio.new_event_loop()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        event, context = message
+        reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            result = handler(event, context)
+            if inspect.isawaitable(result):
+                result = loop.run_until_complete(result)
+            result = drain_stream(result, loop)
+        except Exception as err:
+            reply = ("error", f"{type(err).__name__}: {err}")
+        else:
+            reply = ("result", result)
+        duration = time.perf_counter() - start
+        try:
+            conn.send((*reply, duration, get_peak_rss()))
+        except Exception as err:
+            reply = ("error", f"Unable to return result: {err}")
+            conn.send((*reply, duration, get_peak_rss()))
+    loop.close()
+
+
+def drain_stream(result, loop):
+    """
+    Collect a streamed response body, which cannot be sent over the pipe.
+
+    :param dict result: Lambda invocation result
+    :param AbstractEventLoop loop: Environment event loop
+    :returns dict: Lambda invocation result with a bytes body
+    """
+    if responses.is_stream(result):
+        result = {"statusCode": 200, "body": result}
+    if not isinstance(result, dict) or not responses.is_stream(result.get("body")):
+        return result
+    chunks = responses.encode_stream(result["body"])
+    if hasattr(chunks, "__anext__"):
+
+        async def collect():
+            return [chunk async for chunk in chunks]
+
+        chunks = loop.run_until_complete(collect())
+    return {**result, "body": b"".join(chunks)}
+
+
+def main():
+    """
+    Execution environment entrypoint.
+
+    usage:
+      python -m lambda_gateway.runtime FD HANDLER
+    """
+    fd, signature = sys.argv[1:]
+    serve(multiprocessing.connection.Connection(int(fd)), signature)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
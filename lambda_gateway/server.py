@@ -0,0 +1,321 @@
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+from http import server
+
+from lambda_gateway import logger, metrics, stop_logging
+from lambda_gateway.event_proxy import EventProxy
+
+
+class QueueStats:
+    """
+    Counters for connections waiting in the accept queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds):
+        """
+        Record time a connection spent queued before a worker picked it up.
+
+        :param float seconds: Queue wait time in seconds
+        """
+        with self._lock:
+            self.accepted += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_rejected(self):
+        """
+        Record a connection rejected because the accept queue was full.
+        """
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        """
+        Get a consistent copy of the counters.
+
+        :returns dict: Queue counters
+        """
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "wait_total": self.wait_total,
+                "wait_max": self.wait_max,
+                "wait_avg": self.wait_total / self.accepted if self.accepted else 0,
+            }
+
+
+class PooledHTTPServer(server.HTTPServer):
+    """
+    HTTP server handling connections on a fixed-size pool of worker threads.
+
+    Accepted connections wait in a bounded queue. When the queue is full the
+    connection is answered immediately with 429 Too Many Requests instead of
+    spawning yet another thread. Idle persistent connections are closed as
+    soon as other connections are waiting for a worker (see is_busy()).
+
+    :param tuple server_address: host/port tuple
+    :param type RequestHandlerClass: Request handler class
+    :param int pool_size: Number of worker threads
+    :param int queue_depth: Maximum number of queued connections
+    """
+
+    def __init__(
+        self,
+        server_address,
+        RequestHandlerClass,
+        pool_size=8,
+        queue_depth=64,
+        bind_and_activate=True,
+    ):
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+        self.pool_size = pool_size
+        self.queue = queue.Queue(queue_depth)
+        self.stats = QueueStats()
+        self.workers = []
+
+    idle_poll_interval = 0.05
+
+    def is_busy(self):
+        """
+        Check whether connections are waiting for a worker.
+
+        :returns bool: True if the accept queue is not empty
+        """
+        return not self.queue.empty()
+
+    def start_workers(self):
+        """
+        Start worker threads (if not already running).
+
+        Workers are started lazily so that the server can be created before
+        forking worker processes.
+        """
+        while len(self.workers) < self.pool_size:
+            worker = threading.Thread(
+                target=self.process_queue,
+                name=f"lambda-gateway-worker-{len(self.workers)}",
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def serve_forever(self, poll_interval=0.5):
+        self.start_workers()
+        super().serve_forever(poll_interval)
+
+    def process_request(self, request, client_address):
+        """
+        Queue connection for a worker, or reject it if the queue is full.
+        """
+        try:
+            self.queue.put_nowait((request, client_address, time.perf_counter()))
+        except queue.Full:
+            self.stats.record_rejected()
+            self.reject_request(request)
+            self.shutdown_request(request)
+
+    def process_queue(self):
+        """
+        Worker loop: handle queued connections until a sentinel is received.
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            request, client_address, queued_at = item
+            wait = time.perf_counter() - queued_at
+            self.stats.record_wait(wait)
+            metrics.PHASE_SECONDS.observe(wait, "queue_wait")
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        # Clients dropping their connection are not server errors
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def reject_request(self, request):
+        """
+        Send a minimal 429 response without involving the request handler.
+
+        :param socket request: Client connection
+        """
+        res = EventProxy.jsonify("GET", 429, message="Too Many Requests")
+        body = res["body"].encode()
+        head = [
+            "HTTP/1.1 429 Too Many Requests",
+            *[f"{key}: {val}" for key, val in res["headers"].items()],
+            "Retry-After: 1",
+            "Connection: close",
+            "",
+            "",
+        ]
+        try:
+            request.sendall("\r\n".join(head).encode() + body)
+        except OSError:  # pragma: no cover
+            pass
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers.clear()
+        stats = self.stats.snapshot()
+        logger.info(
+            "Accept queue: %d accepted, %d rejected, wait avg %.1f ms, max %.1f ms",
+            stats["accepted"],
+            stats["rejected"],
+            stats["wait_avg"] * 1000,
+            stats["wait_max"] * 1000,
+        )
+
+
+class Supervisor:
+    """
+    Run an HTTP server in N forked worker processes.
+
+    Workers share the listening socket bound by the parent process, so the
+    kernel spreads connections across them. The supervisor restarts workers
+    that die and forwards SIGINT/SIGTERM to all workers on shutdown.
+
+    :param object httpd: HTTPServer instance (already bound)
+    :param function target: Function that serves httpd in a worker
+    :param int workers: Number of worker processes
+    """
+
+    restart_delay = 1
+    signals = {signal.SIGINT, signal.SIGTERM}
+
+    def __init__(self, httpd, target, workers):
+        self.httpd = httpd
+        self.target = target
+        self.workers = workers
+        self.pids = {}
+        self.stopping = False
+
+    def run(self):
+        """
+        Start workers and supervise them until they have all exited.
+        """
+        # Losing workers must not block in accept() when another wins
+        self.httpd.socket.setblocking(False)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self.pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:  # pragma: no cover
+                break
+            started = self.pids.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            if os.WIFSIGNALED(status):
+                reason = f"signal {os.WTERMSIG(status)}"
+            else:
+                reason = f"status {os.WEXITSTATUS(status)}"
+            logger.error("Worker %d exited with %s, restarting", pid, reason)
+            if time.monotonic() - started < self.restart_delay:
+                time.sleep(self.restart_delay)
+            self.spawn()
+
+    def spawn(self):
+        """
+        Fork a worker process.
+
+        The worker blocks SIGINT/SIGTERM until it has its own handlers, and
+        ignores them while it cleans up, so a signal can never unwind it back
+        into the parent's code.
+
+        :returns int: Worker process ID (in the parent)
+        """
+        pid = None
+        signal.pthread_sigmask(signal.SIG_BLOCK, self.signals)
+        try:
+            pid = os.fork()
+        finally:
+            if pid != 0:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, self.signals)
+        if pid == 0:  # pragma: no cover
+            code = 1
+            try:
+                code = self.work()
+            except BaseException:
+                pass
+            finally:
+                try:
+                    self.ignore_signals()
+                    stop_logging()
+                finally:
+                    os._exit(code)
+        self.pids[pid] = time.monotonic()
+        return pid
+
+    def work(self):
+        """
+        Worker process body.
+
+        :returns int: Exit code
+        """
+        signal.signal(signal.SIGINT, self.interrupt)
+        signal.signal(signal.SIGTERM, self.interrupt)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, self.signals)
+        try:
+            self.target()
+            return 0
+        except KeyboardInterrupt:
+            return 0
+        except Exception:
+            traceback.print_exc()
+            return 1
+        finally:
+            self.ignore_signals()
+            self.httpd.server_close()
+
+    def stop(self, signum, frame=None):
+        """
+        Signal handler: forward signal to workers and stop restarting them.
+        """
+        self.stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:  # pragma: no cover
+                pass
+
+    @staticmethod
+    def interrupt(signum, frame=None):
+        """
+        Worker signal handler: interrupt serve_forever() exactly once.
+        """
+        Supervisor.ignore_signals()
+        raise KeyboardInterrupt
+
+    @staticmethod
+    def ignore_signals():
+        """
+        Ignore SIGINT/SIGTERM, e.g. while a worker shuts down.
+        """
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
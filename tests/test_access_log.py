@@ -0,0 +1,119 @@
+import json
+import logging
+from http import HTTPStatus
+from unittest import mock
+
+import pytest
+
+from lambda_gateway import access_log
+from lambda_gateway.access_log import AccessFormatter, AccessLog
+
+
+def get_record(**kwargs):
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "", None, None)
+    record.created = 1790000000.5
+    record.__dict__.update(
+        log_format="text",
+        client="127.0.0.1",
+        requestline="GET /fizz?buzz=1 HTTP/1.1",
+        status=200,
+        latency=0.0012345,
+        request_id="0e23b55a-cab5-11f1-84c9-02fc00000001",
+    )
+    record.__dict__.update(kwargs)
+    return record
+
+
+class TestAccessLog:
+    def test_init_error(self):
+        with pytest.raises(ValueError):
+            AccessLog("xml")
+
+    @pytest.mark.parametrize(
+        ("rate", "status", "random", "exp"),
+        [
+            (1.0, 200, 0.99, True),
+            (0.5, 200, 0.25, True),
+            (0.5, 200, 0.75, False),
+            (0.0, 200, 0.0, False),
+            (0.0, 502, 0.5, True),
+            (0.0, HTTPStatus.SERVICE_UNAVAILABLE, 0.5, True),
+            (0.0, "-", 0.5, False),
+        ],
+    )
+    def test_sample(self, rate, status, random, exp):
+        subject = AccessLog(rate=rate)
+        with mock.patch("random.random", return_value=random):
+            assert subject.sample(status) is exp
+
+    def test_log(self):
+        subject = AccessLog("json")
+        with mock.patch.object(access_log.logger, "info") as mock_info:
+            subject.log("127.0.0.1", "GET / HTTP/1.1", 200, 0.5, "fizz")
+        mock_info.assert_called_once_with(
+            "GET / HTTP/1.1",
+            extra={
+                "log_format": "json",
+                "client": "127.0.0.1",
+                "requestline": "GET / HTTP/1.1",
+                "status": 200,
+                "latency": 0.5,
+                "request_id": "fizz",
+            },
+        )
+
+    def test_log_sampled_out(self):
+        subject = AccessLog(rate=0)
+        with mock.patch.object(access_log.logger, "info") as mock_info:
+            subject.log("127.0.0.1", "GET / HTTP/1.1", 200)
+        mock_info.assert_not_called()
+
+
+class TestAccessFormatter:
+    def setup_method(self):
+        self.subject = AccessFormatter()
+
+    def test_format_text(self):
+        ret = self.subject.format(get_record())
+        assert ret.startswith("127.0.0.1 - - [")
+        assert ret.endswith('] "GET /fizz?buzz=1 HTTP/1.1" 200 -')
+
+    def test_format_text_no_client(self):
+        ret = self.subject.format(get_record(client=None, status="-"))
+        assert ret.startswith("- - - [")
+        assert ret.endswith(" -")
+
+    def test_format_json(self):
+        ret = json.loads(self.subject.format(get_record(log_format="json")))
+        assert ret == {
+            "requestTime": "21/Sep/2026:14:13:20 +0000",
+            "requestId": "0e23b55a-cab5-11f1-84c9-02fc00000001",
+            "ip": "127.0.0.1",
+            "httpMethod": "GET",
+            "path": "/fizz?buzz=1",
+            "protocol": "HTTP/1.1",
+            "status": 200,
+            "responseLatency": 1.234,
+        }
+
+    def test_format_json_partial(self):
+        record = get_record(
+            log_format="json",
+            requestline="BAD",
+            status="-",
+            latency=None,
+            request_id=None,
+        )
+        ret = json.loads(self.subject.format(record))
+        assert ret["httpMethod"] == "BAD"
+        assert ret["path"] is None
+        assert ret["protocol"] is None
+        assert ret["status"] is None
+        assert ret["responseLatency"] is None
+        assert ret["requestId"] is None
+
+
+def test_logger():
+    assert access_log.logger.propagate is False
+    assert access_log.queue.handler is access_log.handler
+    assert isinstance(access_log.handler.formatter, AccessFormatter)
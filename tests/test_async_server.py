@@ -0,0 +1,413 @@
+import socket
+import threading
+import time
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from lambda_gateway import metrics, request_body, responses
+from lambda_gateway.access_log import AccessLog
+from lambda_gateway.async_server import AsyncHTTPServer
+from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.profiler import Profiler
+from lambda_gateway.request_handler import LambdaRequestHandler
+from lambda_gateway.routes import Route
+
+ROUTE = Route("$default", None, None, "index.handler", ())
+RESULT = {
+    "statusCode": 201,
+    "body": '{"fizz": "buzz"}',
+    "headers": {"Content-Type": "application/json", "X-Custom": "1"},
+}
+
+REQUESTS = [
+    ("GET", "/", None, {}),
+    ("GET", "/simple/path?fizz=buzz&a=1&a=2", None, {"X-Route-Key": "ANY /"}),
+    ("HEAD", "/head?x=%20y", None, {}),
+    ("POST", "/items", '{"data": "POST_DATA"}', {"Content-Type": "text/json"}),
+    ("DELETE", "/items/1", None, {"Accept": "*/*"}),
+    ("PUT", "/image", b"\x89PNG\r\n\x1a\n", {"Content-Type": "image/png"}),
+    ("PATCH", "/bytes", b"\xff\xfe", {}),
+]
+
+
+def stream_result(*args, **kwargs):
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "text/plain"},
+        "body": iter(["fizz", b"", b"buzz"]),
+    }
+
+
+def stream_response(*args, **kwargs):
+    return stream_result(), True
+
+
+async def aiter_stream(stream):
+    for chunk in stream:
+        yield chunk
+
+
+def serve(httpd, *args):
+    thread = threading.Thread(target=httpd.serve_forever, args=args)
+    thread.start()
+    return thread
+
+
+def request(address, verb, path, body, headers):
+    conn = HTTPConnection(*address[:2], timeout=5)
+    conn.request(verb, path, body, {"Host": "localhost", **headers})
+    res = conn.getresponse()
+    ret = (
+        res.status,
+        sorted(
+            (k, "<id>" if k == responses.REQUEST_ID_HEADER else v)
+            for k, v in res.getheaders()
+            if k != "Date"
+        ),
+        res.read(),
+    )
+    conn.close()
+    return ret
+
+
+def raw(address, data):
+    with socket.create_connection(address[:2], timeout=5) as sock:
+        sock.sendall(data)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+
+class TestAsyncHTTPServer:
+    def setup_method(self):
+        self.proxy = Mock(EventProxy)
+        self.proxy.route.return_value = ROUTE
+        self.proxy.arespond = AsyncMock(return_value=(RESULT, True))
+        self.subject = AsyncHTTPServer(("127.0.0.1", 0), self.proxy, "2.0", 5, 3)
+        self.thread = serve(self.subject)
+
+    def teardown_method(self):
+        self.subject.shutdown()
+        self.thread.join()
+        self.subject.server_close()
+
+    @pytest.mark.parametrize("version", ["1.0", "2.0"])
+    @pytest.mark.parametrize(("verb", "path", "body", "headers"), REQUESTS)
+    def test_parity(self, version, verb, path, body, headers):
+        threaded_proxy = Mock(EventProxy)
+        threaded_proxy.route.return_value = ROUTE
+        threaded_proxy.respond.return_value = (RESULT, True)
+        LambdaRequestHandler.set_proxy(threaded_proxy, version)
+        self.subject.version = version
+        with ThreadingHTTPServer(("127.0.0.1", 0), LambdaRequestHandler) as httpd:
+            thread = serve(httpd, 0.01)
+            try:
+                exp = request(httpd.server_address, verb, path, body, headers)
+            finally:
+                httpd.shutdown()
+                thread.join()
+        ret = request(self.subject.server_address, verb, path, body, headers)
+        assert ret == exp
+        (exp_event,) = threaded_proxy.respond.call_args.args
+        (ret_event,) = self.proxy.arespond.call_args.args
+        assert ret_event == exp_event
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"POST / HTTP/1.1\r\nContent-Length: 11\r\n\r\n" + b"x" * 11,
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nz\r\n",
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: gzip\r\n\r\n",
+        ],
+    )
+    def test_parity_body_error(self, data):
+        def logged(log):
+            # The request is logged after its response is sent
+            for _ in range(100):
+                if log.log.called:
+                    break
+                time.sleep(0.01)
+            ((client, requestline, status, *_),) = [
+                call.args for call in log.log.call_args_list
+            ]
+            return client, requestline, status
+
+        threaded_log = Mock(AccessLog)
+        LambdaRequestHandler.set_proxy(Mock(EventProxy), "2.0")
+        LambdaRequestHandler.set_max_body_size(10)
+        LambdaRequestHandler.set_access_log(threaded_log)
+        self.subject.max_body_size = 10
+        self.subject.access_log = Mock(AccessLog)
+        with ThreadingHTTPServer(("127.0.0.1", 0), LambdaRequestHandler) as httpd:
+            thread = serve(httpd, 0.01)
+            try:
+                exp = raw(httpd.server_address, data)
+            finally:
+                LambdaRequestHandler.set_max_body_size(request_body.MAX_BODY_SIZE)
+                LambdaRequestHandler.set_access_log(AccessLog())
+                httpd.shutdown()
+                thread.join()
+        ret = raw(self.subject.server_address, data)
+        assert ret.split(b"\r\n", 1)[0] == exp.split(b"\r\n", 1)[0]
+        assert logged(self.subject.access_log) == logged(threaded_log)
+
+    @pytest.mark.parametrize("accept_encoding", ["gzip", "deflate", "identity"])
+    def test_parity_compression(self, accept_encoding):
+        threaded_proxy = Mock(EventProxy)
+        threaded_proxy.route.return_value = ROUTE
+        threaded_proxy.respond.return_value = (RESULT, True)
+        LambdaRequestHandler.set_proxy(threaded_proxy, "2.0")
+        LambdaRequestHandler.set_compression(0)
+        self.subject.min_compression_size = 0
+        headers = {"Accept-Encoding": accept_encoding}
+        with ThreadingHTTPServer(("127.0.0.1", 0), LambdaRequestHandler) as httpd:
+            thread = serve(httpd, 0.01)
+            try:
+                exp = request(httpd.server_address, "GET", "/", None, headers)
+            finally:
+                LambdaRequestHandler.set_compression(None)
+                httpd.shutdown()
+                thread.join()
+        ret = request(self.subject.server_address, "GET", "/", None, headers)
+        assert ret == exp
+        assert ("Vary", "Accept-Encoding") in ret[1]
+
+    @pytest.mark.parametrize("headers", [{}, {"Accept-Encoding": "gzip"}])
+    def test_parity_stream(self, headers):
+        threaded_proxy = Mock(EventProxy)
+        threaded_proxy.route.return_value = ROUTE
+        threaded_proxy.respond.side_effect = stream_response
+        threaded_proxy.iter_stream = iter
+        self.proxy.arespond.side_effect = stream_response
+        self.proxy.aiter_stream = aiter_stream
+        LambdaRequestHandler.set_proxy(threaded_proxy, "2.0")
+        LambdaRequestHandler.set_compression(0)
+        self.subject.min_compression_size = 0
+        with ThreadingHTTPServer(("127.0.0.1", 0), LambdaRequestHandler) as httpd:
+            thread = serve(httpd, 0.01)
+            try:
+                exp = request(httpd.server_address, "GET", "/", None, headers)
+            finally:
+                LambdaRequestHandler.set_compression(None)
+                httpd.shutdown()
+                thread.join()
+        ret = request(self.subject.server_address, "GET", "/", None, headers)
+        assert ret == exp
+        assert ("Transfer-Encoding", "chunked") in ret[1]
+
+    def test_stream_keep_alive(self):
+        self.proxy.arespond.side_effect = stream_response
+        self.proxy.aiter_stream = aiter_stream
+        ret = raw(
+            self.subject.server_address,
+            b"GET / HTTP/1.1\r\n\r\nGET / HTTP/1.1\r\nConnection: close\r\n\r\n",
+        )
+        assert ret.count(b"\r\n4\r\nfizz\r\n4\r\nbuzz\r\n0\r\n\r\n") == 2
+
+    def test_stream_http10(self):
+        self.proxy.arespond.side_effect = stream_response
+        self.proxy.aiter_stream = aiter_stream
+        ret = raw(self.subject.server_address, b"GET / HTTP/1.0\r\n\r\n")
+        assert b"Transfer-Encoding" not in ret
+        assert b"Connection: close\r\n" in ret
+        assert ret.endswith(b"\r\n\r\nfizzbuzz")
+
+    def test_stream_error(self):
+        async def stream(_):
+            yield b"fizz"
+            raise RuntimeError("boom")
+
+        self.proxy.arespond.return_value = {"statusCode": 200, "body": iter([])}, True
+        self.proxy.aiter_stream = stream
+        ret = raw(self.subject.server_address, b"GET / HTTP/1.1\r\n\r\n")
+        assert ret.endswith(b"\r\n\r\n4\r\nfizz\r\n")
+
+    def test_keep_alive(self):
+        conn = HTTPConnection(*self.subject.server_address, timeout=5)
+        socks = []
+        for _ in range(4):
+            conn.request("GET", "/")
+            socks.append(conn.sock)
+            assert conn.getresponse().read() == b'{"fizz": "buzz"}'
+        # max_requests=3 closes the connection after the third response
+        assert socks[0] is socks[1] is socks[2]
+        assert socks[3] is not socks[2]
+        conn.close()
+
+    @pytest.mark.parametrize(
+        ("data", "exp"),
+        [
+            (b"GET / HTTP/1.0\r\n\r\n", b"HTTP/1.1 201 Created\r\n"),
+            (
+                b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n",
+                b"HTTP/1.1 201 Created\r\n",
+            ),
+            (b"GARBAGE\r\n\r\n", b"HTTP/1.1 400 Bad Request\r\n"),
+            (b"GET / HTTP/2.0\r\n\r\n", b"HTTP/1.1 505 HTTP Version Not Supported"),
+            (b"BREW / HTTP/1.1\r\n\r\n", b"HTTP/1.1 501 Not Implemented\r\n"),
+            (
+                b"POST / HTTP/1.1\r\nContent-Length: x\r\n\r\n",
+                b"HTTP/1.1 400 Bad Request\r\n",
+            ),
+            (
+                b"POST / HTTP/1.1\r\nContent-Length: 10\r\nConnection: close\r\n\r\n",
+                b"",
+            ),
+            (
+                b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b"3\r\nabc\r\n0\r\n\r\n",
+                b"HTTP/1.1 201 Created\r\n",
+            ),
+            (
+                b"POST / HTTP/1.1\r\nExpect: 100-continue\r\nContent-Length: 2\r\n"
+                b"Connection: close\r\n\r\nOK",
+                b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 201 Created\r\n",
+            ),
+            (b"GET / HTTP/1.1\r\n", b""),
+        ],
+    )
+    def test_raw(self, data, exp):
+        self.subject.timeout = 0.1
+        ret = raw(self.subject.server_address, data)
+        assert ret.startswith(exp)
+        if data.startswith(b"GET / HTTP/1.0\r\nConnection: keep-alive"):
+            assert b"Connection: keep-alive\r\n" in ret
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"POST / HTTP/1.1\r\nContent-Length: 11\r\n\r\n",
+            b"POST / HTTP/1.1\r\nContent-Length: 11\r\nExpect: 100-continue\r\n\r\n",
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"b\r\n0123456789a\r\n0\r\n\r\n",
+        ],
+    )
+    def test_body_too_large(self, data):
+        self.subject.max_body_size = 10
+        key = ("POST", metrics.DEFAULT_ROUTE, 413)
+        count = metrics.REQUESTS.collect().get(key, 0)
+        ret = raw(self.subject.server_address, data)
+        assert ret.startswith(b"HTTP/1.1 413 Request Entity Too Large\r\n")
+        assert ret.endswith(b'{"message": "Request Entity Too Large"}')
+        self.proxy.arespond.assert_not_called()
+        assert metrics.REQUESTS.collect()[key] == count + 1
+
+    def test_access_log(self):
+        self.subject.access_log = Mock(AccessLog)
+        request(self.subject.server_address, "GET", "/fizz", None, {})
+        # The request is logged after its response is sent
+        for _ in range(100):
+            if self.subject.access_log.log.called:
+                break
+            time.sleep(0.01)
+        client, requestline, status, latency, request_id = (
+            self.subject.access_log.log.call_args.args
+        )
+        assert (client, requestline, status) == ("127.0.0.1", "GET /fizz HTTP/1.1", 201)
+        assert latency > 0
+        assert request_id == self.proxy.arespond.call_args.kwargs["request_id"]
+
+    def test_route(self):
+        route = Route("GET /items/{id}", "GET", "/items/{id}", "app.get_item", ("id",))
+        self.proxy.route.return_value = route
+        key = ("GET", route.key, 201)
+        count = metrics.REQUESTS.collect().get(key, 0)
+        request(self.subject.server_address, "GET", "/items/1", None, {})
+        (event,) = self.proxy.route.call_args.args
+        assert self.proxy.arespond.call_args.args == (event,)
+        assert self.proxy.arespond.call_args.kwargs["route"] is route
+        # The request is counted after its response is sent
+        for _ in range(100):
+            if metrics.REQUESTS.collect().get(key, 0) == count + 1:
+                break
+            time.sleep(0.01)
+        assert metrics.REQUESTS.collect()[key] == count + 1
+
+    def test_request_id(self):
+        conn = HTTPConnection(*self.subject.server_address[:2], timeout=5)
+        conn.request("GET", "/")
+        ret = conn.getresponse().getheader(responses.REQUEST_ID_HEADER)
+        conn.close()
+        assert ret == self.proxy.arespond.call_args.kwargs["request_id"]
+
+    def test_request_id_not_invoked(self):
+        self.proxy.arespond.return_value = {"statusCode": 404}, False
+        conn = HTTPConnection(*self.subject.server_address[:2], timeout=5)
+        conn.request("GET", "/")
+        res = conn.getresponse()
+        conn.close()
+        assert res.status == 404
+        assert res.getheader(responses.REQUEST_ID_HEADER) is None
+
+    def test_profile(self, tmp_path):
+        self.subject.profiler = Profiler(str(tmp_path))
+        self.subject.metrics_path = "/metrics"
+        status, _, _ = request(self.subject.server_address, "GET", "/", None, {})
+        assert status == RESULT["statusCode"]
+        # Scrapes build no event
+        status, _, _ = request(self.subject.server_address, "GET", "/metrics", "x", {})
+        assert status == 200
+        assert self.subject.profiler.samples["event_build"] == 1
+        assert self.subject.profiler.samples["response_write"] == 1
+
+    def test_metrics(self):
+        self.subject.metrics_path = "/metrics"
+        request(self.subject.server_address, "GET", "/", None, {})
+        status, headers, body = request(
+            self.subject.server_address, "GET", "/metrics", None, {}
+        )
+        assert status == 200
+        assert ("Content-Type", metrics.CONTENT_TYPE) in headers
+        body = body.decode()
+        assert 'lambda_gateway_requests_total{method="GET",route="$default",' in body
+        assert (
+            'lambda_gateway_phase_duration_seconds_count{phase="response_write"}'
+            in body
+        )
+        ret = request(self.subject.server_address, "HEAD", "/metrics", None, {})
+        assert ret[0] == 200
+        assert ret[2] == b""
+        request(self.subject.server_address, "POST", "/metrics", "x", {})
+        assert self.proxy.arespond.call_count == 2
+
+    def test_header_too_large(self):
+        data = b"GET / HTTP/1.1\r\nX-Big: " + b"x" * 70000 + b"\r\n\r\n"
+        ret = raw(self.subject.server_address, data)
+        assert ret.startswith(b"HTTP/1.1 431 Request Header Fields Too Large\r\n")
+
+    def test_idle_timeout(self):
+        self.subject.timeout = 0.01
+        assert raw(self.subject.server_address, b"") == b""
+
+    def test_unknown_status(self):
+        self.proxy.arespond.return_value = {"statusCode": 599}, True
+        ret = raw(self.subject.server_address, b"GET / HTTP/1.0\r\n\r\n")
+        assert ret.startswith(b"HTTP/1.1 599 \r\n")
+
+    def test_error(self, capsys):
+        self.proxy.arespond.side_effect = RuntimeError("boom")
+        assert raw(self.subject.server_address, b"GET / HTTP/1.1\r\n\r\n") == b""
+        assert "boom" in capsys.readouterr().err
+
+
+def test_no_keep_alive():
+    subject = AsyncHTTPServer(("127.0.0.1", 0), None, "2.0", 0, 100)
+    with subject:
+        assert subject.timeout is None
+        assert subject.max_requests == 1
+        subject.shutdown()
+    assert subject.socket.fileno() == -1
+
+
+def test_bind_error():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        with pytest.raises(OSError):
+            AsyncHTTPServer(sock.getsockname(), None, "2.0")
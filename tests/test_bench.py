@@ -0,0 +1,234 @@
+import json
+import socket
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from lambda_gateway import bench
+from lambda_gateway.async_server import AsyncHTTPServer
+from lambda_gateway.bench import (
+    HTTPClient,
+    ProxyClient,
+    Request,
+    Results,
+    Schedule,
+)
+from lambda_gateway.event_proxy import EventProxy
+
+
+def test_request_render():
+    assert Request("GET", "/items/{n}?page={n}").render(7) == "/items/7?page=7"
+
+
+class TestLoadRequests:
+    def test_load_requests(self, tmp_path):
+        path = tmp_path / "requests.jsonl"
+        path.write_text(
+            '{"method": "POST", "path": "/items", "body": {"a": 1}}\n'
+            "\n"
+            '{"url": "http://localhost/x", "headers": {"X-B": "2"}}\n'
+            '{"body": "raw"}\n'
+        )
+        default = Request("GET", "/", {"X-A": "1"}, None)
+        ret = bench.load_requests(str(path), default)
+        assert [(r.method, r.target, r.headers, r.body) for r in ret] == [
+            ("POST", "/items", {"X-A": "1"}, '{"a": 1}'),
+            ("GET", "http://localhost/x", {"X-A": "1", "X-B": "2"}, None),
+            ("GET", "/", {"X-A": "1"}, "raw"),
+        ]
+
+    def test_load_requests_empty(self, tmp_path):
+        path = tmp_path / "requests.jsonl"
+        path.write_text("\n")
+        with pytest.raises(ValueError):
+            bench.load_requests(str(path), Request())
+
+
+class TestSchedule:
+    def test_requests(self):
+        subject = Schedule(0, 3)
+        subject.begin()
+        assert [subject.next() for _ in range(5)] == [0, 1, 2, None, None]
+
+    def test_duration(self):
+        subject = Schedule(0.05)
+        subject.begin()
+        assert subject.next() == 0
+        time.sleep(0.06)
+        assert subject.next() is None
+
+    def test_rate(self):
+        subject = Schedule(0, 3, rate=20)
+        subject.begin()
+        while subject.next() is not None:
+            pass
+        assert time.perf_counter() - subject.start >= 0.1
+
+    def test_rate_past_duration(self):
+        subject = Schedule(0.01, rate=10)
+        subject.begin()
+        assert subject.next() == 0
+        assert subject.next() is None
+
+    def test_stop(self):
+        subject = Schedule(10)
+        subject.begin()
+        subject.stop()
+        assert subject.next() is None
+
+
+class TestHTTPClient:
+    def setup_method(self):
+        self.proxy = mock.Mock(EventProxy)
+        self.proxy.route.return_value = None
+        self.proxy.arespond = mock.AsyncMock(
+            return_value=({"statusCode": 201, "body": "OK"}, True)
+        )
+        self.server = AsyncHTTPServer(("127.0.0.1", 0), self.proxy, "2.0", 5, 2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        host, port = self.server.server_address
+        self.url = f"http://{host}:{port}"
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def test_send(self):
+        subject = HTTPClient(f"{self.url}/items/{{n}}?x=1")
+        request = Request("POST", subject.url.geturl(), {"X-A": "1"}, "body")
+        assert subject.send(request, 1) == 201
+        conn = subject.connect()
+        assert subject.send(request, 2) == 201
+        # max_requests=2 closes the connection, so the next request reconnects
+        assert subject.connect() is not conn
+        assert subject.send(Request("GET", "/other"), 3) == 201
+        events = [call.args[0] for call in self.proxy.arespond.call_args_list]
+        assert [e["rawPath"] for e in events] == ["/items/1", "/items/2", "/other"]
+        assert events[0]["body"] == "body"
+        assert events[0]["headers"]["X-A"] == "1"
+        subject.close()
+
+    def test_send_error(self):
+        subject = HTTPClient(self.url, 1)
+        conn = subject.connect()
+        with mock.patch.object(conn, "request", side_effect=ConnectionResetError):
+            with pytest.raises(ConnectionResetError):
+                subject.send(Request(), 0)
+        assert subject._local.conn is None
+        assert subject.send(Request(), 1) == 201
+
+    def test_https(self):
+        subject = HTTPClient("https://localhost:8443/")
+        assert subject.connect().port == 8443
+
+
+class TestProxyClient:
+    @pytest.mark.parametrize(
+        "handler",
+        ["handler", "async_handler", "stream_handler", "async_stream_handler"],
+    )
+    def test_send(self, handler):
+        subject = ProxyClient(f"tests.test_runtime.{handler}", "1.0")
+        try:
+            assert subject.send(Request("GET", "/{n}"), 1) in (200, 201)
+        finally:
+            subject.close()
+
+    def test_send_no_status(self):
+        subject = ProxyClient("tests.test_runtime.handler")
+        subject.proxy.invoke = lambda event: {}
+        assert subject.send(Request(), 1) == 500
+        subject.close()
+
+
+class TestResults:
+    def test_summary(self):
+        subject = Results()
+        for ms in range(1, 101):
+            subject.record(ms / 1000, 200 if ms % 10 else 502)
+        subject.record(0.5, error="TimeoutError")
+        subject.elapsed = 2
+        ret = subject.summary()
+        assert ret["requests"] == 101
+        assert ret["throughput"] == 50.5
+        assert ret["latency"]["p50"] == pytest.approx(51)
+        assert ret["latency"]["p90"] == pytest.approx(91)
+        assert ret["latency"]["p99"] == pytest.approx(100)
+        assert ret["latency"]["max"] == pytest.approx(500)
+        assert ret["ok"] == 90
+        assert ret["statuses"] == {"200": 90, "502": 10}
+        assert ret["errors"] == {"TimeoutError": 1}
+
+    def test_summary_empty(self):
+        ret = Results().summary()
+        assert ret["throughput"] == 0
+        assert ret["latency"] == {"mean": 0, "p50": 0, "p90": 0, "p99": 0, "max": 0}
+
+    def test_format_summary(self):
+        subject = Results()
+        subject.record(0.001, 200)
+        subject.record(0.003, error="ConnectionRefusedError")
+        subject.elapsed = 1
+        ret = bench.format_summary(subject.summary())
+        assert "Throughput:  2.0 req/s" in ret
+        assert "p50 1.00 ms" in ret
+        assert "Statuses:    200: 1" in ret
+        assert "Errors:      ConnectionRefusedError: 1" in ret
+        assert "Errors:      -" in bench.format_summary(Results().summary())
+
+
+def test_run():
+    client = mock.Mock()
+    client.send.side_effect = lambda request, n: 500 if n % 2 else 200
+    results = bench.run(client, [Request("GET", "/a"), Request()], Schedule(0, 10), 3)
+    assert results.statuses == {200: 5, 500: 5}
+    assert {call.args[0].target for call in client.send.call_args_list} == {"/a", "/"}
+
+
+def test_run_interrupt():
+    schedule = Schedule(0)
+    client = mock.Mock()
+    client.send.side_effect = lambda request, n: time.sleep(0.01) or 200
+    with mock.patch("threading.Thread.join", side_effect=[KeyboardInterrupt, None]):
+        results = bench.run(client, [Request()], schedule, 1)
+    assert schedule.stopped
+    assert results.elapsed > 0
+
+
+def test_get_opts_error(capsys):
+    with pytest.raises(SystemExit):
+        bench.get_opts(["-d", "0", "x.y"])
+    assert "one of --duration or --requests" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("as_json", [True, False])
+def test_main(capsys, tmp_path, as_json):
+    path = tmp_path / "requests.jsonl"
+    path.write_text('{"path": "/a/{n}"}\n{"method": "POST", "path": "/b"}\n')
+    argv = ["-n", "20", "-c", "2", "-H", "X-A: 1", "-f", str(path)]
+    bench.main(argv + (["--json"] if as_json else []) + ["tests.test_runtime.handler"])
+    out = capsys.readouterr().out
+    if as_json:
+        assert json.loads(out)["statuses"] == {"200": 20}
+    else:
+        assert "Requests:    20 in " in out
+
+
+def test_main_http():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with mock.patch("builtins.print") as mock_print:
+        bench.main(["-n", "3", "-c", "1", "--json", f"http://127.0.0.1:{port}/"])
+    (out,), _ = mock_print.call_args
+    assert json.loads(out)["errors"] == {"ConnectionRefusedError": 3}
+
+
+def test_main_error():
+    with pytest.raises(SystemExit) as err:
+        bench.main(["-n", "1", "tests.test_runtime.missing"])
+    assert "Handler 'missing' missing" in str(err.value)
@@ -0,0 +1,138 @@
+from unittest import mock
+
+import pytest
+
+from lambda_gateway import metrics
+from lambda_gateway.cache import (
+    ResponseCache,
+    copy_result,
+    get_headers,
+    is_cacheable,
+    is_invalidation,
+)
+
+EVENT = {
+    "version": "2.0",
+    "rawPath": "/items",
+    "headers": {"accept": "application/json", "x-tenant": "a"},
+    "queryStringParameters": {"page": "2", "sort": "asc"},
+}
+RESULT = {"statusCode": 200, "headers": {"ETag": "1"}, "body": "OK"}
+
+
+class TestResponseCache:
+    def setup_method(self):
+        self.subject = ResponseCache(60, 2)
+
+    def test_get_key(self):
+        assert self.subject.get_key("GET", "/items", EVENT) == (
+            "GET",
+            "/items",
+            (("page", "2"), ("sort", "asc")),
+            (),
+        )
+
+    def test_get_key_chosen(self):
+        subject = ResponseCache(60, params=["sort", "q"], headers=["X-Tenant"])
+        assert subject.get_key("GET", "/items", EVENT) == (
+            "GET",
+            "/items",
+            (("sort", "asc"), ("q", None)),
+            ("a",),
+        )
+        assert subject.get_key("GET", "/", {})[2:] == (
+            (("sort", None), ("q", None)),
+            (None,),
+        )
+
+    def test_get_put(self):
+        key = self.subject.get_key("GET", "/items", EVENT)
+        assert self.subject.get(key, EVENT) is None
+        self.subject.put(key, RESULT)
+        ret = self.subject.get(key, EVENT)
+        assert ret == RESULT
+        ret["headers"]["ETag"] = "2"
+        assert self.subject.get(key, EVENT) == RESULT
+        assert (self.subject.hits, self.subject.misses) == (2, 1)
+
+    def test_get_expired(self):
+        self.subject.ttl = 0
+        self.subject.put("key", RESULT)
+        assert len(self.subject) == 1
+        assert self.subject.get("key", EVENT) is None
+        assert len(self.subject) == 0
+
+    def test_get_invalidate(self):
+        event = {"headers": {"Cache-Control": "no-transform, MAX-AGE=0"}}
+        self.subject.put("key", RESULT)
+        invalidated = metrics.CACHE_REQUESTS.collect().get(("invalidate",), 0)
+        assert self.subject.get("key", event) is None
+        assert len(self.subject) == 0
+        assert metrics.CACHE_REQUESTS.collect()[("invalidate",)] == invalidated + 1
+
+    def test_put_lru(self):
+        self.subject.put("a", RESULT)
+        self.subject.put("b", RESULT)
+        self.subject.get("a", EVENT)
+        self.subject.put("c", RESULT)
+        assert list(self.subject.entries) == ["a", "c"]
+        self.subject.put("a", RESULT)
+        assert list(self.subject.entries) == ["c", "a"]
+
+    def test_put_not_cacheable(self):
+        self.subject.put("key", {"statusCode": 500})
+        assert len(self.subject) == 0
+
+    def test_close(self):
+        self.subject.put("key", RESULT)
+        self.subject.get("key", EVENT)
+        self.subject.get("other", EVENT)
+        with mock.patch("lambda_gateway.logger.info") as mock_info:
+            self.subject.close()
+        mock_info.assert_called_once_with(
+            "Response cache: %d hits, %d misses (%.1f%% hit ratio)", 1, 1, 50.0
+        )
+        assert len(self.subject) == 0
+
+    def test_close_unused(self):
+        with mock.patch("lambda_gateway.logger.info") as mock_info:
+            self.subject.close()
+        assert mock_info.call_args.args[1:] == (0, 0, 0)
+
+
+def test_get_headers():
+    assert get_headers({"headers": {"X-A": "1"}}) == {"x-a": "1"}
+    assert get_headers({"headers": None}) == {}
+
+
+@pytest.mark.parametrize(
+    ("cache_control", "exp"),
+    [
+        (None, False),
+        ("max-age=60", False),
+        ("max-age=0", True),
+        ("no-cache, max-age=0", True),
+    ],
+)
+def test_is_invalidation(cache_control, exp):
+    headers = {} if cache_control is None else {"Cache-Control": cache_control}
+    assert is_invalidation({"headers": headers}) is exp
+
+
+def test_is_cacheable():
+    def stream():
+        yield b"a"  # pragma: no cover
+
+    assert is_cacheable({"statusCode": 204})
+    assert not is_cacheable({"statusCode": 301})
+    assert not is_cacheable({"body": "no status"})
+    assert not is_cacheable({"statusCode": 200, "body": stream()})
+    assert not is_cacheable(stream())
+
+
+def test_copy_result():
+    result = {"headers": {"a": "1"}, "multiValueHeaders": {"b": ["2"]}, "body": ""}
+    ret = copy_result(result)
+    assert ret == result
+    assert ret["headers"] is not result["headers"]
+    assert ret["multiValueHeaders"] is not result["multiValueHeaders"]
@@ -0,0 +1,130 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+from lambda_gateway import compression
+
+
+@pytest.mark.parametrize(
+    ("content_type", "exp"),
+    [
+        ("", True),
+        ("application/json", True),
+        ("text/html; charset=utf-8", True),
+        ("image/svg+xml", True),
+        ("image/png", False),
+        ("audio/mpeg", False),
+        ("video/mp4", False),
+        ("application/zip", False),
+        ("Application/GZIP", False),
+    ],
+)
+def test_is_compressible(content_type, exp):
+    assert compression.is_compressible(content_type) is exp
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "exp"),
+    [
+        (None, None),
+        ("", None),
+        ("identity", None),
+        ("br", None),
+        ("gzip", "gzip"),
+        ("deflate", "deflate"),
+        ("gzip, deflate, br", "gzip"),
+        ("deflate, gzip", "gzip"),
+        ("gzip;q=0.5, deflate", "deflate"),
+        ("gzip;q=0, deflate;q=0", None),
+        ("GZIP ; Q=0.8", "gzip"),
+        ("gzip;q=x, deflate;q=0.1", "deflate"),
+        ("*", "gzip"),
+        ("*;q=0.5, gzip;q=0", "deflate"),
+    ],
+)
+def test_get_encoding(accept_encoding, exp):
+    assert compression.get_encoding(accept_encoding) == exp
+
+
+@pytest.mark.parametrize("body", ["é" * 100_000, b"\x00" * 200_000])
+def test_iter_blocks(body, monkeypatch):
+    monkeypatch.setattr(compression, "BLOCK_SIZE", 4096)
+    blocks = list(compression.iter_blocks(body))
+    assert all(len(block) <= 8192 for block in blocks)
+    exp = body.encode() if isinstance(body, str) else body
+    assert b"".join(blocks) == exp
+
+
+@pytest.mark.parametrize(
+    ("encoding", "decompress"),
+    [("gzip", gzip.decompress), ("deflate", zlib.decompress)],
+)
+def test_compress(encoding, decompress):
+    chunks = [b"fizz", b"", b"buzz" * 1000]
+    ret = b"".join(compression.compress(chunks, encoding))
+    assert decompress(ret) == b"".join(chunks)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "deflate"])
+def test_compress_sync(encoding):
+    decompressor = zlib.decompressobj(compression.WBITS[encoding])
+    chunks = compression.compress(iter([b"fizz", b"buzz"]), encoding, sync=True)
+    # every chunk is flushed, so each decompresses as soon as it is produced
+    assert decompressor.decompress(next(chunks)) == b"fizz"
+    assert decompressor.decompress(next(chunks)) == b"buzz"
+
+
+def test_acompress():
+    async def chunks():
+        yield b"fizz"
+        yield b"buzz"
+
+    async def collect():
+        return [x async for x in compression.acompress(chunks(), "gzip", True)]
+
+    ret = asyncio.run(collect())
+    assert len(ret) == 3
+    assert gzip.decompress(b"".join(ret)) == b"fizzbuzz"
+
+
+@pytest.mark.parametrize(
+    ("headers", "exp"),
+    [
+        ([], [("Vary", "Accept-Encoding")]),
+        ([("vary", "Origin")], [("vary", "Origin, Accept-Encoding")]),
+        ([("Vary", "accept-encoding")], [("Vary", "accept-encoding")]),
+        ([("Vary", "*")], [("Vary", "*")]),
+    ],
+)
+def test_add_vary(headers, exp):
+    assert compression.add_vary(headers) == exp
+
+
+@pytest.mark.parametrize(
+    ("body", "headers", "accept_encoding", "min_size", "exp_headers"),
+    [
+        ("x" * 10, [], "gzip", 100, []),
+        ("x" * 100, [("Content-Encoding", "br")], "gzip", 0, None),
+        (b"x" * 100, [("Content-Type", "image/jpeg")], "gzip", 0, None),
+        ("x" * 100, [], "identity", 0, [("Vary", "Accept-Encoding")]),
+    ],
+)
+def test_compress_body_skip(body, headers, accept_encoding, min_size, exp_headers):
+    exp_headers = headers if exp_headers is None else exp_headers
+    ret = compression.compress_body(body, list(headers), accept_encoding, min_size)
+    assert ret == (body, exp_headers)
+
+
+@pytest.mark.parametrize("body", ['{"data": "ünïcode"}' * 100, b"\x00\x01" * 100])
+def test_compress_body(body):
+    headers = [("Content-Type", "application/json")]
+    ret, headers = compression.compress_body(body, headers, "gzip", 100)
+    exp = body.encode() if isinstance(body, str) else body
+    assert gzip.decompress(ret) == exp
+    assert headers == [
+        ("Content-Type", "application/json"),
+        ("Vary", "Accept-Encoding"),
+        ("Content-Encoding", "gzip"),
+    ]
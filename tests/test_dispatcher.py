@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+import pytest
+
+from lambda_gateway.dispatcher import Dispatcher
+
+
+class TestDispatcher:
+    def setup_method(self):
+        self.subject = Dispatcher()
+
+    def teardown_method(self):
+        self.subject.close()
+
+    def test_lazy_start(self):
+        assert self.subject.loop is None
+        assert not self.subject.running
+
+    def test_run(self):
+        async def coroutine():
+            return threading.current_thread().name
+
+        assert self.subject.run(coroutine()) == "lambda-gateway-dispatcher"
+
+    def test_run_reuses_loop(self):
+        async def coroutine():
+            return asyncio.get_running_loop()
+
+        assert self.subject.run(coroutine()) is self.subject.run(coroutine())
+
+    def test_run_error(self):
+        async def coroutine():
+            raise ValueError()
+
+        with pytest.raises(ValueError):
+            self.subject.run(coroutine())
+
+    def test_close(self):
+        async def coroutine():
+            return True
+
+        self.subject.run(coroutine())
+        loop = self.subject.loop
+        self.subject.close()
+        assert loop.is_closed()
+        assert not self.subject.running
+        assert self.subject.run(coroutine())
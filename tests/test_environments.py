@@ -0,0 +1,272 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from lambda_gateway.environments import (
+    Environment,
+    EnvironmentDied,
+    EnvironmentPool,
+    EnvironmentStats,
+    HandlerError,
+    InitError,
+    InvocationTimeout,
+    MemoryLimitExceeded,
+    get_rss,
+)
+from lambda_gateway.lambda_context import Context
+from lambda_gateway.report import Report
+
+EVENT = {"version": "2.0", "rawPath": "/"}
+
+
+class TestEnvironment:
+    def test_invoke(self):
+        env = Environment("tests.test_runtime.handler", 7)
+        assert env.init() == env.init_duration > 0
+        result, duration, memory = env.invoke(EVENT)
+        assert result["body"] == str(env.process.pid)
+        assert duration >= 0
+        assert memory > 0
+        env.close()
+        assert env.process.returncode == 0
+
+    def test_invoke_error(self):
+        env = Environment("tests.test_runtime.error_handler")
+        env.init()
+        with pytest.raises(HandlerError) as err:
+            env.invoke(EVENT)
+        assert str(err.value) == "KeyError: 'boom'"
+        assert err.value.duration >= 0
+        assert err.value.memory > 0
+        env.close()
+
+    def test_init_error(self):
+        env = Environment("tests.test_runtime.missing")
+        with pytest.raises(InitError):
+            env.init()
+        assert env.process.returncode == 0
+
+    def test_died(self):
+        env = Environment("tests.test_runtime.exit_handler")
+        env.init()
+        with pytest.raises(EnvironmentDied) as err:
+            env.invoke(EVENT)
+        assert str(err.value) == "Environment 0 exited with 3"
+        assert err.value.memory is None
+        with pytest.raises(EnvironmentDied):
+            env.invoke(EVENT)
+        env.close()
+
+    def test_invoke_timeout(self):
+        env = Environment("tests.test_runtime.sleep_handler", 3)
+        env.init()
+        with pytest.raises(InvocationTimeout) as err:
+            env.invoke(EVENT, None, 0.1)
+        assert str(err.value) == "Environment 3 killed after 0.10 s timeout"
+        assert err.value.memory > 0
+        assert env.process.returncode == -signal.SIGKILL
+        env.close()
+
+    def test_invoke_memory(self):
+        env = Environment("tests.test_runtime.memory_handler", 2, 256)
+        env.init()
+        result, _, memory = env.invoke({"size": 16})
+        assert result["body"] == 16 * 1024 * 1024
+        assert memory >= 16 * 1024 * 1024
+        _, _, small = env.invoke({"size": 1})
+        assert small < memory
+        with pytest.raises(MemoryLimitExceeded) as err:
+            env.invoke({"size": 300, "hold": 60}, None, 10)
+        assert str(err.value).startswith("Environment 2 killed after using ")
+        assert str(err.value).endswith(" MB of 256 MB memory limit")
+        assert err.value.memory > 256 * 1024 * 1024
+        assert env.process.returncode == -signal.SIGKILL
+        env.close()
+
+    def test_invoke_memory_peak(self, monkeypatch):
+        monkeypatch.setattr("lambda_gateway.environments.get_rss", lambda pid: None)
+        env = Environment("tests.test_runtime.memory_handler", 0, 64)
+        env.init()
+        with pytest.raises(MemoryLimitExceeded) as err:
+            env.invoke({"size": 128})
+        assert err.value.memory > 64 * 1024 * 1024
+        env.close()
+
+    def test_invoke_memory_timeout(self):
+        env = Environment("tests.test_runtime.sleep_handler", 0, 256)
+        env.init()
+        with pytest.raises(InvocationTimeout):
+            env.invoke(EVENT, None, 0.1)
+        env.close()
+
+    def test_init_memory(self):
+        env = Environment("tests.test_runtime.handler", 0, 1)
+        with pytest.raises(InitError) as err:
+            env.init()
+        assert str(err.value).endswith("over the 1 MB memory limit")
+        env.close()
+
+    def test_spawn_error(self, monkeypatch):
+        monkeypatch.setattr("sys.executable", "/nonexistent/python")
+        with pytest.raises(OSError):
+            Environment("tests.test_runtime.handler")
+
+    def test_close_kill(self):
+        env = Environment("tests.test_runtime.handler")
+        env.init()
+        env.process.send_signal(signal.SIGSTOP)
+        env.close(0.1)
+        assert env.process.returncode == -signal.SIGKILL
+
+
+class TestEnvironmentPool:
+    def setup_method(self):
+        self.subject = EnvironmentPool("tests.test_runtime.handler", 2, 0)
+
+    def teardown_method(self):
+        self.subject.close()
+
+    def test_invoke_warm(self):
+        first = self.subject.invoke(EVENT)
+        second = self.subject.invoke(EVENT)
+        assert first == second
+        assert self.subject.count == 1
+        stats = self.subject.stats.snapshot()
+        assert stats["cold_starts"] == 1
+        assert stats["invocations"] == 2
+        assert stats["init_avg"] > 0
+        assert stats["max_memory"] > 0
+
+    def test_record_no_memory(self):
+        env = self.subject.acquire()[0]
+        report = Report("abc-123", 128)
+        self.subject.record(env, False, 0.001, None, report)
+        self.subject.release(env)
+        assert report.max_memory is None
+        assert self.subject.stats.snapshot()["max_memory"] == 0
+
+    def test_invoke_concurrent(self):
+        envs = [self.subject.acquire() for _ in range(2)]
+        assert [cold for _, cold in envs] == [True, True]
+        waiting = threading.Thread(target=self.subject.invoke, args=(EVENT,))
+        waiting.start()
+        time.sleep(0.05)
+        assert waiting.is_alive()
+        self.subject.release(envs[0][0])
+        waiting.join(5)
+        assert not waiting.is_alive()
+        self.subject.release(envs[1][0])
+        assert self.subject.count == 2
+        assert len(self.subject.idle) == 2
+
+    def test_invoke_handler_error(self):
+        self.subject.signature = "tests.test_runtime.error_handler"
+        with pytest.raises(HandlerError):
+            self.subject.invoke(EVENT)
+        assert len(self.subject.idle) == 1
+
+    def test_invoke_died(self):
+        self.subject.signature = "tests.test_runtime.exit_handler"
+        with pytest.raises(EnvironmentDied):
+            self.subject.invoke(EVENT)
+        assert self.subject.count == 0
+        assert self.subject.idle == []
+
+    def test_invoke_timeout(self):
+        self.subject.signature = "tests.test_runtime.sleep_handler"
+        report = Report("abc-123", 128)
+        with pytest.raises(InvocationTimeout):
+            self.subject.invoke(EVENT, Context(0.2), True, report)
+        assert self.subject.count == 0
+        assert report.max_memory > 0
+        self.subject.signature = "tests.test_runtime.remaining_handler"
+        ret = self.subject.invoke(EVENT, Context(5), hard_timeout=True)
+        assert 0 < ret["body"] <= 5000
+
+    def test_invoke_memory(self):
+        self.subject.memory = 64
+        self.subject.signature = "tests.test_runtime.memory_handler"
+        report = Report("abc-123", 64)
+        with pytest.raises(MemoryLimitExceeded):
+            self.subject.invoke({"size": 128}, report=report)
+        assert self.subject.count == 0
+        assert report.max_memory > 64 * 1024 * 1024
+
+    def test_init_error(self):
+        self.subject.signature = "tests.test_runtime.missing"
+        with pytest.raises(InitError):
+            self.subject.invoke(EVENT)
+        assert self.subject.count == 0
+
+    def test_check(self):
+        self.subject.check()
+        assert self.subject.count == 0
+        self.subject.signature = "tests.test_runtime.missing"
+        with pytest.raises(InitError):
+            self.subject.check()
+
+    def test_reap(self):
+        self.subject.idle_timeout = 0.05
+        self.subject.invoke(EVENT)
+        assert self.subject.reaper.is_alive()
+        deadline = time.monotonic() + 5
+        while self.subject.count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert self.subject.count == 0
+        assert self.subject.stats.snapshot()["reaped"] == 1
+        self.subject.start_reaper()
+        self.subject.close()
+        assert not self.subject.reaper.is_alive()
+
+    def test_recycle(self):
+        (idle, _), (busy, _) = [self.subject.acquire() for _ in range(2)]
+        self.subject.release(idle)
+        self.subject.recycle()
+        assert idle.process.returncode == 0
+        assert self.subject.count == 1
+        self.subject.release(busy)
+        assert busy.process.returncode == 0
+        assert self.subject.count == 0
+        env, cold = self.subject.acquire()
+        assert cold
+        self.subject.release(env)
+        assert self.subject.idle == [env]
+
+    def test_close_busy(self):
+        env, _ = self.subject.acquire()
+        self.subject.close()
+        self.subject.release(env)
+        assert self.subject.count == 0
+        assert env.process.returncode == 0
+
+
+def test_stats():
+    subject = EnvironmentStats()
+    assert subject.snapshot() == {
+        "cold_starts": 0,
+        "invocations": 0,
+        "reaped": 0,
+        "init_avg": 0,
+        "invoke_avg": 0,
+        "max_memory": 0,
+    }
+    subject.record_init(0.2)
+    subject.record_invoke(0.1, 2048)
+    subject.record_invoke(0.3, 1024)
+    subject.record_reaped()
+    assert subject.snapshot() == {
+        "cold_starts": 1,
+        "invocations": 2,
+        "reaped": 1,
+        "init_avg": 0.2,
+        "invoke_avg": 0.2,
+        "max_memory": 2048,
+    }
+
+
+def test_get_rss():
+    assert get_rss(os.getpid()) > 0
+    assert get_rss(-1) is None
@@ -1,15 +1,35 @@
 import asyncio
+import json
+import os
+import sys
+import threading
+import time
 from unittest import mock
 
 import pytest
 
+from lambda_gateway import events, metrics
+from lambda_gateway.cache import ResponseCache
 from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.lambda_context import Context
+from lambda_gateway.profiler import Profiler
+from lambda_gateway.report import MB, Report
+from lambda_gateway.routes import RouteTable
 
 
 class TestEventProxy:
     def setup_method(self):
         self.subject = EventProxy("index.handler", "/simple/", 3)
 
+    def teardown_method(self):
+        self.subject.close()
+
+    def test_context_manager(self):
+        with self.subject as proxy:
+            proxy.dispatcher.start()
+            assert proxy.dispatcher.running
+        assert not proxy.dispatcher.running
+
     @pytest.mark.parametrize(
         ("handler", "exp"),
         [
@@ -21,6 +41,30 @@ class TestEventProxy:
         ret = self.subject.get_handler().__name__
         assert ret == exp
 
+    def test_get_handler_cached(self):
+        self.subject.handler = "lambda_function.lambda_handler"
+        handler = self.subject.get_handler()
+        with mock.patch("importlib.import_module") as mock_import:
+            assert self.subject.get_handler() is handler
+            mock_import.assert_not_called()
+
+    def test_get_handler_sys_path(self):
+        self.subject.handler = "lambda_function.lambda_handler"
+        self.subject.get_handler()
+        self.subject.invalidate_handler()
+        self.subject.get_handler()
+        assert sys.path.count(os.path.curdir) == 1
+
+    def test_invalidate_handler(self):
+        self.subject.handler = "lambda_function.lambda_handler"
+        self.subject.load_handler()
+        self.subject.load_handler("lambda_function.lambda_handler")
+        self.subject.invalidate_handler("lambda_function.lambda_handler")
+        assert self.subject._handlers == {}
+        self.subject.load_handler()
+        self.subject.invalidate_handler()
+        assert self.subject._handlers == {}
+
     @pytest.mark.parametrize(
         "handler",
         [
@@ -105,7 +149,7 @@ class TestEventProxy:
         ],
     )
     def test_invoke_success(self, event, exp):
-        self.subject.get_handler = lambda: lambda event, context: exp
+        self.subject.get_handler = lambda signature=None: lambda event, context: exp
         ret = self.subject.invoke(event)
         assert ret == exp
 
@@ -196,7 +240,7 @@ class TestEventProxy:
         def handler(event, context):
             raise Exception()
 
-        self.subject.get_handler = lambda: handler
+        self.subject.get_handler = lambda signature=None: handler
         ret = self.subject.invoke(event)
         assert ret == exp
 
@@ -260,6 +304,282 @@ class TestEventProxy:
             ret = self.subject.invoke(event)
             assert ret == exp
 
+    def test_invoke_async_handler(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        exp = EventProxy.jsonify("GET", 200, message="OK")
+
+        async def handler(event, context):
+            await asyncio.sleep(0)
+            return exp, threading.current_thread().name
+
+        self.subject.get_handler = lambda signature=None: handler
+        ret, thread = self.subject.invoke(event)
+        assert ret == exp
+        assert thread == "lambda-gateway-dispatcher"
+        assert self.subject.executor is None
+
+    def test_invoke_sync_handler(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+
+        def handler(event, context):
+            tasks = metrics.EXECUTOR_TASKS.collect()[()]
+            return threading.current_thread().name, tasks
+
+        self.subject.max_workers = 3
+        self.subject.get_handler = lambda signature=None: handler
+        ret, tasks = self.subject.invoke(event)
+        assert ret.startswith("lambda-gateway-handler")
+        assert tasks >= 1
+        assert metrics.EXECUTOR_THREADS.collect() == {(): 3}
+
+    def test_run_in_executor_error(self):
+        self.subject.get_executor().shutdown()
+        tasks = metrics.EXECUTOR_TASKS.collect().get((), 0)
+        with pytest.raises(RuntimeError):
+            self.subject.dispatcher.run(self.subject.run_in_executor(print))
+        assert metrics.EXECUTOR_TASKS.collect().get((), 0) == tasks
+
+    def test_invoke_awaitable_result(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        exp = EventProxy.jsonify("GET", 200, message="OK")
+
+        async def handler(event, context):
+            return exp
+
+        self.subject.get_handler = lambda signature=None: lambda *args: handler(*args)
+        assert self.subject.invoke(event) == exp
+
+    def test_invoke_environment(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        with EventProxy("tests.test_runtime.handler", "/", environments=2) as proxy:
+            assert proxy.get_executor()._max_workers == 2
+            ret = proxy.invoke(event)
+            assert ret["body"] != str(os.getpid())
+            assert ret == proxy.invoke(event)
+            assert proxy.pool.count == 1
+            assert proxy._handlers == {}
+        assert proxy.pool.closed
+
+    def test_invoke_environment_error(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        with EventProxy(
+            "tests.test_runtime.error_handler", "/", environments=1
+        ) as proxy:
+            ret = proxy.invoke(event)
+        assert ret["statusCode"] == 502
+
+    def test_invoke_environment_timeout(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        with EventProxy(
+            "tests.test_runtime.sleep_handler", "/", 0.2, environments=1
+        ) as proxy:
+            start = time.monotonic()
+            ret = proxy.invoke(event)
+            assert time.monotonic() - start < 5
+            assert ret["statusCode"] == 504
+            assert proxy.pool.count == 0
+            proxy.pool.signature = "tests.test_runtime.remaining_handler"
+            assert 0 < proxy.invoke(event)["body"] <= 200
+
+    def test_invoke_environment_memory(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        with EventProxy(
+            "tests.test_runtime.memory_handler", "/", environments=1, memory=64
+        ) as proxy:
+            assert proxy.invoke(event)["statusCode"] == 502
+            assert proxy.pool.count == 0
+
+    def test_invoke_report(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        self.subject.handler = "tests.test_runtime.handler"
+        self.subject.load_handler()
+        with mock.patch.object(Report, "end", autospec=True) as mock_end:
+            self.subject.invoke(event)
+            self.subject.invoke(event)
+        (first,), (second,) = [call.args for call in mock_end.call_args_list]
+        assert first.request_id != second.request_id
+        assert first.memory_size == 128
+        assert first.duration_ns > 0
+        assert first.init_duration_ns > 0
+        assert second.init_duration_ns is None
+        assert first.status is None
+        assert first.max_memory > 0
+
+    def test_invoke_request_id(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+
+        def handler(event, context):
+            return {"statusCode": 200, "body": context.aws_request_id}
+
+        self.subject.get_handler = lambda signature=None: handler
+        with mock.patch.object(Report, "end", autospec=True) as mock_end:
+            ret = self.subject.invoke(event, request_id="fizz")
+        assert ret["body"] == "fizz"
+        ((report,),) = [call.args for call in mock_end.call_args_list]
+        assert report.request_id == "fizz"
+
+    def test_invoke_error_request_id(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        self.subject.get_handler = mock.Mock(side_effect=RuntimeError("boom"))
+        with mock.patch("lambda_gateway.logger.error") as mock_error:
+            self.subject.invoke(event, request_id="fizz")
+        mock_error.assert_called_once_with("RequestId: fizz Error: boom")
+
+    def test_invoke_record(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+
+        event["headers"] = {"Accept": "*/*"}
+
+        def handler(event, context):
+            event["path"] = "/changed"
+            event["headers"]["Accept"] = "text/plain"
+            return {"statusCode": 200}
+
+        self.subject.get_handler = lambda signature=None: handler
+        self.subject.recorder = mock.Mock()
+        recorder = self.subject.recorder
+        assert self.subject.invoke(event) == {"statusCode": 200}
+        recorded, result, started, duration_ns = recorder.record.call_args.args
+        assert json.loads(recorded) == {
+            "version": "1.0",
+            "httpMethod": "GET",
+            "path": "/simple/",
+            "headers": {"Accept": "*/*"},
+        }
+        assert result == {"statusCode": 200}
+        assert started <= time.time()
+        assert duration_ns > 0
+        self.subject.close()
+        recorder.close.assert_called_once_with()
+        assert self.subject.recorder is None
+
+    def test_invoke_cache(self):
+        calls = []
+
+        def handler(event, context):
+            calls.append(event)
+            return {"statusCode": 200, "body": str(len(calls))}
+
+        def get_event(httpMethod, target, **headers):
+            return events.get_event_v2(httpMethod, target, headers, "")
+
+        self.subject.get_handler = lambda signature=None: handler
+        self.subject.cache = ResponseCache(60)
+        assert self.subject.invoke(get_event("GET", "/simple/"))["body"] == "1"
+        assert self.subject.invoke(get_event("GET", "/simple/"))["body"] == "1"
+        assert self.subject.invoke(get_event("GET", "/simple/?a=1"))["body"] == "2"
+        assert self.subject.invoke(get_event("POST", "/simple/"))["body"] == "3"
+        event = get_event("GET", "/simple/", **{"Cache-Control": "max-age=0"})
+        assert self.subject.invoke(event)["body"] == "4"
+        assert self.subject.invoke(get_event("GET", "/simple/"))["body"] == "4"
+        assert len(calls) == 4
+        assert self.subject.respond(get_event("GET", "/simple/"))[1] is False
+        assert self.subject.respond(get_event("POST", "/simple/"))[1] is True
+        self.subject.close()
+        assert self.subject.cache is None
+
+    @pytest.mark.parametrize("handler", ["handler", "async_handler"])
+    def test_invoke_profile(self, handler, tmp_path):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        self.subject.handler = f"tests.test_runtime.{handler}"
+        self.subject.profiler = Profiler(str(tmp_path))
+        assert self.subject.invoke(event)["statusCode"] == 200
+        stats = self.subject.profiler.stats["handler"]
+        assert handler in {name for _, _, name in stats.stats}
+        self.subject.close()
+        assert os.listdir(tmp_path)
+
+    def test_invoke_report_timeout(self):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+
+        async def handler(event, context):
+            await asyncio.sleep(1)
+
+        self.subject.timeout = 0.01
+        self.subject.get_handler = lambda signature=None: handler
+        timeouts = metrics.INVOCATION_ERRORS.collect().get(("timeout",), 0)
+        with mock.patch.object(Report, "end", autospec=True) as mock_end:
+            assert self.subject.invoke(event)["statusCode"] == 504
+        assert metrics.INVOCATION_ERRORS.collect()[("timeout",)] == timeouts + 1
+        ((report,),) = [call.args for call in mock_end.call_args_list]
+        assert report.status == "timeout"
+        assert report.duration_ns >= 10_000_000
+
+    @pytest.mark.parametrize(
+        ("handler", "memory", "status", "error_type"),
+        [
+            ("handler", None, None, None),
+            ("error_handler", None, None, None),
+            ("exit_handler", None, "error", "Runtime.ExitError"),
+            ("memory_handler", 64, "error", "Runtime.OutOfMemory"),
+        ],
+    )
+    def test_invoke_environment_report(self, handler, memory, status, error_type):
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/simple/"}
+        with EventProxy(
+            f"tests.test_runtime.{handler}", "/", environments=1, memory=memory
+        ) as proxy:
+            with mock.patch.object(Report, "end", autospec=True) as mock_end:
+                proxy.invoke(event)
+        ((report,),) = [call.args for call in mock_end.call_args_list]
+        assert report.init_duration_ns > 0
+        assert report.duration_ns > 0
+        assert (report.status, report.error_type) == (status, error_type)
+        if handler == "exit_handler":
+            assert report.max_memory is None
+        elif memory is None:
+            assert report.max_memory > 0
+        else:
+            # The environment's memory, not the gateway's
+            assert report.max_memory > memory * MB
+            line = report.format()
+            assert f"\tMax Memory Used: {report.max_memory // MB} MB\t" in line
+            assert line.endswith("\tError Type: Runtime.OutOfMemory")
+
+    def test_iter_stream(self):
+        assert list(self.subject.iter_stream(iter([b"a", b"b"]))) == [b"a", b"b"]
+
+    def test_iter_stream_async(self):
+        async def stream():
+            yield threading.current_thread().name
+            yield b"b"
+
+        ret = list(self.subject.iter_stream(stream()))
+        assert ret == ["lambda-gateway-dispatcher", b"b"]
+
+    @pytest.mark.parametrize("is_async", [True, False])
+    def test_aiter_stream(self, is_async):
+        def stream():
+            yield threading.current_thread().name
+            yield b"b"
+
+        async def astream():
+            for chunk in stream():
+                yield chunk
+
+        async def collect():
+            body = astream() if is_async else stream()
+            return [chunk async for chunk in self.subject.aiter_stream(body)]
+
+        name, chunk = asyncio.run(collect())
+        assert chunk == b"b"
+        assert name.startswith("lambda-gateway-handler") is not is_async
+
+    def test_get_executor_environments(self):
+        routes = RouteTable({"GET /a": "app.a", "GET /b": "app.b"})
+        with EventProxy("app.c", "/", environments=2, routes=routes) as proxy:
+            assert proxy.get_executor()._max_workers == 6
+        with EventProxy(None, "/", 3, 4, environments=2, routes=routes) as proxy:
+            assert proxy.get_executor()._max_workers == 4
+
+    def test_get_executor(self):
+        self.subject.max_workers = 2
+        executor = self.subject.get_executor()
+        assert executor._max_workers == 2
+        assert self.subject.get_executor() is executor
+        self.subject.close()
+        assert self.subject.executor is None
+
     @pytest.mark.parametrize(
         ("verb", "statusCode", "body", "exp"),
         [
@@ -307,3 +627,101 @@ class TestEventProxy:
     def test_jsonify(self, verb, statusCode, body, exp):
         ret = EventProxy.jsonify(verb, statusCode, **body)
         assert ret == exp
+
+    def test_format_error(self):
+        assert EventProxy.format_error("boom") == "boom"
+        ret = EventProxy.format_error(RuntimeError("boom"), Context(request_id="fizz"))
+        assert ret == "RequestId: fizz Error: boom"
+
+    def test_route_default(self):
+        event = {"version": "2.0", "rawPath": "/simple/x", "routeKey": "GET /x"}
+        route = self.subject.route(event)
+        assert route.key == "$default"
+        assert route.signature == "index.handler"
+        assert event["routeKey"] == "GET /x"
+        self.subject.handler = None
+        assert self.subject.route(event) is None
+
+    @pytest.mark.parametrize("version", ["1.0", "2.0"])
+    def test_route(self, version):
+        self.subject.routes = RouteTable({"GET /simple/{id}": "app.get_item"})
+        event = events.get_event(version, "GET", "/simple/a%20b?q=1", {}, "")
+        route = self.subject.route(event)
+        assert route.signature == "app.get_item"
+        assert event["pathParameters"] == {"id": "a b"}
+        if version == "2.0":
+            assert event["routeKey"] == "GET /simple/{id}"
+        else:
+            assert event["resource"] == "/simple/{id}"
+
+    @pytest.mark.parametrize("version", ["1.0", "2.0"])
+    def test_route_unmatched(self, version):
+        self.subject.routes = RouteTable({"GET /simple/{id}": "app.get_item"})
+        event = events.get_event(version, "POST", "/simple/1", {}, "")
+        route = self.subject.route(event)
+        assert route.key == "$default"
+        assert route.signature == "index.handler"
+        assert "pathParameters" not in event
+        assert "resource" not in event
+        if version == "2.0":
+            assert event["routeKey"] == "$default"
+        self.subject.handler = None
+        assert self.subject.route(event) is None
+
+    def test_invoke_routes(self):
+        self.subject.handler = None
+        self.subject.routes = RouteTable(
+            {
+                "GET /simple/{id}": "tests.test_runtime.handler",
+                "POST /simple/{id}": "tests.test_runtime.async_handler",
+            }
+        )
+        self.subject.invalidate_handler()
+        get = events.get_event("2.0", "GET", "/simple/1", {}, "")
+        post = events.get_event("2.0", "POST", "/simple/1", {}, "")
+        assert self.subject.invoke(get)["body"] == str(os.getpid())
+        assert self.subject.get_signatures(loaded=True) == [
+            "tests.test_runtime.handler"
+        ]
+        assert self.subject.invoke(post)["body"] == "async"
+        assert self.subject.get_signatures(loaded=True) == [
+            "tests.test_runtime.handler",
+            "tests.test_runtime.async_handler",
+        ]
+
+    def test_invoke_not_found(self):
+        self.subject.handler = None
+        self.subject.routes = RouteTable({"GET /simple/{id}": "app.get_item"})
+        self.subject.get_handler = mock.Mock()
+        event = events.get_event("2.0", "GET", "/simple/", {}, "")
+        ret = self.subject.respond(event)
+        assert ret == (EventProxy.jsonify("GET", 404, message="Not Found"), False)
+        self.subject.get_handler.assert_not_called()
+        ret = asyncio.run(self.subject.ainvoke(event))
+        assert ret == EventProxy.jsonify("GET", 404, message="Not Found")
+
+    def test_invoke_routes_environments(self):
+        routes = RouteTable(
+            {
+                "GET /{proxy+}": "tests.test_runtime.handler",
+                "POST /{proxy+}": "tests.test_runtime.async_handler",
+            }
+        )
+        with EventProxy(None, "/", environments=1, routes=routes) as proxy:
+            assert proxy.pool is None
+            get = events.get_event("2.0", "GET", "/a", {}, "")
+            post = events.get_event("2.0", "POST", "/a", {}, "")
+            assert proxy.invoke(get)["body"] != str(os.getpid())
+            assert proxy.invoke(post)["body"] == "async"
+            assert list(proxy.pools) == [
+                "tests.test_runtime.handler",
+                "tests.test_runtime.async_handler",
+            ]
+
+    def test_get_signatures(self):
+        assert self.subject.get_signatures() == ["index.handler"]
+        self.subject.routes = RouteTable(
+            {"GET /a": "app.a", "GET /b": "index.handler", "$default": "app.b"}
+        )
+        assert self.subject.get_signatures() == ["index.handler", "app.a", "app.b"]
+        assert self.subject.get_signatures(loaded=True) == ["index.handler"]
@@ -0,0 +1,156 @@
+import copy
+import json
+import pickle
+from unittest import mock
+from urllib import parse
+
+import pytest
+
+from lambda_gateway import events
+
+
+@pytest.mark.parametrize("version", ["1.0", "2.0"])
+def test_get_event(version):
+    ret = events.get_event(version, "GET", "/?a=1", {"Host": "x"}, "")
+    assert ret["version"] == version
+    assert ret["headers"] == {"Host": "x"}
+    assert ret["queryStringParameters"] == {"a": "1"}
+    assert ret["isBase64Encoded"] is False
+
+
+@pytest.mark.parametrize("version", ["1.0", "2.0"])
+def test_get_event_base64(version):
+    ret = events.get_event(version, "POST", "/", {}, "iVBORw==", True)
+    assert ret["body"] == "iVBORw=="
+    assert ret["isBase64Encoded"] is True
+
+
+def test_get_event_v2_route_key():
+    headers = {"x-route-key": "ANY /{proxy+}"}
+    ret = events.get_event_v2("GET", "/a/b", headers, "")
+    assert ret["routeKey"] == "GET /a/b"
+
+
+def test_get_event_unknown_version():
+    with pytest.raises(ValueError):
+        events.get_event("3.0", "GET", "/", {}, "")
+
+
+def get_event_v1_eager(httpMethod, target, headers, body, isBase64Encoded=False):
+    url = parse.urlparse(target)
+    path, *_ = url.path.split("?")
+    return {
+        "version": "1.0",
+        "body": body,
+        "isBase64Encoded": isBase64Encoded,
+        "headers": dict(headers),
+        "httpMethod": httpMethod,
+        "path": path,
+        "queryStringParameters": dict(parse.parse_qsl(url.query)),
+    }
+
+
+def get_event_v2_eager(httpMethod, target, headers, body, isBase64Encoded=False):
+    url = parse.urlparse(target)
+    path, *_ = url.path.split("?")
+    route_key = f"{httpMethod} {path}"
+    return {
+        "version": "2.0",
+        "body": body,
+        "isBase64Encoded": isBase64Encoded,
+        "routeKey": route_key,
+        "rawPath": path,
+        "rawQueryString": url.query,
+        "headers": dict(headers),
+        "queryStringParameters": dict(parse.parse_qsl(url.query)),
+        "requestContext": {
+            "http": {
+                "method": httpMethod,
+                "path": path,
+            },
+        },
+    }
+
+
+REQUEST = ("POST", "/a/b;x?fizz=buzz&a=1&a=2#frag", {"Host": "x"}, "{}")
+
+
+@pytest.mark.parametrize(
+    ("lazy", "eager"),
+    [
+        (events.get_event_v1, get_event_v1_eager),
+        (events.get_event_v2, get_event_v2_eager),
+    ],
+)
+@pytest.mark.parametrize("read", [None, "headers", "queryStringParameters"])
+def test_lazy_event_json(lazy, eager, read):
+    ret = lazy(*REQUEST)
+    exp = eager(*REQUEST)
+    if read:
+        assert ret[read] == exp[read]
+    assert json.dumps(ret) == json.dumps(exp)
+    assert list(ret) == list(exp)
+    assert ret == exp
+    assert exp == ret
+    assert not ret != exp
+    assert len(ret) == len(exp)
+    assert repr(ret) == repr(exp)
+
+
+def test_lazy_event_computed_on_access():
+    headers = mock.MagicMock()
+    headers.get.return_value = None
+    ret = events.get_event_v2("GET", "/?a=1", headers, "")
+    assert ret["version"] == "2.0"
+    assert ret["body"] == ""
+    assert not dict.__contains__(ret, "headers")
+    assert "headers" in ret
+    headers.keys.assert_not_called()
+    assert ret["rawQueryString"] == "a=1"
+    assert ret.get("queryStringParameters") == {"a": "1"}
+    assert dict.__contains__(ret, "queryStringParameters")
+    assert not dict.__contains__(ret, "headers")
+
+
+def test_lazy_event_compare_lazy():
+    assert events.get_event_v1(*REQUEST) == events.get_event_v1(*REQUEST)
+    assert events.get_event_v1(*REQUEST) != events.get_event_v2(*REQUEST)
+
+
+def test_lazy_event_missing():
+    ret = events.get_event_v1(*REQUEST)
+    assert "rawPath" not in ret
+    assert ret.get("rawPath", "-") == "-"
+    with pytest.raises(KeyError):
+        ret["rawPath"]
+
+
+def test_lazy_event_mutate():
+    ret = events.get_event_v1(*REQUEST)
+    ret["path"] = "/override"
+    ret["extra"] = True
+    assert ret.setdefault("httpMethod") == "POST"
+    assert ret.setdefault("other", 1) == 1
+    assert list(ret)[-2:] == ["extra", "other"]
+    assert ret["path"] == "/override"
+    del ret["extra"]
+    assert ret.pop("other") == 1
+    assert ret.popitem() == ("queryStringParameters", {"fizz": "buzz", "a": "2"})
+    assert list(reversed(ret))[0] == "path"
+
+
+def test_lazy_event_copy():
+    ret = events.get_event_v2(*REQUEST)
+    exp = get_event_v2_eager(*REQUEST)
+    for copied in [
+        ret.copy(),
+        copy.deepcopy(ret),
+        pickle.loads(pickle.dumps(ret)),
+        dict(events.get_event_v2(*REQUEST)),
+        {**events.get_event_v2(*REQUEST)},
+        events.get_event_v2(*REQUEST) | {},
+    ]:
+        assert type(copied) is dict
+        assert copied == exp
+    assert list(ret.keys()) == list(exp.keys())
+    assert list(ret.values()) == list(exp.values())
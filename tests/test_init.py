@@ -0,0 +1,90 @@
+import logging
+import os
+from unittest import mock
+
+import lambda_gateway
+from lambda_gateway import LogQueue
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class TestLogQueue:
+    def setup_method(self):
+        self.logger = logging.getLogger("lambda_gateway.test")
+        self.logger.propagate = False
+        self.handler = ListHandler()
+        self.subject = LogQueue(self.logger, self.handler)
+
+    def teardown_method(self):
+        self.subject.stop()
+        self.logger.removeHandler(self.subject.queue_handler)
+        LogQueue.instances.remove(self.subject)
+
+    def test_log(self):
+        self.logger.warning("fizz %s", "buzz")
+        self.subject.stop()
+        assert self.handler.messages == ["fizz buzz"]
+        assert self.subject.listener is None
+
+    def test_stop_idempotent(self):
+        self.subject.stop()
+        self.subject.stop()
+        assert self.subject.listener is None
+
+    def test_restart(self):
+        self.logger.warning("parent")
+        queue, listener = self.subject.queue_handler.queue, self.subject.listener
+        self.subject.restart()
+        assert self.subject.queue_handler.queue is not queue
+        assert self.subject.listener is not listener
+        listener.stop()
+        self.logger.warning("child")
+        self.subject.stop()
+        assert self.handler.messages == ["parent", "child"]
+
+    def test_fork(self):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            self.handler.emit = lambda record: os.write(write, b"child")
+            self.logger.warning("child")
+            self.subject.stop()
+            os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        with os.fdopen(read, "rb") as pipe:
+            assert pipe.read() == b"child"
+
+
+def test_log_queue_no_fork(monkeypatch):
+    monkeypatch.delattr(os, "register_at_fork")
+    subject = LogQueue(logging.getLogger("lambda_gateway.test_no_fork"), ListHandler())
+    subject.stop()
+    LogQueue.instances.remove(subject)
+
+
+def test_stop_logging(monkeypatch):
+    log_queue = mock.Mock(LogQueue)
+    monkeypatch.setattr(LogQueue, "instances", [log_queue])
+    lambda_gateway.stop_logging()
+    log_queue.stop.assert_called_once_with()
+
+
+def test_logger():
+    assert lambda_gateway.logger.queue in LogQueue.instances
+    assert lambda_gateway.logger.queue.listener is not None
+
+
+def test_logger_format():
+    handler = ListHandler()
+    handler.setFormatter(lambda_gateway.logger.queue.handler.formatter)
+    handler.emit(logging.makeLogRecord({"msg": "fizz", "levelname": "INFO"}))
+    assert handler.messages[0].startswith("[")
+    assert handler.messages[0].endswith("] INFO - fizz")
@@ -1,4 +1,9 @@
-from datetime import timedelta
+import os
+import re
+import subprocess
+import sys
+
+import pytest
 
 from lambda_gateway import lambda_context
 from lambda_gateway.lambda_context import Context
@@ -8,6 +13,39 @@ def test_start():
     with lambda_context.start(11) as ret:
         assert isinstance(ret, Context)
         assert ret._timeout == 11
+    with lambda_context.start(11, 512) as ret:
+        assert ret.memory_limit_in_mb == 512
+    with lambda_context.start(request_id="fizz") as ret:
+        assert ret.aws_request_id == "fizz"
+
+
+def test_get_log_stream_name():
+    ret = lambda_context.get_log_stream_name()
+    assert re.fullmatch(r"\d{4}/\d{2}/\d{2}/\[\$LATEST\][0-9a-f]{32}", ret)
+
+
+def test_reset_log_stream_name():
+    stream = lambda_context.LOG_STREAM_NAME
+    try:
+        lambda_context.reset_log_stream_name()
+        assert lambda_context.LOG_STREAM_NAME != stream
+        assert Context().log_stream_name == lambda_context.LOG_STREAM_NAME
+    finally:
+        lambda_context.LOG_STREAM_NAME = stream
+
+
+def test_log_stream_name_fork():
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        os.write(write, Context().log_stream_name.encode())
+        os._exit(0)
+    os.close(write)
+    os.waitpid(pid, 0)
+    with os.fdopen(read) as pipe:
+        ret = pipe.read()
+    assert ret
+    assert ret != Context().log_stream_name
 
 
 class TestContext:
@@ -31,14 +69,31 @@ class TestContext:
 
     def test_aws_request_id(self):
         assert self.subject.aws_request_id is not None
+        assert self.subject.aws_request_id == self.subject.aws_request_id
+        assert self.subject.aws_request_id != Context().aws_request_id
 
     def test_log_group_name(self):
         assert self.subject.log_group_name == "/aws/lambda/lambda-gateway"
 
     def test_log_stream_name(self):
         assert self.subject.log_stream_name is not None
+        assert self.subject.log_stream_name == Context().log_stream_name
+
+    def test_slots(self):
+        with pytest.raises(AttributeError):
+            self.subject.fizz = "buzz"
 
     def test_get_remaining_time_in_millis(self):
         assert 0 < self.subject.get_remaining_time_in_millis() < 1000
-        self.subject._start -= timedelta(seconds=1)
+        self.subject._deadline -= 1
         assert self.subject.get_remaining_time_in_millis() == 0
+
+    def test_start_timer(self):
+        self.subject._deadline -= 1
+        self.subject.start_timer()
+        assert 0 < self.subject.get_remaining_time_in_millis() <= 1000
+
+
+def test_import_no_fork():
+    code = "import os; del os.register_at_fork; import lambda_gateway.lambda_context"
+    subprocess.run([sys.executable, "-c", code], check=True)
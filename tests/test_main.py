@@ -1,7 +1,13 @@
+import signal
+import socket
 import sys
 from unittest import mock
 
+import pytest
+
 from lambda_gateway import __main__
+from lambda_gateway.access_log import AccessLog
+from lambda_gateway.request_handler import LambdaRequestHandler
 
 
 def test_get_opts_default():
@@ -13,6 +19,15 @@ def test_get_opts_default():
     assert opts.bind is None
     assert opts.port == 8000
     assert opts.timeout is None
+    assert opts.workers == 1
+    assert opts.keep_alive == 5
+    assert opts.handler_threads is None
+    assert opts.max_requests == 1000
+    assert opts.min_compression_size is None
+    assert opts.metrics_path is None
+    assert opts.record is None
+    assert opts.cache_ttl is None
+    assert opts.cache_size == 1000
     assert opts.HANDLER == "index.handler"
 
 
@@ -34,6 +49,29 @@ def test_get_opts():
     assert opts.HANDLER == "index.handler"
 
 
+def test_get_opts_pool():
+    sys.argv = [
+        "lambda-gateway",
+        "--pool-size",
+        "4",
+        "--queue-depth",
+        "16",
+        "index.handler",
+    ]
+    opts = __main__.get_opts()
+    assert opts.pool_size == 4
+    assert opts.queue_depth == 16
+
+
+@mock.patch("lambda_gateway.__main__.PooledHTTPServer")
+def test_get_server_pool(mock_server):
+    sys.argv = ["lambda-gateway", "--pool-size", "4", "index.handler"]
+    opts = __main__.get_opts()
+    ret = __main__.get_server(socket.AF_INET, ("", 8000), opts, None)
+    assert ret == mock_server.return_value
+    mock_server.assert_called_once_with(("", 8000), LambdaRequestHandler, 4, 64)
+
+
 @mock.patch("http.server.ThreadingHTTPServer")
 def test_run(mock_httpd):
     mock_httpd.socket.getsockname.return_value = ["host", 8000]
@@ -50,6 +88,15 @@ def test_run_int(mock_httpd):
     mock_httpd.shutdown.assert_called_once_with()
 
 
+@mock.patch("http.server.ThreadingHTTPServer")
+@mock.patch("lambda_gateway.event_proxy.EventProxy")
+def test_run_close_proxy(mock_proxy, mock_httpd):
+    mock_httpd.socket.getsockname.return_value = ["host", 8000]
+    __main__.run(mock_httpd, "/", mock_proxy)
+    mock_httpd.shutdown.assert_called_once_with()
+    mock_proxy.close.assert_called_once_with()
+
+
 @mock.patch("http.server.ThreadingHTTPServer.__enter__")
 @mock.patch("lambda_gateway.__main__.run")
 def test_main(mock_run, mock_httpd):
@@ -57,8 +104,292 @@ def test_main(mock_run, mock_httpd):
         "lambda-gateway",
         "-B",
         "simple",
-        "index.handler",
+        "lambda_function.lambda_handler",
     ]
     mock_httpd.return_value = "<httpd>"
     __main__.main()
-    mock_run.assert_called_once_with("<httpd>", "/simple/")
+    httpd, base_path, proxy, reloader = mock_run.call_args.args
+    assert httpd == "<httpd>"
+    assert base_path == "/simple/"
+    assert proxy.handler == "lambda_function.lambda_handler"
+    assert proxy._handlers["lambda_function.lambda_handler"]
+    assert reloader is None
+
+
+@mock.patch("http.server.ThreadingHTTPServer")
+def test_run_reloader(mock_httpd):
+    mock_httpd.socket.getsockname.return_value = ["host", 8000]
+    reloader = mock.Mock()
+    __main__.run(mock_httpd, "/", None, reloader)
+    reloader.start.assert_called_once_with()
+    reloader.close.assert_called_once_with()
+
+
+@pytest.mark.parametrize(
+    ("flag", "package"),
+    [("--reload", False), ("--reload-package", True)],
+)
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_reload(mock_run, mock_httpd, flag, package):
+    sys.argv = ["lambda-gateway", flag, "lambda_function.lambda_handler"]
+    __main__.main()
+    _, _, proxy, reloader = mock_run.call_args.args
+    assert reloader.proxy is proxy
+    assert reloader.package is package
+    assert reloader.thread is None
+
+
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.environments.EnvironmentPool.check")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_environments(mock_run, mock_check, mock_httpd):
+    sys.argv = [
+        "lambda-gateway",
+        "--environments",
+        "4",
+        "--idle-timeout",
+        "60",
+        "--memory",
+        "256",
+        "lambda_function.not_imported",
+    ]
+    __main__.main()
+    mock_check.assert_called_once_with()
+    _, _, proxy, _ = mock_run.call_args.args
+    assert proxy.pool.size == 4
+    assert proxy.pool.idle_timeout == 60
+    assert proxy.pool.memory == proxy.memory == 256
+    assert proxy._handlers == {}
+
+
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_bad_handler(mock_run):
+    sys.argv = [
+        "lambda-gateway",
+        "lambda_function.not_a_function",
+    ]
+    with pytest.raises(SystemExit) as err:
+        __main__.main()
+    assert "not_a_function" in str(err.value)
+    mock_run.assert_not_called()
+
+
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.Supervisor")
+def test_main_workers(mock_supervisor, mock_httpd):
+    sys.argv = [
+        "lambda-gateway",
+        "--workers",
+        "4",
+        "lambda_function.lambda_handler",
+    ]
+    mock_httpd.return_value = "<httpd>"
+    __main__.main()
+    httpd, target, workers = mock_supervisor.call_args.args
+    assert httpd == "<httpd>"
+    assert target.func == __main__.run
+    assert workers == 4
+    mock_supervisor.return_value.run.assert_called_once_with()
+
+
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_record(mock_run, mock_httpd, tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    sys.argv = [
+        "lambda-gateway",
+        "--record",
+        str(path),
+        "lambda_function.lambda_handler",
+    ]
+    __main__.main()
+    _, _, proxy, _ = mock_run.call_args.args
+    assert proxy.recorder.path == str(path)
+    proxy.close()
+    assert path.exists()
+
+
+@mock.patch("signal.signal")
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_profile(mock_run, mock_httpd, mock_signal, tmp_path):
+    directory = tmp_path / "profiles"
+    sys.argv = [
+        "lambda-gateway",
+        "--profile",
+        str(directory),
+        "--profile-rate",
+        "0.1",
+        "lambda_function.lambda_handler",
+    ]
+    try:
+        __main__.main()
+        _, _, proxy, _ = mock_run.call_args.args
+        assert LambdaRequestHandler.profiler is proxy.profiler
+    finally:
+        LambdaRequestHandler.set_profiler(None)
+    assert directory.is_dir()
+    assert proxy.profiler.directory == str(directory)
+    assert proxy.profiler.rate == 0.1
+    mock_signal.assert_called_once_with(signal.SIGUSR1, proxy.profiler.dump_async)
+
+
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_access_log(mock_run, mock_httpd):
+    sys.argv = [
+        "lambda-gateway",
+        "--access-log-format",
+        "json",
+        "--access-log-rate",
+        "0.01",
+        "lambda_function.lambda_handler",
+    ]
+    try:
+        __main__.main()
+        access_log = LambdaRequestHandler.access_log
+    finally:
+        LambdaRequestHandler.set_access_log(AccessLog())
+    assert access_log.log_format == "json"
+    assert access_log.rate == 0.01
+
+
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_profile_error(mock_run, tmp_path):
+    path = tmp_path / "file"
+    path.write_text("")
+    sys.argv = ["lambda-gateway", "--profile", str(path / "dir"), "x.y"]
+    with pytest.raises(SystemExit) as err:
+        __main__.main()
+    assert "lambda-gateway: error:" in str(err.value)
+    mock_run.assert_not_called()
+
+
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_cache(mock_run, mock_httpd):
+    sys.argv = [
+        "lambda-gateway",
+        "--cache-ttl",
+        "30",
+        "--cache-size",
+        "10",
+        "--cache-key-param",
+        "page",
+        "--cache-key-header",
+        "Accept",
+        "lambda_function.lambda_handler",
+    ]
+    __main__.main()
+    _, _, proxy, _ = mock_run.call_args.args
+    assert proxy.cache.ttl == 30
+    assert proxy.cache.max_entries == 10
+    assert proxy.cache.params == ("page",)
+    assert proxy.cache.headers == ("accept",)
+
+
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_record_error(mock_run, tmp_path):
+    sys.argv = [
+        "lambda-gateway",
+        "--record",
+        str(tmp_path / "missing" / "traffic.jsonl"),
+        "lambda_function.lambda_handler",
+    ]
+    with pytest.raises(SystemExit) as err:
+        __main__.main()
+    assert "traffic.jsonl" in str(err.value)
+    mock_run.assert_not_called()
+
+
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_routes(mock_run, mock_httpd, tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text('{"GET /items/{id}": "lambda_function.not_imported"}')
+    sys.argv = ["lambda-gateway", "--routes", str(path)]
+    __main__.main()
+    _, _, proxy, _ = mock_run.call_args.args
+    assert proxy.handler is None
+    assert len(proxy.routes) == 1
+    assert proxy._handlers == {}
+
+
+@mock.patch("http.server.ThreadingHTTPServer.__enter__")
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_routes_default(mock_run, mock_httpd, tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text('{"GET /items/{id}": "lambda_function.not_imported"}')
+    sys.argv = [
+        "lambda-gateway",
+        "--routes",
+        str(path),
+        "lambda_function.lambda_handler",
+    ]
+    __main__.main()
+    _, _, proxy, _ = mock_run.call_args.args
+    assert proxy.get_signatures() == [
+        "lambda_function.lambda_handler",
+        "lambda_function.not_imported",
+    ]
+    assert list(proxy._handlers) == ["lambda_function.lambda_handler"]
+
+
+@pytest.mark.parametrize("routes", [None, "[]", '{"GET items": "x.y"}'])
+@mock.patch("lambda_gateway.__main__.run")
+def test_main_routes_error(mock_run, tmp_path, routes):
+    path = tmp_path / "routes.json"
+    if routes is not None:
+        path.write_text(routes)
+    sys.argv = ["lambda-gateway", "--routes", str(path)]
+    with pytest.raises(SystemExit) as err:
+        __main__.main()
+    assert "lambda-gateway: error:" in str(err.value)
+    mock_run.assert_not_called()
+
+
+def test_get_opts_no_handler(capsys):
+    sys.argv = ["lambda-gateway"]
+    with pytest.raises(SystemExit):
+        __main__.get_opts()
+    assert "a HANDLER or --routes is required" in capsys.readouterr().err
+
+
+@mock.patch("lambda_gateway.bench.main")
+def test_main_bench(mock_bench):
+    sys.argv = ["lambda-gateway", "bench", "-n", "10", "http://localhost:8000/"]
+    __main__.main()
+    mock_bench.assert_called_once_with(["-n", "10", "http://localhost:8000/"])
+
+
+@mock.patch("lambda_gateway.replay.main")
+def test_main_replay(mock_replay):
+    sys.argv = ["lambda-gateway", "replay", "traffic.jsonl", "index.handler"]
+    __main__.main()
+    mock_replay.assert_called_once_with(["traffic.jsonl", "index.handler"])
+
+
+def test_get_server_asyncio():
+    sys.argv = [
+        "lambda-gateway",
+        "-e",
+        "asyncio",
+        "--min-compression-size",
+        "1024",
+        "--metrics-path",
+        "/metrics",
+        "x.y",
+    ]
+    opts = __main__.get_opts()
+    proxy = mock.Mock(profiler="<profiler>")
+    access_log = AccessLog("json")
+    addr = ("127.0.0.1", 0)
+    with __main__.get_server(socket.AF_INET, addr, opts, proxy, access_log) as ret:
+        assert isinstance(ret, __main__.AsyncHTTPServer)
+        assert ret.proxy is proxy
+        assert ret.version == "2.0"
+        assert ret.min_compression_size == 1024
+        assert ret.metrics_path == "/metrics"
+        assert ret.profiler == "<profiler>"
+        assert ret.access_log is access_log
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+from lambda_gateway import metrics
+from lambda_gateway.metrics import Counter, Gauge, Histogram, Registry
+
+
+def run_in_thread(func, *args, **kwargs):
+    thread = threading.Thread(target=func, args=args, kwargs=kwargs)
+    thread.start()
+    thread.join()
+
+
+class TestCounter:
+    def setup_method(self):
+        self.subject = Counter("requests_total", "Requests.", ("method", "status"))
+
+    def test_inc(self):
+        self.subject.inc("GET", 200)
+        self.subject.inc("GET", 200, amount=2)
+        run_in_thread(self.subject.inc, "GET", 200)
+        run_in_thread(self.subject.inc, "POST", 500)
+        assert self.subject.collect() == {("GET", 200): 4, ("POST", 500): 1}
+
+    def test_retire_dead_threads(self):
+        for _ in range(10):
+            run_in_thread(self.subject.inc, "GET", 200)
+        self.subject.inc("GET", 200)
+        assert self.subject.collect() == {("GET", 200): 11}
+        assert len(self.subject._shards) == 1
+        assert self.subject.collect() == {("GET", 200): 11}
+
+    def test_expose(self):
+        self.subject.inc("GET", 200)
+        self.subject.inc('GE"T\n\\', 500)
+        assert self.subject.expose() == [
+            "# HELP requests_total Requests.",
+            "# TYPE requests_total counter",
+            r'requests_total{method="GE\"T\n\\",status="500"} 1',
+            'requests_total{method="GET",status="200"} 1',
+        ]
+
+
+class TestGauge:
+    def test_inc_dec(self):
+        subject = Gauge("in_flight", "In flight.")
+        subject.inc()
+        run_in_thread(subject.dec)
+        subject.inc()
+        assert subject.collect() == {(): 1}
+        assert subject.expose()[-1] == "in_flight 1"
+
+    def test_set(self):
+        subject = Gauge("threads", "Threads.")
+        subject.set(4)
+        run_in_thread(subject.set, 8)
+        assert subject.collect() == {(): 8}
+
+
+class TestHistogram:
+    def setup_method(self):
+        self.subject = Histogram("latency", "Latency.", ("phase",), (0.1, 1))
+
+    def test_observe(self):
+        self.subject.observe(0.05, "handler")
+        self.subject.observe(0.1, "handler")
+        run_in_thread(self.subject.observe, 0.5, "handler")
+        run_in_thread(self.subject.observe, 5, "handler")
+        self.subject.observe(2, "handler")
+        assert self.subject.expose() == [
+            "# HELP latency Latency.",
+            "# TYPE latency histogram",
+            'latency_bucket{phase="handler",le="0.1"} 2',
+            'latency_bucket{phase="handler",le="1.0"} 3',
+            'latency_bucket{phase="handler",le="+Inf"} 5',
+            'latency_sum{phase="handler"} 7.65',
+            'latency_count{phase="handler"} 5',
+        ]
+
+
+def test_registry():
+    subject = Registry()
+    counter = subject.register(Counter("a_total", "A."))
+    counter.inc()
+    subject.register(Gauge("b", "B."))
+    assert subject.expose() == (
+        "# HELP a_total A.\n"
+        "# TYPE a_total counter\n"
+        "a_total 1\n"
+        "# HELP b B.\n"
+        "# TYPE b gauge\n"
+    )
+
+
+@pytest.mark.parametrize(("httpMethod", "has_body"), [("GET", True), ("HEAD", False)])
+def test_get_response(httpMethod, has_body):
+    ret = metrics.get_response(httpMethod)
+    assert ret["statusCode"] == 200
+    assert ret["headers"] == {"Content-Type": metrics.CONTENT_TYPE}
+    assert ("# TYPE lambda_gateway_requests_total counter" in ret["body"]) == has_body
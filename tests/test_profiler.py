@@ -0,0 +1,208 @@
+import asyncio
+import os
+import pstats
+import threading
+import types
+from unittest import mock
+
+import pytest
+
+from lambda_gateway.profiler import Profiler, collapse, drive, format_frame
+
+
+def leaf(n):
+    return sum(range(n))
+
+
+def work():
+    return leaf(200_000) + leaf(100_000)
+
+
+async def awork(delay=0.01):
+    await asyncio.sleep(delay)
+    return work()
+
+
+def boom():
+    raise KeyError("boom")
+
+
+class TestProfiler:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.directory = tmp_path
+        self.subject = Profiler(str(tmp_path))
+
+    def test_call(self):
+        assert self.subject.call("handler", work) == work()
+        assert self.subject.call("handler", leaf, 10) == 45
+        assert self.subject.samples["handler"] == 2
+        funcs = {name for _, _, name in self.subject.stats["handler"].stats}
+        assert {"work", "leaf"} <= funcs
+        assert not any("disable" in name for name in funcs)
+
+    def test_call_error(self):
+        with pytest.raises(KeyError):
+            self.subject.call("handler", boom)
+        assert self.subject.samples["handler"] == 1
+
+    def test_call_not_sampled(self):
+        self.subject.rate = 0
+        assert self.subject.call("handler", work) == work()
+        assert self.subject.stats == {}
+
+    def test_call_rate(self):
+        self.subject.rate = 0.5
+        with mock.patch("random.random", side_effect=[0.4, 0.6]):
+            self.subject.call("handler", work)
+            self.subject.call("handler", work)
+        assert self.subject.samples["handler"] == 1
+
+    def test_call_profiler_busy(self):
+        with mock.patch("cProfile.Profile.enable", side_effect=ValueError):
+            assert self.subject.call("handler", work) == work()
+        assert self.subject.stats == {}
+
+    def test_coroutine(self):
+        async def other():
+            for _ in range(3):
+                leaf(100_000)
+                await asyncio.sleep(0.005)
+
+        async def main():
+            return await asyncio.gather(
+                self.subject.coroutine("handler", awork()), other()
+            )
+
+        ret, _ = asyncio.run(main())
+        assert ret == work()
+        funcs = {name for _, _, name in self.subject.stats["handler"].stats}
+        assert {"awork", "work"} <= funcs
+        assert "other" not in funcs
+
+    def test_coroutine_not_sampled(self):
+        self.subject.rate = 0
+        assert asyncio.run(self.subject.coroutine("handler", awork(0))) == work()
+        assert self.subject.stats == {}
+
+    def test_coroutine_profiler_busy(self):
+        with mock.patch("cProfile.Profile.enable", side_effect=ValueError):
+            assert asyncio.run(self.subject.coroutine("handler", awork(0))) == work()
+        assert self.subject.stats == {}
+
+    def test_coroutine_error(self):
+        async def fail():
+            await asyncio.sleep(0)
+            boom()
+
+        with pytest.raises(KeyError):
+            asyncio.run(self.subject.coroutine("handler", fail()))
+        assert self.subject.samples["handler"] == 1
+
+    def test_coroutine_cancel(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def main():
+            await asyncio.wait_for(self.subject.coroutine("handler", slow()), 0.01)
+
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(main())
+        assert cancelled == [True]
+
+    def test_dump(self):
+        self.subject.call("handler", work)
+        self.subject.call("event_build", leaf, 1000)
+        written = self.subject.dump()
+        pid = os.getpid()
+        assert written == [
+            str(self.directory / f"event_build.{pid}.pstats"),
+            str(self.directory / f"handler.{pid}.pstats"),
+            str(self.directory / f"collapsed.{pid}.txt"),
+        ]
+        stats = pstats.Stats(written[1])
+        assert any(name == "work" for _, _, name in stats.stats)
+        lines = (self.directory / f"collapsed.{pid}.txt").read_text().splitlines()
+        assert any(line.startswith("handler;work (test_profiler.py:") for line in lines)
+        assert any(line.startswith("event_build;leaf (") for line in lines)
+        for line in lines:
+            stack, _, us = line.rpartition(" ")
+            assert int(us) >= 1
+
+    def test_dump_async(self):
+        dumped = threading.Event()
+        with mock.patch.object(self.subject, "dump", side_effect=dumped.set):
+            self.subject.dump_async(10, None)
+            assert dumped.wait(5)
+
+    def test_close(self):
+        self.subject.close()
+        assert os.listdir(self.directory) == []
+        self.subject.call("handler", work)
+        self.subject.close()
+        assert len(os.listdir(self.directory)) == 2
+
+
+def test_drive_close():
+    @types.coroutine
+    def suspend():
+        yield "suspended"
+
+    async def slow():
+        await suspend()
+
+    coroutine = slow()
+    driver = drive(mock.Mock(), coroutine)
+    assert driver.send(None) == "suspended"
+    driver.close()
+    assert coroutine.cr_frame is None
+
+
+def test_collapse():
+    # a -> b -> c, a -> c: c's time is split between its callers
+    a, b, c = ("m.py", 1, "a"), ("m.py", 2, "b"), ("m.py", 3, "c")
+    stats = mock.Mock(
+        stats={
+            a: (1, 1, 0.001, 0.010, {}),
+            b: (1, 1, 0.002, 0.006, {a: (1, 1, 0.002, 0.006)}),
+            c: (
+                2,
+                2,
+                0.008,
+                0.008,
+                {a: (1, 1, 0.002, 0.002), b: (1, 1, 0.004, 0.004)},
+            ),
+        }
+    )
+    assert collapse(stats, "handler") == [
+        "handler;a (m.py:1) 1000",
+        "handler;a (m.py:1);b (m.py:2) 2000",
+        "handler;a (m.py:1);b (m.py:2);c (m.py:3) 4000",
+        "handler;a (m.py:1);c (m.py:3) 2000",
+    ]
+
+
+def test_collapse_recursive():
+    r, a, z = ("m.py", 1, "r"), ("m.py", 2, "a"), ("m.py", 3, "z")
+    stats = mock.Mock(
+        stats={
+            r: (1, 1, 0.001, 0.003, {}),
+            a: (2, 1, 0.001, 0.002, {r: (1, 1, 0.001, 0.002), a: (1, 1, 0, 0.001)}),
+            z: (1, 1, 0.0, 0.0, {r: (1, 1, 0.0, 0.0)}),
+        }
+    )
+    assert collapse(stats, "handler") == [
+        "handler;r (m.py:1) 1000",
+        "handler;r (m.py:1);a (m.py:2) 1000",
+    ]
+
+
+def test_format_frame():
+    assert format_frame(("/a/b/m.py", 3, "f")) == "f (m.py:3)"
+    assert format_frame(("~", 0, "<built-in method a;b>")) == "<built-in method a:b>"
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+from unittest import mock
+
+from lambda_gateway.recorder import Recorder, format_record, get_response_record
+
+
+class TestRecorder:
+    def setup_method(self):
+        self.event = {"version": "2.0", "rawPath": "/"}
+        self.event_json = json.dumps(self.event)
+
+    def test_record(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("lambda_gateway.recorder.MAX_BATCH", 2)
+        path = tmp_path / "traffic.jsonl"
+        subject = Recorder(str(path))
+        assert not subject.running
+        for i in range(3):
+            subject.record(
+                self.event_json, {"statusCode": 200 + i}, 1000.0 + i, 1500000
+            )
+        assert subject.thread.name == "lambda-gateway-recorder"
+        subject.close()
+        assert not subject.running
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert records[0] == {
+            "time": 1000.0,
+            "duration": 1.5,
+            "event": self.event,
+            "response": {"statusCode": 200},
+        }
+        assert [r["response"]["statusCode"] for r in records] == [200, 201, 202]
+        assert subject.recorded == 3
+
+    def test_record_append(self, tmp_path):
+        path = tmp_path / "traffic.jsonl"
+        path.write_text('{"time": 0}\n')
+        subject = Recorder(str(path))
+        subject.record(self.event_json, {"statusCode": 200}, 1.0, 0)
+        subject.close()
+        assert len(path.read_text().splitlines()) == 2
+
+    def test_record_full(self, tmp_path):
+        subject = Recorder(str(tmp_path / "traffic.jsonl"), 1)
+        writing = threading.Event()
+        release = threading.Event()
+        write = os.write
+
+        def slow_write(fd, data):
+            writing.set()
+            release.wait(5)
+            return write(fd, data)
+
+        with mock.patch("os.write", side_effect=slow_write):
+            subject.record(self.event_json, {}, 0.0, 0)
+            writing.wait(5)
+            subject.record(self.event_json, {}, 0.0, 0)
+            subject.record(self.event_json, {}, 0.0, 0)
+            release.set()
+            subject.close()
+        assert subject.recorded == 2
+        assert subject.dropped == 1
+
+    def test_record_error(self, tmp_path):
+        subject = Recorder(str(tmp_path / "traffic.jsonl"))
+        with mock.patch("os.write", side_effect=OSError("disk full")):
+            with mock.patch("lambda_gateway.logger.error") as mock_error:
+                subject.record(self.event_json, {}, 0.0, 0)
+                subject.close()
+        mock_error.assert_called_once()
+        assert subject.recorded == 0
+
+    def test_record_unserializable(self, tmp_path):
+        path = tmp_path / "traffic.jsonl"
+        subject = Recorder(str(path))
+        response = {}
+        response["self"] = response
+        with mock.patch("lambda_gateway.logger.error") as mock_error:
+            subject.record(self.event_json, response, 0.0, 0)
+            for _ in range(500):  # Wait for the writer to fail the first batch
+                if mock_error.called:
+                    break
+                time.sleep(0.01)
+            subject.record(self.event_json, {"statusCode": 200}, 0.0, 0)
+            subject.close()
+        mock_error.assert_called_once()
+        assert subject.recorded == 1
+        assert json.loads(path.read_text())["response"] == {"statusCode": 200}
+
+    def test_close_idle(self, tmp_path):
+        subject = Recorder(str(tmp_path / "traffic.jsonl"))
+        subject.close()
+        assert subject.thread is None
+
+
+def test_format_record():
+    record = {"time": 1.0, "duration": 0.5, "event": '{"a": [1]}', "response": {}}
+    ret = format_record(record)
+    assert ret.endswith("\n")
+    assert json.loads(ret) == {**record, "event": {"a": [1]}}
+
+
+def test_get_response_record():
+    def stream():
+        yield b"a"  # pragma: no cover
+
+    assert get_response_record({"statusCode": 200}) == {"statusCode": 200}
+    assert get_response_record(stream()) == {"statusCode": 200, "body": None}
+    assert get_response_record({"statusCode": 201, "body": stream()}) == {
+        "statusCode": 201,
+        "body": None,
+    }
+    assert get_response_record(None) is None
@@ -0,0 +1,229 @@
+import os
+import sys
+import threading
+from unittest import mock
+
+import pytest
+
+from lambda_gateway.cache import ResponseCache
+from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.reloader import Reloader, discard_bytecode
+from lambda_gateway.routes import RouteTable
+
+EVENT = {"version": "1.0", "httpMethod": "GET", "path": "/"}
+HANDLER = """
+from reloadpkg import util
+
+
+def handler(event, context):
+    return {{"statusCode": 200, "body": util.VALUE + "{body}"}}
+"""
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    root = tmp_path / "reloadpkg"
+    root.mkdir()
+    (root / "__init__.py").write_text("")
+    (root / "util.py").write_text('VALUE = "a"\n')
+    (root / "handlers.py").write_text(HANDLER.format(body="1"))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield root
+    for name in [name for name in sys.modules if name.startswith("reloadpkg")]:
+        del sys.modules[name]
+
+
+def touch(path, source=None):
+    if source is not None:
+        path.write_text(source)
+    mtime = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+class TestReloader:
+    @pytest.fixture(autouse=True)
+    def setup(self, package):
+        self.package = package
+        self.proxy = EventProxy("reloadpkg.handlers.handler", "/")
+        self.proxy.load_handler()
+        self.subject = Reloader(self.proxy)
+        self.subject.mtimes = self.subject.scan()
+        yield
+        self.subject.close()
+        self.proxy.close()
+
+    def invoke(self):
+        return self.proxy.invoke(dict(EVENT))["body"]
+
+    def test_owns(self):
+        assert self.subject.owns("reloadpkg.handlers")
+        assert not self.subject.owns("reloadpkg.util")
+        self.subject.package = True
+        assert self.subject.owns("reloadpkg")
+        assert self.subject.owns("reloadpkg.util")
+        assert not self.subject.owns("reloadpkg_other")
+
+    def test_get_paths(self):
+        assert self.subject.get_paths() == [str(self.package / "handlers.py")]
+        self.subject.package = True
+        assert self.subject.get_paths() == [
+            str(self.package / name)
+            for name in ("__init__.py", "handlers.py", "util.py")
+        ]
+
+    @pytest.mark.parametrize("handler", ["missing.handler", ".handler"])
+    def test_get_paths_missing(self, handler):
+        self.proxy.handler = handler
+        assert self.subject.get_paths() == []
+
+    def test_get_paths_module(self, monkeypatch):
+        self.proxy.handler = "tests.test_runtime.handler"
+        self.subject.package = True
+        monkeypatch.setattr("sys.path", [p for p in sys.path if p != os.path.curdir])
+        paths = self.subject.get_paths()
+        assert os.path.abspath("tests/test_runtime.py") in map(os.path.abspath, paths)
+        assert os.path.curdir in sys.path
+
+    def test_routes(self):
+        (self.package / "other.py").write_text(HANDLER.format(body="x"))
+        self.proxy.routes = RouteTable(
+            {
+                "GET /other": "reloadpkg.other.handler",
+                "GET /util": "reloadpkg.util.missing",
+            }
+        )
+        assert self.subject.owns("reloadpkg.other")
+        assert self.subject.get_paths() == [
+            str(self.package / name) for name in ("handlers.py", "other.py", "util.py")
+        ]
+        self.proxy.load_handler("reloadpkg.other.handler")
+        self.subject.mtimes = self.subject.scan()
+        touch(self.package / "other.py", HANDLER.format(body="y"))
+        assert self.subject.check() is True
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/other"}
+        assert self.proxy.invoke(event)["body"] == "ay"
+        assert "reloadpkg.util.missing" not in self.proxy._handlers
+
+    def test_routes_error(self):
+        (self.package / "other.py").write_text(HANDLER.format(body="x"))
+        self.proxy.routes = RouteTable({"GET /other": "reloadpkg.other.handler"})
+        self.proxy.load_handler("reloadpkg.other.handler")
+        self.subject.mtimes = self.subject.scan()
+        touch(self.package / "handlers.py", HANDLER.format(body="2"))
+        touch(self.package / "other.py", "raise ImportError('boom')\n")
+        assert self.subject.check() is False
+        event = {"version": "1.0", "httpMethod": "GET", "path": "/other"}
+        assert self.invoke() == "a1"
+        assert self.proxy.invoke(event)["body"] == "ax"
+
+    def test_check(self):
+        assert self.invoke() == "a1"
+        assert self.subject.check() is False
+        touch(self.package / "handlers.py", HANDLER.format(body="2"))
+        assert self.subject.check() is True
+        assert self.invoke() == "a2"
+
+    def test_check_package(self):
+        touch(self.package / "util.py", 'VALUE = "b"\n')
+        assert self.subject.check() is False
+        self.subject.package = True
+        self.subject.mtimes = self.subject.scan()
+        touch(self.package / "util.py", 'VALUE = "b"\n')
+        assert self.subject.check() is True
+        assert self.invoke() == "b1"
+
+    def test_check_deleted(self):
+        self.subject.package = True
+        self.subject.mtimes = self.subject.scan()
+        (self.package / "util.py").unlink()
+        with mock.patch.object(self.subject, "reload") as mock_reload:
+            assert self.subject.check() is mock_reload.return_value
+        assert str(self.package / "util.py") not in self.subject.mtimes
+
+    def test_reload_in_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+        old = self.proxy.get_handler()
+
+        def slow(event, context):
+            started.set()
+            release.wait(5)
+            return old(event, context)
+
+        self.proxy._handlers[self.proxy.handler] = slow
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.invoke()))
+        thread.start()
+        started.wait(5)
+        touch(self.package / "handlers.py", HANDLER.format(body="2"))
+        assert self.subject.check() is True
+        assert self.invoke() == "a2"
+        release.set()
+        thread.join()
+        assert results == ["a1"]
+
+    def test_reload_error(self):
+        module = sys.modules["reloadpkg.handlers"]
+        touch(self.package / "handlers.py", "def handler(:\n")
+        with mock.patch("lambda_gateway.logger.error") as mock_error:
+            assert self.subject.check() is False
+        mock_error.assert_called_once()
+        assert sys.modules["reloadpkg.handlers"] is module
+        assert self.invoke() == "a1"
+
+    def test_reload_package_error(self):
+        util = sys.modules["reloadpkg.util"]
+        self.subject.package = True
+        self.subject.mtimes = self.subject.scan()
+        touch(self.package / "util.py", 'VALUE = "b"\n')
+        touch(self.package / "handlers.py", "from reloadpkg import util\n1 / 0\n")
+        assert self.subject.check() is False
+        assert sys.modules["reloadpkg.util"] is util
+        assert self.invoke() == "a1"
+
+    def test_scan_missing(self):
+        missing = str(self.package / "missing.py")
+        with mock.patch.object(self.subject, "get_paths", return_value=[missing]):
+            assert self.subject.scan() == {}
+
+    def test_reload_cache(self):
+        self.proxy.cache = ResponseCache(60)
+        self.proxy.cache.put("key", {"statusCode": 200})
+        assert self.subject.reload() is True
+        assert len(self.proxy.cache) == 0
+
+    def test_reload_environments(self):
+        pool = mock.Mock()
+        self.proxy.pools = {self.proxy.handler: pool}
+        assert self.subject.reload() is True
+        pool.recycle.assert_called_once_with()
+        self.proxy.pools = {}
+
+    def test_start_close(self):
+        self.subject.interval = 0.01
+        self.subject.start()
+        assert self.subject.thread.name == "lambda-gateway-reloader"
+        touch(self.package / "handlers.py", HANDLER.format(body="3"))
+        for _ in range(500):
+            if self.invoke() == "a3":
+                break
+            threading.Event().wait(0.01)
+        assert self.invoke() == "a3"
+        self.subject.close()
+        assert self.subject.thread is None
+
+    def test_start_no_files(self):
+        self.proxy.handler = "missing.handler"
+        with mock.patch("lambda_gateway.logger.warning") as mock_warning:
+            self.subject.start()
+        mock_warning.assert_called_once()
+
+
+def test_discard_bytecode(tmp_path):
+    source = tmp_path / "mod.py"
+    cache = tmp_path / "__pycache__" / f"mod.{sys.implementation.cache_tag}.pyc"
+    cache.parent.mkdir()
+    cache.write_bytes(b"")
+    discard_bytecode(str(source))
+    assert not cache.exists()
+    discard_bytecode(str(source))
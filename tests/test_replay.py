@@ -0,0 +1,173 @@
+import json
+import time
+
+import pytest
+
+from lambda_gateway import events, replay
+from lambda_gateway.event_proxy import EventProxy
+from lambda_gateway.recorder import Recorder
+from lambda_gateway.replay import ReplayClient, Schedule, load_records
+from lambda_gateway.routes import RouteTable
+
+EVENT = {
+    "version": "1.0",
+    "httpMethod": "GET",
+    "path": "/",
+    "headers": {},
+    "queryStringParameters": None,
+    "body": "",
+}
+
+
+def write_records(path, *statuses):
+    with open(path, "w") as jsonl:
+        for i, status in enumerate(statuses):
+            record = {
+                "time": 1000.0 + i * 0.05,
+                "duration": 1.0,
+                "event": EVENT,
+                "response": {"statusCode": status},
+            }
+            jsonl.write(json.dumps(record) + "\n")
+    return str(path)
+
+
+class TestLoadRecords:
+    def test_load_records(self, tmp_path):
+        path = tmp_path / "traffic.jsonl"
+        path.write_text('{"time": 2, "n": 2}\n\n{"time": 1, "n": 1}\n')
+        assert [r["n"] for r in load_records(str(path))] == [1, 2]
+
+    def test_load_records_empty(self, tmp_path):
+        path = tmp_path / "traffic.jsonl"
+        path.write_text("\n")
+        with pytest.raises(ValueError):
+            load_records(str(path))
+
+
+class TestSchedule:
+    def setup_method(self):
+        self.records = [{"time": 10.0}, {"time": 10.1}, {}]
+
+    def test_next(self):
+        subject = Schedule(self.records)
+        subject.begin()
+        assert [subject.next() for _ in range(4)] == [0, 1, 2, None]
+        assert subject.offsets == pytest.approx([0, 0.1, 0])
+
+    def test_next_speed(self):
+        subject = Schedule(self.records, 2)
+        subject.begin()
+        start = time.perf_counter()
+        assert [subject.next() for _ in range(3)] == [0, 1, 2]
+        assert time.perf_counter() - start >= 0.05
+
+
+class TestReplayClient:
+    def test_send(self):
+        subject = ReplayClient("tests.test_runtime.handler")
+        try:
+            assert subject.send({"event": EVENT, "response": {}}, 0) == 200
+            assert subject.send({"event": EVENT}, 1) == 200
+            assert subject.send({"event": EVENT, "response": None}, 2) == 200
+            assert subject.send({"event": EVENT, "response": {"statusCode": 200}}, 3)
+        finally:
+            subject.close()
+        assert subject.mismatches == {"500 -> 200": 3}
+
+    @pytest.mark.parametrize("handler", ["stream_handler", "async_stream_handler"])
+    def test_send_stream(self, handler):
+        subject = ReplayClient(f"tests.test_runtime.{handler}")
+        try:
+            record = {"event": EVENT, "response": {"statusCode": 200, "body": None}}
+            assert subject.send(record, 0) in (200, 201)
+        finally:
+            subject.close()
+
+    def test_send_environment(self):
+        subject = ReplayClient("tests.test_runtime.handler", 3, 1, 1)
+        try:
+            assert subject.send({"event": EVENT, "response": {"statusCode": 200}}, 0)
+            assert subject.proxy.pool.count == 1
+        finally:
+            subject.close()
+        assert subject.mismatches == {}
+
+    def test_send_routes(self):
+        routes = RouteTable(
+            {
+                "GET /": "tests.test_runtime.handler",
+                "GET /fail": "tests.test_runtime.error_handler",
+            }
+        )
+        subject = ReplayClient(None, routes=routes)
+        try:
+            for path, status in [("/", 200), ("/fail", 502), ("/other", 404)]:
+                event = {**EVENT, "path": path}
+                record = {"event": event, "response": {"statusCode": status}}
+                assert subject.send(record, 0) == status
+        finally:
+            subject.close()
+        assert subject.mismatches == {}
+        assert subject.proxy.get_signatures(loaded=True) == [
+            "tests.test_runtime.handler",
+            "tests.test_runtime.error_handler",
+        ]
+
+
+@pytest.mark.parametrize("as_json", [True, False])
+def test_main(capsys, tmp_path, as_json):
+    path = write_records(tmp_path / "traffic.jsonl", 200, 200, 404)
+    argv = ["-c", "2", "-s", "10", path, "tests.test_runtime.handler"]
+    replay.main(argv + (["--json"] if as_json else []))
+    out = capsys.readouterr().out
+    if as_json:
+        summary = json.loads(out)
+        assert summary["statuses"] == {"200": 3}
+        assert summary["mismatches"] == {"404 -> 200": 1}
+    else:
+        assert "Requests:    3 in " in out
+        assert "Mismatches:  404 -> 200: 1" in out
+
+
+def test_main_routes(capsys, tmp_path):
+    path = write_records(tmp_path / "traffic.jsonl", 200, 404)
+    routes = tmp_path / "routes.json"
+    routes.write_text('{"GET /": "tests.test_runtime.error_handler"}')
+    replay.main(["--json", "--routes", str(routes), path, "tests.test_runtime.handler"])
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["statuses"] == {"502": 2}
+    assert summary["mismatches"] == {"200 -> 502": 1, "404 -> 502": 1}
+
+
+def test_main_no_handler(capsys, tmp_path):
+    with pytest.raises(SystemExit):
+        replay.main([str(tmp_path / "traffic.jsonl")])
+    assert "a HANDLER or --routes is required" in capsys.readouterr().err
+
+
+def test_main_error(tmp_path):
+    with pytest.raises(SystemExit) as err:
+        replay.main([str(tmp_path / "missing.jsonl"), "tests.test_runtime.handler"])
+    assert "lambda-gateway replay: error:" in str(err.value)
+
+
+def test_record_replay(capsys, tmp_path):
+    path = str(tmp_path / "traffic.jsonl")
+    with EventProxy(
+        "tests.test_runtime.handler", "/", recorder=Recorder(path)
+    ) as proxy:
+        for i in range(3):
+            event = events.get_event_v2("GET", f"/items/{i}?q=1", {"X-A": "1"}, "")
+            proxy.invoke(event)
+    records = load_records(path)
+    assert [r["event"]["rawPath"] for r in records] == [
+        "/items/0",
+        "/items/1",
+        "/items/2",
+    ]
+    assert records[0]["event"]["queryStringParameters"] == {"q": "1"}
+    replay.main(["--json", path, "tests.test_runtime.handler"])
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["statuses"] == {"200": 3}
+    assert summary["mismatches"] == {}
@@ -0,0 +1,93 @@
+from unittest import mock
+
+import pytest
+
+from lambda_gateway import report
+from lambda_gateway.report import Report
+
+
+class TestPeakRss:
+    def test_get_peak_rss(self):
+        report.reset_peak_rss()
+        before = report.get_peak_rss()
+        hog = bytearray(64 * 1024 * 1024)
+        hog[::4096] = b"x" * (len(hog) // 4096)
+        assert report.get_peak_rss() >= before + len(hog) // 2
+
+    def test_get_peak_rss_no_proc(self, monkeypatch):
+        def no_proc(*args, **kwargs):
+            raise OSError("No such file or directory")
+
+        monkeypatch.setattr("builtins.open", no_proc)
+        report.reset_peak_rss()
+        assert report.get_peak_rss() > 0
+        monkeypatch.setattr("sys.platform", "darwin")
+        assert report.get_peak_rss() > 0
+        monkeypatch.setattr("lambda_gateway.report.resource", None)
+        assert report.get_peak_rss() is None
+
+
+class TestReport:
+    def setup_method(self):
+        self.subject = Report("abc-123", 256)
+
+    @pytest.mark.parametrize(
+        ("duration_ns", "exp"),
+        [
+            (None, 1),
+            (100, 1),
+            (1_000_000, 1),
+            (1_000_001, 2),
+            (12_345_678, 13),
+        ],
+    )
+    def test_billed_duration_ms(self, duration_ns, exp):
+        self.subject.duration_ns = duration_ns
+        assert self.subject.billed_duration_ms == exp
+
+    def test_format(self):
+        self.subject.duration_ns = 12_345_678
+        self.subject.max_memory = 50 * report.MB + 1
+        assert self.subject.format() == (
+            "REPORT RequestId: abc-123\t"
+            "Duration: 12.35 ms\t"
+            "Billed Duration: 13 ms\t"
+            "Memory Size: 256 MB\t"
+            "Max Memory Used: 50 MB"
+        )
+
+    def test_format_init_error(self):
+        self.subject.duration_ns = 3_000_000_000
+        self.subject.init_duration_ns = 123_456_789
+        self.subject.max_memory = 256 * report.MB
+        self.subject.fail("error", "Runtime.OutOfMemory")
+        assert self.subject.format().endswith(
+            "\tMax Memory Used: 256 MB"
+            "\tInit Duration: 123.46 ms"
+            "\tStatus: error"
+            "\tError Type: Runtime.OutOfMemory"
+        )
+
+    def test_format_timeout(self):
+        self.subject.fail("timeout")
+        assert self.subject.format().endswith("\tStatus: timeout")
+
+    def test_format_no_memory(self):
+        self.subject.init_duration_ns = 1e6
+        with mock.patch("lambda_gateway.report.get_peak_rss") as mock_peak:
+            assert self.subject.format().endswith(
+                "\tMemory Size: 256 MB\tInit Duration: 1.00 ms"
+            )
+        mock_peak.assert_not_called()
+
+    @mock.patch("lambda_gateway.logger.info")
+    def test_start_end(self, mock_info):
+        self.subject.duration_ns = 1
+        self.subject.max_memory = 0
+        self.subject.start()
+        self.subject.end()
+        assert mock_info.call_args_list == [
+            mock.call("START RequestId: %s Version: %s", "abc-123", "$LATEST"),
+            mock.call("END RequestId: %s", "abc-123"),
+            mock.call(self.subject.format()),
+        ]
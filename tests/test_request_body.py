@@ -0,0 +1,142 @@
+import asyncio
+import io
+from unittest import mock
+
+import pytest
+
+from lambda_gateway import request_body
+
+BODIES = [
+    ({}, b"", b""),
+    ({"Content-Length": "3"}, b"foo", b"foo"),
+    ({"Content-Length": "3"}, b"foobar", b"foo"),
+    (
+        {"Transfer-Encoding": "chunked"},
+        b"3\r\nfoo\r\n3;ext=1\r\nbar\r\n0\r\n\r\n",
+        b"foobar",
+    ),
+    (
+        {"Transfer-Encoding": "gzip, chunked"},
+        b"a\r\n0123456789\r\n0\r\nX-Trailer: 1\r\n\r\n",
+        b"0123456789",
+    ),
+]
+
+ERRORS = [
+    ({"Content-Length": "x"}, b"", request_body.RequestBodyError),
+    ({"Content-Length": "-1"}, b"", request_body.RequestBodyError),
+    ({"Content-Length": "11"}, b"x" * 11, request_body.PayloadTooLarge),
+    ({"Content-Length": "5"}, b"foo", request_body.RequestBodyError),
+    ({"Transfer-Encoding": "gzip"}, b"", request_body.UnsupportedTransferEncoding),
+    ({"Transfer-Encoding": "chunked"}, b"z\r\n", request_body.RequestBodyError),
+    ({"Transfer-Encoding": "chunked"}, b"-1\r\n", request_body.RequestBodyError),
+    ({"Transfer-Encoding": "chunked"}, b"3", request_body.RequestBodyError),
+    ({"Transfer-Encoding": "chunked"}, b"3\r\nfooXX", request_body.RequestBodyError),
+    (
+        {"Transfer-Encoding": "chunked"},
+        b"6\r\nfoobar\r\n6\r\nfoobar\r\n0\r\n\r\n",
+        request_body.PayloadTooLarge,
+    ),
+]
+
+
+def read_async(data, headers, *args):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await request_body.read_body_async(reader, headers, *args)
+
+    return asyncio.run(read())
+
+
+@pytest.mark.parametrize(("headers", "data", "exp"), BODIES)
+def test_read_body(headers, data, exp):
+    assert request_body.read_body(io.BytesIO(data), headers, 10) == exp
+
+
+@pytest.mark.parametrize(("headers", "data", "exp"), BODIES)
+def test_read_body_async(headers, data, exp):
+    assert read_async(data, headers, 10) == exp
+
+
+@pytest.mark.parametrize(("headers", "data", "exp"), ERRORS)
+def test_read_body_error(headers, data, exp):
+    with pytest.raises(exp):
+        request_body.read_body(io.BytesIO(data), headers, 10)
+
+
+@pytest.mark.parametrize(("headers", "data", "exp"), ERRORS)
+def test_read_body_async_error(headers, data, exp):
+    with pytest.raises(exp):
+        read_async(data, headers, 10)
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {"Content-Length": str(request_body.BLOCK_SIZE + 1)},
+        {"Transfer-Encoding": "chunked"},
+    ],
+)
+def test_read_body_blocks(headers):
+    data = b"x" * (request_body.BLOCK_SIZE + 1)
+    if "Transfer-Encoding" in headers:
+        payload = b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data)
+    else:
+        payload = data
+    rfile = mock.Mock(wraps=io.BytesIO(payload))
+    assert request_body.read_body(rfile, headers, 0) == data
+    assert rfile.read.call_args_list[:2] == [
+        mock.call(request_body.BLOCK_SIZE),
+        mock.call(1),
+    ]
+    assert read_async(payload, headers, 0) == data
+
+
+def test_read_body_async_long_line():
+    with pytest.raises(request_body.RequestBodyError):
+        read_async(b"0" * 70000 + b"\r\n", {"Transfer-Encoding": "chunked"}, 10)
+
+
+@pytest.mark.parametrize(
+    ("content_type", "exp"),
+    [
+        ("text/html; charset=utf-8", True),
+        ("application/json", True),
+        ("application/vnd.api+json", True),
+        ("application/atom+xml", True),
+        ("application/x-www-form-urlencoded", True),
+        ("application/octet-stream", False),
+        ("image/png", False),
+    ],
+)
+def test_is_text(content_type, exp):
+    assert request_body.is_text(content_type) is exp
+
+
+@pytest.mark.parametrize(
+    ("data", "content_type", "exp"),
+    [
+        (b"", None, ("", False)),
+        (b"fizz", None, ("fizz", False)),
+        (b"\xff\xfe", None, ("//4=", True)),
+        (b"fizz", "text/plain", ("fizz", False)),
+        (b"\xff\xfe", "text/plain", ("//4=", True)),
+        (b"fizz", "application/octet-stream", ("Zml6eg==", True)),
+    ],
+)
+def test_encode_body(data, content_type, exp):
+    assert request_body.encode_body(data, content_type) == exp
+
+
+@pytest.mark.parametrize(
+    ("status", "exc"),
+    [
+        (400, request_body.RequestBodyError),
+        (413, request_body.PayloadTooLarge),
+        (501, request_body.UnsupportedTransferEncoding),
+    ],
+)
+def test_status(status, exc):
+    assert exc.status == status
@@ -1,19 +1,34 @@
+import gzip
 import io
 import json
+import socket
+import threading
+import time
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from unittest import mock
 from unittest.mock import Mock
 from unittest.mock import call
 from urllib.parse import urlencode
 
 import pytest
 
+from lambda_gateway import metrics, request_body, responses
+from lambda_gateway.access_log import AccessLog
+from lambda_gateway.profiler import Profiler
 from lambda_gateway.event_proxy import EventProxy
 from lambda_gateway.request_handler import LambdaRequestHandler
+from lambda_gateway.routes import Route
+from lambda_gateway.server import PooledHTTPServer
+
+ROUTE = Route("$default", None, None, "index.handler", ())
 
 
 class TestLambdaRequestHandler:
     def setup_method(self):
         self.subject = Mock(LambdaRequestHandler)
         self.subject.proxy = Mock(EventProxy)
+        self.subject.proxy.route.return_value = ROUTE
         self.subject.version = "2.0"
         self.subject.get_event_v1 = lambda x: LambdaRequestHandler.get_event_v1(
             self.subject, x
@@ -21,6 +36,30 @@ class TestLambdaRequestHandler:
         self.subject.get_event_v2 = lambda x: LambdaRequestHandler.get_event_v2(
             self.subject, x
         )
+        self.subject.send_result = lambda *args: (
+            LambdaRequestHandler.send_result(self.subject, *args)
+        )
+        self.subject.max_body_size = request_body.MAX_BODY_SIZE
+        self.subject.min_compression_size = None
+        self.subject.metrics_path = None
+        self.subject.is_metrics_request = lambda x: (
+            LambdaRequestHandler.is_metrics_request(self.subject, x)
+        )
+        self.subject.profiler = None
+        self.subject.profile = lambda *args: (
+            LambdaRequestHandler.profile(self.subject, *args)
+        )
+        self.subject.wfile = Mock()
+        self.subject.send_connection_header = lambda: (
+            LambdaRequestHandler.send_connection_header(self.subject)
+        )
+        self.subject.max_requests = None
+        self.subject.requests_handled = 0
+        self.subject.close_connection = False
+        self.subject.requestline = "GET / HTTP/1.1"
+        self.subject.address_string.return_value = "127.0.0.1"
+        self.subject.started = None
+        self.subject.request_version = "HTTP/1.1"
 
     def set_request(self, verb, path="/", version="2.0", **params):
         rawPath = path
@@ -40,6 +79,7 @@ class TestLambdaRequestHandler:
         req = {
             "version": version,
             "body": body,
+            "isBase64Encoded": False,
             "headers": headers,
             "queryStringParameters": params,
         }
@@ -90,7 +130,87 @@ class TestLambdaRequestHandler:
     def test_get_body(self, verb):
         req = self.set_request(verb)
         ret = LambdaRequestHandler.get_body(self.subject)
-        assert ret == req["body"]
+        assert ret == (req["body"], False)
+
+    def test_get_body_chunked(self):
+        self.subject.headers = {"Transfer-Encoding": "chunked"}
+        self.subject.rfile = io.BytesIO(b"3\r\nfoo\r\n3;ext=1\r\nbar\r\n0\r\n\r\n")
+        assert LambdaRequestHandler.get_body(self.subject) == ("foobar", False)
+
+    @pytest.mark.parametrize(
+        ("content_type", "data", "exp"),
+        [
+            ("application/json", b'{"a": 1}', ('{"a": 1}', False)),
+            ("image/png", b"\x89PNG", ("iVBORw==", True)),
+            ("text/plain", b"\xff", ("/w==", True)),
+        ],
+    )
+    def test_get_body_binary(self, content_type, data, exp):
+        self.subject.headers = {
+            "Content-Type": content_type,
+            "Content-Length": len(data),
+        }
+        self.subject.rfile = io.BytesIO(data)
+        assert LambdaRequestHandler.get_body(self.subject) == exp
+
+    @pytest.mark.parametrize(
+        ("headers", "status"),
+        [
+            ({"Content-Length": 11}, 413),
+            ({"Transfer-Encoding": "gzip"}, 501),
+        ],
+    )
+    def test_invoke_body_error(self, headers, status):
+        self.subject.max_body_size = 10
+        self.subject.headers = headers
+        self.subject.rfile = io.BytesIO(b"x" * 11)
+        self.subject.get_event = lambda x: LambdaRequestHandler.get_event(
+            self.subject, x
+        )
+        self.subject.get_body = lambda: LambdaRequestHandler.get_body(self.subject)
+        LambdaRequestHandler.invoke(self.subject, "POST")
+        self.subject.proxy.respond.assert_not_called()
+        self.subject.send_response.assert_called_once_with(status)
+        self.subject.send_header.assert_any_call("Connection", "close")
+        assert self.subject.close_connection
+
+    @pytest.mark.parametrize(
+        ("length", "exp"),
+        [(10, True), (11, False)],
+    )
+    def test_handle_expect_100(self, length, exp):
+        self.subject.max_body_size = 10
+        self.subject.command = "POST"
+        self.subject.headers = {"Content-Length": length}
+        self.subject.request_version = "HTTP/1.1"
+        self.subject.responses = LambdaRequestHandler.responses
+        ret = LambdaRequestHandler.handle_expect_100(self.subject)
+        assert ret is exp
+        if exp:
+            self.subject.send_response_only.assert_called_once_with(100)
+        else:
+            self.subject.send_response.assert_called_once_with(413)
+
+    def test_set_max_body_size(self):
+        try:
+            LambdaRequestHandler.set_max_body_size(10)
+            assert LambdaRequestHandler.max_body_size == 10
+        finally:
+            LambdaRequestHandler.set_max_body_size(request_body.MAX_BODY_SIZE)
+
+    def test_set_compression(self):
+        try:
+            LambdaRequestHandler.set_compression(1024)
+            assert LambdaRequestHandler.min_compression_size == 1024
+        finally:
+            LambdaRequestHandler.set_compression(None)
+
+    def test_set_metrics(self):
+        try:
+            LambdaRequestHandler.set_metrics("/metrics")
+            assert LambdaRequestHandler.metrics_path == "/metrics"
+        finally:
+            LambdaRequestHandler.set_metrics(None)
 
     @pytest.mark.parametrize(
         ("verb", "path", "version", "params"),
@@ -106,7 +226,7 @@ class TestLambdaRequestHandler:
     def test_get_event(self, verb, path, version, params):
         exp = self.set_request(verb, path, version, **params)
         self.subject.version = version
-        self.subject.get_body.return_value = exp["body"]
+        self.subject.get_body.return_value = (exp["body"], False)
         ret = LambdaRequestHandler.get_event(self.subject, verb)
         assert ret == exp
 
@@ -124,22 +244,392 @@ class TestLambdaRequestHandler:
     def test_invoke(self, verb, path, version, params):
         req = self.set_request(verb, path, version, **params)
         self.subject.get_event.return_value = req
-        self.subject.proxy.invoke.return_value = {
+        self.subject.proxy.respond.return_value = {
             "body": "OK",
             "statusCode": 200,
             "headers": {
                 "Content-Length": 2,
                 "Content-Type": "application/json",
             },
-        }
+        }, True
         LambdaRequestHandler.invoke(self.subject, verb)
-        self.subject.proxy.invoke.assert_called_once_with(req)
+        (event,), kwargs = self.subject.proxy.respond.call_args
+        assert event == req
+        (client, requestline, status, latency, request_id), _ = (
+            self.subject.access_log.log.call_args
+        )
+        assert (client, requestline, status) == ("127.0.0.1", "GET / HTTP/1.1", 200)
+        assert latency > 0
+        assert request_id == kwargs["request_id"]
+        assert self.subject.started is None
         self.subject.send_response.assert_called_once_with(200)
         self.subject.send_header.assert_has_calls(
             [
                 call("Content-Length", 2),
                 call("Content-Type", "application/json"),
+                call(responses.REQUEST_ID_HEADER, kwargs["request_id"]),
             ]
         )
         self.subject.end_headers.assert_called_once_with()
-        self.subject.wfile.write.assert_called_once_with("OK".encode())
+        if verb == "HEAD":
+            self.subject.wfile.write.assert_not_called()
+        else:
+            self.subject.wfile.write.assert_called_once_with("OK".encode())
+
+    def test_invoke_content_length(self):
+        self.subject.get_event.return_value = self.set_request("GET")
+        self.subject.proxy.respond.return_value = {
+            "body": "héllo",
+            "statusCode": 200,
+            "headers": {
+                "content-length": 1,
+                "Connection": "upgrade",
+                "Transfer-Encoding": "chunked",
+                "Content-Type": "text/plain",
+            },
+        }, True
+        LambdaRequestHandler.invoke(self.subject, "GET")
+        request_id = self.subject.proxy.respond.call_args.kwargs["request_id"]
+        assert self.subject.send_header.call_args_list == [
+            call("Content-Length", 6),
+            call("Content-Type", "text/plain"),
+            call(responses.REQUEST_ID_HEADER, request_id),
+        ]
+        self.subject.wfile.write.assert_called_once_with("héllo".encode())
+
+    def test_invoke_compressed(self):
+        self.subject.get_event.return_value = self.set_request("GET")
+        self.subject.headers = {"Accept-Encoding": "gzip"}
+        self.subject.min_compression_size = 10
+        self.subject.proxy.respond.return_value = {
+            "body": "fizz buzz " * 10,
+            "statusCode": 200,
+            "headers": {"Content-Type": "text/plain"},
+        }, True
+        LambdaRequestHandler.invoke(self.subject, "GET")
+        (body,), _ = self.subject.wfile.write.call_args
+        assert gzip.decompress(body) == b"fizz buzz " * 10
+        request_id = self.subject.proxy.respond.call_args.kwargs["request_id"]
+        assert self.subject.send_header.call_args_list == [
+            call("Content-Length", len(body)),
+            call("Content-Type", "text/plain"),
+            call("Vary", "Accept-Encoding"),
+            call("Content-Encoding", "gzip"),
+            call(responses.REQUEST_ID_HEADER, request_id),
+        ]
+
+    @pytest.mark.parametrize(
+        ("version", "exp_body", "exp_close"),
+        [
+            ("HTTP/1.1", [b"4\r\nfizz\r\n", b"4\r\nbuzz\r\n", b"0\r\n\r\n"], False),
+            ("HTTP/1.0", [b"fizz", b"buzz"], True),
+        ],
+    )
+    def test_invoke_stream(self, version, exp_body, exp_close):
+        self.subject.get_event.return_value = self.set_request("GET")
+        self.subject.request_version = version
+        self.subject.proxy.respond.return_value = {
+            "statusCode": 200,
+            "headers": {"Content-Type": "text/plain"},
+            "body": (chunk for chunk in ["fizz", "buzz"]),
+        }, True
+        self.subject.proxy.iter_stream = iter
+        self.subject.send_stream = lambda *args: (
+            LambdaRequestHandler.send_stream(self.subject, *args)
+        )
+        LambdaRequestHandler.invoke(self.subject, "GET")
+        assert self.subject.wfile.write.call_args_list == [call(x) for x in exp_body]
+        assert self.subject.close_connection is exp_close
+        headers = [x.args for x in self.subject.send_header.call_args_list]
+        assert ("Content-Type", "text/plain") in headers
+        assert (("Transfer-Encoding", "chunked") in headers) is not exp_close
+        assert (("Connection", "close") in headers) is exp_close
+
+    def test_send_stream_error(self):
+        def stream():
+            yield b"fizz"
+            raise RuntimeError("boom")
+
+        self.subject.proxy.iter_stream = iter
+        LambdaRequestHandler.send_stream(self.subject, stream())
+        self.subject.wfile.write.assert_called_once_with(b"4\r\nfizz\r\n")
+        assert self.subject.close_connection is True
+
+    def test_invoke_empty(self):
+        self.subject.get_event.return_value = self.set_request("DELETE")
+        self.subject.proxy.respond.return_value = {}, True
+        LambdaRequestHandler.invoke(self.subject, "DELETE")
+        self.subject.send_response.assert_called_once_with(500)
+        request_id = self.subject.proxy.respond.call_args.kwargs["request_id"]
+        assert self.subject.send_header.call_args_list == [
+            call("Content-Length", 0),
+            call(responses.REQUEST_ID_HEADER, request_id),
+        ]
+
+    def test_invoke_not_invoked(self):
+        self.subject.get_event.return_value = self.set_request("GET")
+        self.subject.proxy.respond.return_value = {"statusCode": 404}, False
+        LambdaRequestHandler.invoke(self.subject, "GET")
+        self.subject.send_response.assert_called_once_with(404)
+        assert self.subject.send_header.call_args_list == [call("Content-Length", 0)]
+
+    @pytest.mark.parametrize(
+        ("max_requests", "handled", "close", "version", "exp"),
+        [
+            (None, 0, False, "HTTP/1.1", []),
+            (3, 1, False, "HTTP/1.1", []),
+            (3, 2, False, "HTTP/1.1", [call("Connection", "close")]),
+            (None, 0, False, "HTTP/1.0", [call("Connection", "keep-alive")]),
+            (None, 0, True, "HTTP/1.0", [call("Connection", "close")]),
+            (None, 0, True, "HTTP/1.1", [call("Connection", "close")]),
+        ],
+    )
+    def test_send_connection_header(self, max_requests, handled, close, version, exp):
+        self.subject.max_requests = max_requests
+        self.subject.requests_handled = handled
+        self.subject.close_connection = close
+        self.subject.request_version = version
+        LambdaRequestHandler.send_connection_header(self.subject)
+        assert self.subject.requests_handled == handled + 1
+        assert self.subject.send_header.call_args_list == exp
+
+    @pytest.mark.parametrize(
+        ("timeout", "max_requests", "exp_timeout", "exp_max_requests"),
+        [
+            (5, 100, 5, 100),
+            (0, 100, None, 1),
+        ],
+    )
+    def test_set_keep_alive(self, timeout, max_requests, exp_timeout, exp_max_requests):
+        try:
+            LambdaRequestHandler.set_keep_alive(timeout, max_requests)
+            assert LambdaRequestHandler.timeout == exp_timeout
+            assert LambdaRequestHandler.max_requests == exp_max_requests
+        finally:
+            LambdaRequestHandler.set_keep_alive(5, 1000)
+
+    @pytest.mark.parametrize(("handled", "logged"), [(0, True), (1, False)])
+    def test_log_error(self, handled, logged):
+        self.subject.requests_handled = handled
+        LambdaRequestHandler.log_error(self.subject, "Request timed out: %r", None)
+        assert self.subject.log_message.called is logged
+
+    @pytest.mark.parametrize(("started", "logged"), [(None, True), (1.0, False)])
+    def test_log_request(self, started, logged):
+        self.subject.started = started
+        LambdaRequestHandler.log_request(self.subject, 400)
+        assert self.subject.access_log.log.called is logged
+        if logged:
+            self.subject.access_log.log.assert_called_once_with(
+                "127.0.0.1", "GET / HTTP/1.1", 400
+            )
+
+    def test_log_message(self):
+        with mock.patch("lambda_gateway.logger.error") as mock_error:
+            LambdaRequestHandler.log_message(self.subject, "code %d", 400)
+        mock_error.assert_called_once_with("%s - code %d", "127.0.0.1", 400)
+
+
+class TestLambdaRequestHandlerServer:
+    def setup_method(self):
+        self.proxy = Mock(EventProxy)
+        self.proxy.route.return_value = ROUTE
+        self.proxy.respond.return_value = {"statusCode": 200, "body": "OK"}, True
+        LambdaRequestHandler.set_proxy(self.proxy, "2.0")
+        LambdaRequestHandler.set_keep_alive(5, 2)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), LambdaRequestHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.start()
+
+    def teardown_method(self):
+        LambdaRequestHandler.set_keep_alive(5, 1000)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def test_keep_alive(self):
+        conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+        socks = []
+        for verb in ["GET", "HEAD", "GET"]:
+            conn.request(verb, "/")
+            socks.append(conn.sock)
+            res = conn.getresponse()
+            assert res.status == 200
+            assert res.read() == (b"" if verb == "HEAD" else b"OK")
+        # max_requests=2 closes the first connection after the HEAD request
+        assert socks[0] is socks[1]
+        assert socks[1] is not socks[2]
+        conn.close()
+
+    def test_access_log(self):
+        log = Mock(AccessLog)
+        LambdaRequestHandler.set_access_log(log)
+        try:
+            conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+            conn.request("GET", "/fizz")
+            assert conn.getresponse().read() == b"OK"
+            conn.close()
+            with socket.create_connection(self.httpd.server_address) as sock:
+                sock.sendall(b"BAD / HTTP/1.1\r\n\r\n")
+                assert sock.recv(1024).startswith(b"HTTP/1.1 501")
+            # The access log line is written after the response
+            deadline = time.monotonic() + 5
+            while log.log.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            LambdaRequestHandler.set_access_log(AccessLog())
+        # Either request may be logged first
+        first, second = sorted(
+            (call.args for call in log.log.call_args_list), key=len, reverse=True
+        )
+        client, requestline, status, latency, request_id = first
+        assert (client, requestline, status) == ("127.0.0.1", "GET /fizz HTTP/1.1", 200)
+        assert latency > 0
+        assert request_id == self.proxy.respond.call_args.kwargs["request_id"]
+        assert second == ("127.0.0.1", "BAD / HTTP/1.1", 501)
+
+    def test_metrics(self):
+        LambdaRequestHandler.set_metrics("/metrics")
+        try:
+            conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+            conn.request("GET", "/")
+            assert conn.getresponse().read() == b"OK"
+            conn.request("GET", "/metrics?x=1")
+            res = conn.getresponse()
+            body = res.read().decode()
+            conn.close()
+        finally:
+            LambdaRequestHandler.set_metrics(None)
+        assert res.status == 200
+        assert res.getheader("Content-Type") == metrics.CONTENT_TYPE
+        assert 'lambda_gateway_requests_total{method="GET",route="$default",' in body
+        assert (
+            'lambda_gateway_phase_duration_seconds_count{phase="event_build"}' in body
+        )
+        assert self.proxy.respond.call_count == 1
+
+    def test_route(self):
+        route = Route("GET /items/{id}", "GET", "/items/{id}", "app.get_item", ("id",))
+        self.proxy.route.return_value = route
+        key = ("GET", route.key, 200)
+        count = metrics.REQUESTS.collect().get(key, 0)
+        conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+        conn.request("GET", "/items/1")
+        assert conn.getresponse().read() == b"OK"
+        conn.close()
+        (event,) = self.proxy.route.call_args.args
+        assert self.proxy.respond.call_args.args == (event,)
+        assert self.proxy.respond.call_args.kwargs["route"] is route
+        # The request is counted after its response is sent
+        for _ in range(100):
+            if metrics.REQUESTS.collect().get(key, 0) == count + 1:
+                break
+            time.sleep(0.01)
+        assert metrics.REQUESTS.collect()[key] == count + 1
+
+    def test_profile(self, tmp_path):
+        profiler = Profiler(str(tmp_path))
+        LambdaRequestHandler.set_profiler(profiler)
+        LambdaRequestHandler.set_metrics("/metrics")
+        conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+        try:
+            conn.request("GET", "/")
+            assert conn.getresponse().read() == b"OK"
+            # Scrapes build no event, but their body is drained
+            conn.request("GET", "/metrics", "x")
+            assert conn.getresponse().status == 200
+        finally:
+            LambdaRequestHandler.set_profiler(None)
+            LambdaRequestHandler.set_metrics(None)
+        # Requests on a connection are handled in turn, so once the next one
+        # is answered the first one's profiles have been added
+        conn.request("GET", "/")
+        assert conn.getresponse().read() == b"OK"
+        conn.close()
+        assert LambdaRequestHandler.profiler is None
+        assert profiler.samples["event_build"] == 1
+        assert profiler.samples["response_write"] == 1
+
+    def test_chunked(self):
+        conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+        conn.request("POST", "/", iter([b"foo", b"bar"]), encode_chunked=True)
+        assert conn.getresponse().read() == b"OK"
+        conn.request("GET", "/")
+        assert conn.getresponse().read() == b"OK"
+        conn.close()
+        (event,), _ = self.proxy.respond.call_args_list[0]
+        assert event["body"] == "foobar"
+
+    def test_stream(self):
+        self.proxy.respond.return_value = iter([b"fizz", b"buzz"]), True
+        self.proxy.iter_stream = iter
+        conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+        conn.request("GET", "/")
+        res = conn.getresponse()
+        assert res.getheader("Transfer-Encoding") == "chunked"
+        assert res.read() == b"fizzbuzz"
+        # connection is reused; the iterator is exhausted so the body is empty
+        conn.request("GET", "/")
+        assert conn.getresponse().read() == b""
+        conn.close()
+
+
+class TestLambdaRequestHandlerPool:
+    def setup_method(self):
+        self.proxy = Mock(EventProxy)
+        self.proxy.route.return_value = ROUTE
+        self.proxy.respond.return_value = {"statusCode": 200, "body": "OK"}, True
+        LambdaRequestHandler.set_proxy(self.proxy, "2.0")
+        LambdaRequestHandler.set_keep_alive(5, 1000)
+        self.httpd = PooledHTTPServer(("127.0.0.1", 0), LambdaRequestHandler, 1, 4)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.start()
+
+    def teardown_method(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def test_keep_alive(self):
+        conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+        socks = []
+        for _ in range(2):
+            conn.request("GET", "/")
+            socks.append(conn.sock)
+            assert conn.getresponse().read() == b"OK"
+        assert socks[0] is socks[1]
+        conn.close()
+
+    def test_pipelined(self):
+        with socket.create_connection(self.httpd.server_address) as sock:
+            sock.sendall(b"GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\n\r\n")
+            data = b""
+            while data.count(b"HTTP/1.1 200") < 2:
+                data += sock.recv(4096)
+        assert self.proxy.respond.call_count == 2
+
+    def test_idle_released(self):
+        idle = HTTPConnection(*self.httpd.server_address, timeout=5)
+        idle.request("GET", "/")
+        assert idle.getresponse().read() == b"OK"
+        # The only worker is now waiting on the idle connection
+        start = time.monotonic()
+        conn = HTTPConnection(*self.httpd.server_address, timeout=5)
+        conn.request("GET", "/")
+        assert conn.getresponse().read() == b"OK"
+        conn.close()
+        assert time.monotonic() - start < 2
+        assert idle.sock.recv(1) == b""
+        idle.close()
+
+    def test_idle_timeout(self):
+        LambdaRequestHandler.set_keep_alive(0.1, 1000)
+        try:
+            with socket.create_connection(self.httpd.server_address) as sock:
+                sock.sendall(b"GET / HTTP/1.1\r\n\r\n")
+                data = b""
+                while not data.endswith(b"OK"):
+                    data += sock.recv(4096)
+                assert sock.recv(1) == b""
+        finally:
+            LambdaRequestHandler.set_keep_alive(5, 1000)
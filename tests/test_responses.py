@@ -0,0 +1,233 @@
+import asyncio
+import gzip
+
+import pytest
+
+from lambda_gateway import responses
+
+
+@pytest.mark.parametrize(
+    ("verb", "status", "exp"),
+    [
+        ("GET", 200, True),
+        ("GET", 404, True),
+        ("HEAD", 200, False),
+        ("GET", 101, False),
+        ("GET", 204, False),
+        ("GET", 304, False),
+    ],
+)
+def test_has_body(verb, status, exp):
+    assert responses.has_body(verb, status) is exp
+
+
+@pytest.mark.parametrize(
+    ("verb", "result", "exp"),
+    [
+        (
+            "GET",
+            {
+                "statusCode": 200,
+                "body": "héllo",
+                "headers": {
+                    "content-length": 1,
+                    "Connection": "upgrade",
+                    "Keep-Alive": "timeout=1",
+                    "Transfer-Encoding": "chunked",
+                    "Content-Type": "text/plain",
+                },
+            },
+            (
+                200,
+                [("Content-Length", 6), ("Content-Type", "text/plain")],
+                "héllo".encode(),
+            ),
+        ),
+        (
+            "HEAD",
+            {"statusCode": 200, "body": "OK"},
+            (200, [("Content-Length", 2)], b""),
+        ),
+        (
+            "GET",
+            {},
+            (500, [("Content-Length", 0)], b""),
+        ),
+        (
+            "DELETE",
+            {"statusCode": 204, "body": "ignored"},
+            (204, [], b""),
+        ),
+        (
+            "GET",
+            {"statusCode": 103, "headers": {"Link": "</a.css>"}},
+            (103, [("Link", "</a.css>")], b""),
+        ),
+        (
+            "GET",
+            {"statusCode": 304},
+            (304, [("Content-Length", 0)], b""),
+        ),
+        (
+            "GET",
+            {"statusCode": 200, "body": b"\x89PNG"},
+            (200, [("Content-Length", 4)], b"\x89PNG"),
+        ),
+        (
+            "GET",
+            {
+                "statusCode": 200,
+                "body": "iVBORw==",
+                "isBase64Encoded": True,
+                "headers": {"Content-Type": "image/png"},
+            },
+            (
+                200,
+                [("Content-Length", 4), ("Content-Type", "image/png")],
+                b"\x89PNG",
+            ),
+        ),
+        (
+            "GET",
+            {"statusCode": 200, "body": "not base64!", "isBase64Encoded": True},
+            (
+                502,
+                [("Content-Length", 36), ("Content-Type", "application/json")],
+                b'{"message": "Internal server error"}',
+            ),
+        ),
+    ],
+)
+def test_get_response(verb, result, exp):
+    assert responses.get_response(verb, result) == exp
+
+
+@pytest.mark.parametrize(
+    ("verb", "accept_encoding", "min_size", "exp_headers", "exp_body"),
+    [
+        ("GET", "gzip", None, [("Content-Length", 200)], b"x" * 200),
+        (
+            "GET",
+            "gzip",
+            100,
+            [
+                ("Content-Length", 24),
+                ("Vary", "Accept-Encoding"),
+                ("Content-Encoding", "gzip"),
+            ],
+            b"x" * 200,
+        ),
+        (
+            "HEAD",
+            "deflate",
+            100,
+            [
+                ("Content-Length", 12),
+                ("Vary", "Accept-Encoding"),
+                ("Content-Encoding", "deflate"),
+            ],
+            b"",
+        ),
+        (
+            "GET",
+            None,
+            100,
+            [("Content-Length", 200), ("Vary", "Accept-Encoding")],
+            b"x" * 200,
+        ),
+    ],
+)
+def test_get_response_compression(
+    verb, accept_encoding, min_size, exp_headers, exp_body
+):
+    result = {"statusCode": 200, "body": "x" * 200}
+    status, headers, body = responses.get_response(
+        verb,
+        result,
+        accept_encoding,
+        min_size,
+    )
+    assert status == 200
+    assert headers == exp_headers
+    if ("Content-Encoding", "gzip") in headers:
+        body = gzip.decompress(body)
+    assert body == exp_body
+
+
+@pytest.mark.parametrize(
+    ("body", "exp"),
+    [
+        (None, False),
+        ("str", False),
+        (b"bytes", False),
+        (["list"], False),
+        (iter(["iterator"]), True),
+        ((x for x in "generator"), True),
+    ],
+)
+def test_is_stream(body, exp):
+    assert responses.is_stream(body) is exp
+
+
+def test_frame_chunk():
+    assert responses.frame_chunk(b"x" * 26) == b"1a\r\n" + b"x" * 26 + b"\r\n"
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_encode_stream(encoding):
+    ret = b"".join(responses.encode_stream(iter(["fizz", b"", b"buzz"]), encoding))
+    if encoding:
+        ret = gzip.decompress(ret)
+    assert ret == b"fizzbuzz"
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_encode_stream_async(encoding):
+    async def stream():
+        for chunk in ["fizz", b"", b"buzz"]:
+            yield chunk
+
+    async def collect():
+        return [x async for x in responses.encode_stream(stream(), encoding)]
+
+    ret = b"".join(asyncio.run(collect()))
+    if encoding:
+        ret = gzip.decompress(ret)
+    assert ret == b"fizzbuzz"
+
+
+@pytest.mark.parametrize(
+    ("result", "exp_status", "exp_headers"),
+    [
+        (iter(["fizz", "buzz"]), 200, []),
+        (
+            {
+                "statusCode": 201,
+                "headers": {"Content-Length": 8, "Content-Type": "text/plain"},
+                "body": iter(["fizz", "buzz"]),
+            },
+            201,
+            [("Content-Type", "text/plain")],
+        ),
+    ],
+)
+def test_get_response_stream(result, exp_status, exp_headers):
+    status, headers, body = responses.get_response("GET", result)
+    assert status == exp_status
+    assert headers == exp_headers
+    assert list(body) == [b"fizz", b"buzz"]
+
+
+def test_get_response_stream_head():
+    assert responses.get_response("HEAD", iter(["fizz"])) == (200, [], b"")
+
+
+def test_get_response_stream_compressed():
+    status, headers, body = responses.get_response(
+        "GET",
+        iter(["fizz", "buzz"]),
+        "gzip",
+        1024,
+    )
+    assert headers == [("Vary", "Accept-Encoding"), ("Content-Encoding", "gzip")]
+    assert gzip.decompress(b"".join(body)) == b"fizzbuzz"
@@ -0,0 +1,123 @@
+import pytest
+
+from lambda_gateway.routes import Route, RouteTable, load_routes
+
+ROUTES = {
+    "GET /items": "items.list_items",
+    "POST /items": "items.create_item",
+    "GET /items/{id}": "items.get_item",
+    "ANY /items/{id}": "items.any_item",
+    "GET /items/new": "items.new_item",
+    "GET /items/{id}/tags/{tag}": "items.get_tag",
+    "GET /files/{path+}": "files.get_file",
+    "ANY /{proxy+}": "app.handler",
+    "GET /": "app.index",
+}
+
+
+class TestRouteTable:
+    def setup_method(self):
+        self.subject = RouteTable(ROUTES)
+
+    def test_len(self):
+        assert len(self.subject) == len(ROUTES)
+
+    @pytest.mark.parametrize(
+        ("httpMethod", "path", "key", "params"),
+        [
+            ("GET", "/", "GET /", {}),
+            ("GET", "/items", "GET /items", {}),
+            ("GET", "/items/", "GET /items", {}),
+            ("POST", "/items", "POST /items", {}),
+            ("GET", "/items/42", "GET /items/{id}", {"id": "42"}),
+            ("DELETE", "/items/42", "ANY /items/{id}", {"id": "42"}),
+            ("GET", "/items/new", "GET /items/new", {}),
+            ("PUT", "/items/new", "ANY /items/{id}", {"id": "new"}),
+            ("GET", "/items/a%20b", "GET /items/{id}", {"id": "a b"}),
+            (
+                "GET",
+                "/items/42/tags/red",
+                "GET /items/{id}/tags/{tag}",
+                {"id": "42", "tag": "red"},
+            ),
+            (
+                "GET",
+                "/items/new/tags/red",
+                "GET /items/{id}/tags/{tag}",
+                {"id": "new", "tag": "red"},
+            ),
+            ("GET", "/files/a/b.txt", "GET /files/{path+}", {"path": "a/b.txt"}),
+            ("POST", "/files/a/b.txt", "ANY /{proxy+}", {"proxy": "files/a/b.txt"}),
+            ("DELETE", "/items", "ANY /{proxy+}", {"proxy": "items"}),
+            ("GET", "/items/42/other", "ANY /{proxy+}", {"proxy": "items/42/other"}),
+        ],
+    )
+    def test_match(self, httpMethod, path, key, params):
+        route, ret = self.subject.match(httpMethod, path)
+        assert route.key == key
+        assert route.signature == ROUTES[key]
+        assert ret == params
+
+    def test_match_none(self):
+        subject = RouteTable({"GET /items/{id}": "items.get_item"})
+        assert subject.match("GET", "/items") is None
+        assert subject.match("GET", "/items//") is None
+        assert subject.match("POST", "/items/42") is None
+
+    def test_match_default(self):
+        subject = RouteTable({"GET /items": "items.list_items", "$default": "app.x"})
+        route, params = subject.match("GET", "/other")
+        assert route == Route("$default", None, None, "app.x", ())
+        assert params == {}
+
+    def test_match_many(self):
+        subject = RouteTable({f"GET /r{i}/{{id}}": f"app.h{i}" for i in range(500)})
+        route, params = subject.match("GET", "/r499/x")
+        assert route.signature == "app.h499"
+        assert params == {"id": "x"}
+
+    @pytest.mark.parametrize(
+        ("key", "signature"),
+        [
+            ("GET /items", "handler"),
+            ("GET /items", None),
+            ("GET", "items.get"),
+            ("GET items", "items.get"),
+            ("FETCH /items", "items.get"),
+            ("GET /{proxy+}/items", "items.get"),
+            ("GET /items/{id", "items.get"),
+            ("GET /items/x{id}", "items.get"),
+            ("GET /items/", "items.get"),
+        ],
+    )
+    def test_add_error(self, key, signature):
+        with pytest.raises(ValueError):
+            self.subject.add(key, signature)
+
+    def test_get_signatures(self):
+        subject = RouteTable(
+            {
+                "GET /a": "app.a",
+                "GET /b": "app.b",
+                "POST /a": "app.a",
+                "$default": "app.default",
+            }
+        )
+        assert subject.get_signatures() == ["app.a", "app.b", "app.default"]
+
+
+def test_load_routes(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text('{"GET /items/{id}": "items.get_item"}')
+    ret = load_routes(str(path))
+    route, params = ret.match("GET", "/items/1")
+    assert route.signature == "items.get_item"
+    assert params == {"id": "1"}
+
+
+@pytest.mark.parametrize("routes", ["{", "[]", "{}"])
+def test_load_routes_error(tmp_path, routes):
+    path = tmp_path / "routes.json"
+    path.write_text(routes)
+    with pytest.raises(ValueError):
+        load_routes(str(path))
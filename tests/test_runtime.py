@@ -0,0 +1,130 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from lambda_gateway import runtime
+
+EVENT = {"version": "2.0", "rawPath": "/"}
+
+
+def handler(event, context):
+    return {"statusCode": 200, "body": str(os.getpid())}
+
+
+async def async_handler(event, context):
+    await asyncio.sleep(0)
+    return {"statusCode": 200, "body": "async"}
+
+
+def stream_handler(event, context):
+    yield "fizz"
+    yield b"buzz"
+
+
+def async_stream_handler(event, context):
+    async def body():
+        yield "fizz"
+        yield b"buzz"
+
+    return {"statusCode": 201, "body": body()}
+
+
+def sleep_handler(event, context):  # pragma: no cover
+    time.sleep(60)
+
+
+def remaining_handler(event, context):  # pragma: no cover
+    return {"statusCode": 200, "body": context.get_remaining_time_in_millis()}
+
+
+def memory_handler(event, context):  # pragma: no cover
+    size = int(event.get("size", 128)) * 1024 * 1024
+    hog = bytearray(size)
+    hog[::4096] = b"x" * (size // 4096)
+    time.sleep(float(event.get("hold", 0)))
+    return {"statusCode": 200, "body": len(hog)}
+
+
+def error_handler(event, context):
+    raise KeyError("boom")
+
+
+def exit_handler(event, context):  # pragma: no cover
+    os._exit(3)
+
+
+def unpicklable_handler(event, context):
+    return {"statusCode": 200, "body": threading.Lock()}
+
+
+def call(signature, *events):
+    parent, child = multiprocessing.Pipe()
+    thread = threading.Thread(target=runtime.serve, args=(child, signature))
+    thread.start()
+    replies = [parent.recv()]
+    for event in events:
+        parent.send((event, None))
+        replies.append(parent.recv())
+    parent.send(None)
+    thread.join()
+    return replies
+
+
+class TestServe:
+    def test_serve(self):
+        ready, reply = call("tests.test_runtime.handler", EVENT)
+        assert ready[:2] == ("ready", None)
+        assert reply[:2] == ("result", {"statusCode": 200, "body": str(os.getpid())})
+
+    def test_serve_init_error(self):
+        ((status, message, _, _),) = call("tests.test_runtime.missing")
+        assert status == "error"
+        assert message == "Handler 'missing' missing on module 'tests.test_runtime'"
+
+    @pytest.mark.parametrize(
+        ("name", "exp"),
+        [
+            ("async_handler", ("result", {"statusCode": 200, "body": "async"})),
+            ("stream_handler", ("result", {"statusCode": 200, "body": b"fizzbuzz"})),
+            (
+                "async_stream_handler",
+                ("result", {"statusCode": 201, "body": b"fizzbuzz"}),
+            ),
+            ("error_handler", ("error", "KeyError: 'boom'")),
+        ],
+    )
+    def test_serve_invoke(self, name, exp):
+        _, reply = call(f"tests.test_runtime.{name}", EVENT)
+        assert reply[:2] == exp
+
+    def test_serve_unpicklable(self):
+        _, (status, message, _, _) = call(
+            "tests.test_runtime.unpicklable_handler", EVENT
+        )
+        assert status == "error"
+        assert message.startswith("Unable to return result")
+
+    def test_serve_eof(self):
+        parent, child = multiprocessing.Pipe()
+        thread = threading.Thread(
+            target=runtime.serve,
+            args=(child, "tests.test_runtime.handler"),
+        )
+        thread.start()
+        parent.recv()
+        parent.close()
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_main(monkeypatch):
+    parent, child = multiprocessing.Pipe()
+    fd = os.dup(child.fileno())
+    child.close()
+    monkeypatch.setattr("sys.argv", ["runtime", str(fd), "tests.test_runtime.missing"])
+    runtime.main()
+    assert parent.recv()[0] == "error"
@@ -0,0 +1,220 @@
+import http.client
+import os
+import signal
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from lambda_gateway import metrics
+from lambda_gateway.server import PooledHTTPServer, QueueStats, Supervisor
+
+
+class BlockingHandler(BaseHTTPRequestHandler):
+    release = threading.Event()
+
+    def do_GET(self):
+        self.release.wait(5)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, *args):
+        pass
+
+
+def get(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", "/")
+    res = conn.getresponse()
+    return res.status, res.read()
+
+
+class TestQueueStats:
+    def test_snapshot(self):
+        subject = QueueStats()
+        assert subject.snapshot()["wait_avg"] == 0
+        subject.record_wait(0.1)
+        subject.record_wait(0.3)
+        subject.record_rejected()
+        ret = subject.snapshot()
+        assert ret["accepted"] == 2
+        assert ret["rejected"] == 1
+        assert ret["wait_max"] == 0.3
+        assert ret["wait_avg"] == pytest.approx(0.2)
+
+
+def queue_waits():
+    counts = metrics.PHASE_SECONDS.collect().get(("queue_wait",))
+    return sum(counts[:-1]) if counts else 0
+
+
+class TestPooledHTTPServer:
+    def setup_method(self):
+        BlockingHandler.release.clear()
+        self.subject = PooledHTTPServer(
+            ("127.0.0.1", 0), BlockingHandler, pool_size=1, queue_depth=1
+        )
+        self.port = self.subject.server_address[1]
+        self.thread = threading.Thread(target=self.subject.serve_forever)
+        self.thread.start()
+
+    def teardown_method(self):
+        BlockingHandler.release.set()
+        self.subject.shutdown()
+        self.subject.server_close()
+        self.thread.join()
+
+    def test_serve(self):
+        BlockingHandler.release.set()
+        waits = queue_waits()
+        assert get(self.port) == (200, b"OK")
+        assert self.subject.stats.snapshot()["accepted"] == 1
+        assert queue_waits() == waits + 1
+        assert len(self.subject.workers) == 1
+
+    def test_reject(self):
+        # Occupy the only worker, then fill the queue
+        busy = []
+        for accepted, queued in [(1, 0), (1, 1)]:
+            sock = socket.create_connection(("127.0.0.1", self.port))
+            sock.sendall(b"GET / HTTP/1.0\r\n\r\n")
+            busy.append(sock)
+            while (self.subject.stats.accepted, self.subject.queue.qsize()) != (
+                accepted,
+                queued,
+            ):
+                time.sleep(0.01)
+        status, body = get(self.port)
+        assert status == 429
+        assert body == b'{"message": "Too Many Requests"}'
+        assert self.subject.stats.snapshot()["rejected"] == 1
+        BlockingHandler.release.set()
+        for sock in busy:
+            assert sock.recv(1024).startswith(b"HTTP/1.0 200")
+            sock.close()
+
+    def test_is_busy(self):
+        assert self.subject.is_busy() is False
+        self.subject.queue.put_nowait(None)
+        assert self.subject.is_busy() is True
+        self.subject.queue.get_nowait()
+
+    def test_handle_error_connection(self, capsys):
+        try:
+            raise ConnectionResetError(104, "Connection reset by peer")
+        except ConnectionResetError:
+            self.subject.handle_error(None, ("127.0.0.1", 0))
+        assert capsys.readouterr().err == ""
+
+    def test_handle_error(self, capsys):
+        self.subject.RequestHandlerClass = None
+        with socket.create_connection(("127.0.0.1", self.port)) as sock:
+            sock.sendall(b"GET / HTTP/1.0\r\n\r\n")
+            assert sock.recv(1024) == b""
+        assert "Exception occurred" in capsys.readouterr().err
+
+
+class TestSupervisor:
+    def setup_method(self):
+        BlockingHandler.release.set()
+        self.httpd = HTTPServer(("127.0.0.1", 0), BlockingHandler)
+        self.port = self.httpd.server_address[1]
+        self.handlers = {
+            signum: signal.getsignal(signum)
+            for signum in [signal.SIGINT, signal.SIGTERM]
+        }
+
+    def teardown_method(self):
+        self.httpd.server_close()
+        for signum, handler in self.handlers.items():
+            signal.signal(signum, handler)
+
+    def test_run(self):
+        subject = Supervisor(self.httpd, self.httpd.serve_forever, 2)
+        subject.restart_delay = 0
+        results = []
+
+        def client():
+            while len(subject.pids) < 2:
+                time.sleep(0.01)
+            results.append(get(self.port))
+            # Kill a worker and wait for the supervisor to replace it
+            killed = next(iter(subject.pids))
+            os.kill(killed, signal.SIGKILL)
+            while killed in subject.pids or len(subject.pids) < 2:
+                time.sleep(0.01)
+            results.append(get(self.port))
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        thread = threading.Thread(target=client)
+        thread.start()
+        subject.run()
+        thread.join()
+        assert results == [(200, b"OK"), (200, b"OK")]
+        assert subject.stopping
+        assert subject.pids == {}
+
+    def test_work(self):
+        subject = Supervisor(self.httpd, lambda: None, 1)
+        assert subject.work() == 0
+        assert self.httpd.socket.fileno() == -1
+
+    def test_work_error(self, capsys):
+        def target():
+            raise RuntimeError("boom")
+
+        subject = Supervisor(self.httpd, target, 1)
+        assert subject.work() == 1
+        assert "boom" in capsys.readouterr().err
+
+    def test_interrupt(self):
+        with pytest.raises(KeyboardInterrupt):
+            Supervisor.interrupt(signal.SIGTERM)
+        assert signal.getsignal(signal.SIGINT) == signal.SIG_IGN
+        assert signal.getsignal(signal.SIGTERM) == signal.SIG_IGN
+
+    def test_run_restart(self):
+        def target():
+            raise RuntimeError("boom")
+
+        subject = Supervisor(self.httpd, target, 1)
+        subject.restart_delay = 0.05
+        spawned = []
+        spawn = subject.spawn
+        subject.spawn = lambda: spawned.append(spawn()) or spawned[-1]
+
+        def stop():
+            while len(spawned) < 3:
+                time.sleep(0.01)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        thread = threading.Thread(target=stop)
+        thread.start()
+        subject.run()
+        thread.join()
+        assert len(set(spawned)) >= 3
+
+    def test_work_signals(self):
+        signal.pthread_sigmask(signal.SIG_BLOCK, Supervisor.signals)
+        subject = Supervisor(self.httpd, lambda: None, 1)
+        assert subject.work() == 0
+        assert not signal.pthread_sigmask(signal.SIG_BLOCK, []) & Supervisor.signals
+        assert signal.getsignal(signal.SIGINT) == signal.SIG_IGN
+        assert signal.getsignal(signal.SIGTERM) == signal.SIG_IGN
+
+    def test_spawn_unblocks_parent(self):
+        subject = Supervisor(self.httpd, lambda: None, 1)
+        pid = subject.spawn()
+        os.waitpid(pid, 0)
+        assert not signal.pthread_sigmask(signal.SIG_BLOCK, []) & Supervisor.signals
+
+    def test_work_interrupt(self):
+        def target():
+            raise KeyboardInterrupt
+
+        subject = Supervisor(self.httpd, target, 1)
+        assert subject.work() == 0